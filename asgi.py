@@ -0,0 +1,274 @@
+# asgi.py
+# ASGI entry point for async-capable serving:
+#
+#   uvicorn asgi:application --workers 4
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+#
+# Routes whose time is spent waiting on outbound I/O are served by native async
+# handlers (ASYNC_ROUTES), so one worker can keep many slow geocodes in flight.
+# The rent form's address is geocoded here too and the page is then rendered by
+# Flask, which reuses that answer. Every other request goes to the unchanged
+# Flask app, run on a bounded thread pool (WSGI_THREADS) by a2wsgi. The rent
+# index is loaded at startup, and any reload runs off the event loop.
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.wrappers import Request
+
+from app import app
+from modules.fmr_index import get_fmr_index
+from modules.geocoding import get_async_geocoder
+from modules.rent_module import (
+    rent_api_response, geocode_error_message, is_zip_code, parse_bulk_rows, group_bulk_rows, bulk_error_results,
+    lookup_rents_for_zip, GEOCODED_SCOPE_KEY, BULK_GEOCODE_WORKERS, BULK_FIELDS, BLANK_ROW_ERROR,
+)
+
+logger = logging.getLogger(__name__)
+
+wsgi_application = WSGIMiddleware(app, workers=int(os.environ.get('WSGI_THREADS', 10)))
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b"")
+        if not message.get('more_body'):
+            return body
+
+
+def replay_body(body, receive):
+    """`receive` for an app downstream of a handler that already read the request body."""
+    replayed = False
+
+    async def receive_again():
+        nonlocal replayed
+        if replayed:
+            return await receive()
+        replayed = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    return receive_again
+
+
+def parse_request(scope, body):
+    """A werkzeug Request over an already-read body, to parse forms, uploads and JSON as Flask does."""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+    }
+    for name, value in scope['headers']:
+        if name == b'content-type':
+            environ['CONTENT_TYPE'] = value.decode('latin1')
+    return Request(environ)
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def geocode(address):
+    """(zip_code, error) for an address, with the same messages as the Flask views."""
+    try:
+        zip_code = await get_async_geocoder().geocode_zip(address)
+    except Exception as e:
+        return None, geocode_error_message(e)
+    if not zip_code:
+        return None, "Could not find a ZIP code for the provided address."
+    return zip_code, None
+
+
+async def rent_estimate_api(scope, receive, send):
+    """Async twin of rent_module.rent_estimate_api: same parameters, same JSON response."""
+    if scope['method'] not in ('GET', 'POST'):
+        await send_json(send, 405, {'error': "Method not allowed."})
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    params = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin1')).items()}
+    content_type = dict(scope['headers']).get(b'content-type', b'')
+    if body and content_type.startswith(b'application/json'):
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            await send_json(send, 400, {'error': "Invalid JSON body."})
+            return
+        if isinstance(payload, dict):
+            params.update(payload)
+    input_string = str(params.get("address_or_zip", "")).strip()
+    bedrooms = str(params.get("bedrooms", ""))
+    year = str(params.get("year") or "").strip() or None
+
+    zip_code = None
+    error = None
+    if is_zip_code(input_string):
+        zip_code = input_string
+    elif input_string:
+        zip_code, error = await geocode(input_string)
+
+    # The index may need reloading; keep that off the event loop.
+    status, response = await asyncio.to_thread(rent_api_response, input_string, bedrooms, zip_code, error, year)
+    await send_json(send, status, response)
+
+
+async def rent_estimate_page(scope, receive, send):
+    """
+    The /rent_estimate form: a posted address is geocoded here without blocking,
+    then Flask (rent_module.rent_estimate_page) renders the page using that answer.
+    """
+    if scope['method'] != 'POST':
+        await wsgi_application(scope, receive, send)
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    input_string = parse_request(scope, body).form.get('address_or_zip', '').strip()
+    if not is_zip_code(input_string):
+        scope = dict(scope)
+        scope[GEOCODED_SCOPE_KEY] = {input_string: await geocode(input_string)}
+    await wsgi_application(scope, replay_body(body, receive), send)
+
+
+async def bulk_rent_results(rows, fmr_index, max_workers=BULK_GEOCODE_WORKERS):
+    """
+    Async twin of rent_module.bulk_rent_results, with the same results: each
+    distinct address is geocoded once, at most max_workers at a time, and its rows
+    are emitted as soon as that geocode finishes.
+    """
+    blank_rows, zip_rows, rows_by_address = group_bulk_rows(rows)
+    for result in bulk_error_results(rows, blank_rows, BLANK_ROW_ERROR):
+        yield result
+    if zip_rows:
+        zip_results = await asyncio.to_thread(
+            lambda: list(lookup_rents_for_zip(fmr_index, zip_rows, rows, [rows[i][0] for i in zip_rows])))
+        for result in zip_results:
+            yield result
+    if not rows_by_address:
+        return
+
+    pending = list(rows_by_address.values())
+    finished = asyncio.Queue()
+
+    async def worker():
+        while pending:
+            row_numbers = pending.pop()
+            await finished.put((row_numbers, await geocode(rows[row_numbers[0]][0])))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(1, max_workers), len(pending)))]
+    try:
+        for _ in range(len(rows_by_address)):
+            row_numbers, (zip_code, error) = await finished.get()
+            if error:
+                results = bulk_error_results(rows, row_numbers, error)
+            else:
+                results = lookup_rents_for_zip(fmr_index, row_numbers, rows, [zip_code] * len(row_numbers))
+            for result in results:
+                yield result
+    finally:
+        # Stop outstanding geocodes if the client goes away mid-stream.
+        for task in workers:
+            task.cancel()
+
+
+async def bulk_rent_estimate(scope, receive, send):
+    """
+    Async twin of rent_module.bulk_rent_estimate: same input formats and streamed
+    NDJSON/CSV output. Background (?background=1) requests go to Flask, which
+    queues the job.
+    """
+    query = parse_qs(scope['query_string'].decode('latin1'))
+    if scope['method'] != 'POST' or query.get('background', [''])[-1] == '1':
+        await wsgi_application(scope, receive, send)
+        return
+    body = await read_body(receive)
+    if body is None:
+        return
+    try:
+        rows = parse_bulk_rows(parse_request(scope, body))
+    except (ValueError, TypeError, IndexError, KeyError, UnicodeDecodeError) as e:
+        await send_json(send, 400, {'error': f"Invalid bulk request: {e}"})
+        return
+
+    fmr_index = await asyncio.to_thread(get_fmr_index)
+    if fmr_index is None:
+        await send_json(send, 503, {
+            'error': "Rent data not loaded. Please ensure 'fairmarketrent.xlsx' is correctly placed."})
+        return
+
+    as_csv = query.get('format', [''])[-1] == 'csv'
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/csv; charset=utf-8' if as_csv else b'application/x-ndjson')],
+    })
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=BULK_FIELDS)
+    if as_csv:
+        writer.writeheader()
+    results = bulk_rent_results(rows, fmr_index)
+    try:
+        async for result in results:
+            if as_csv:
+                writer.writerow(result)
+            else:
+                buffer.write(json.dumps(result) + "\n")
+            await send({'type': 'http.response.body', 'body': buffer.getvalue().encode(), 'more_body': True})
+            buffer.seek(0)
+            buffer.truncate(0)
+    finally:
+        await results.aclose()
+    await send({'type': 'http.response.body', 'body': buffer.getvalue().encode()})
+
+
+ASYNC_ROUTES = {
+    '/api/rent_estimate': rent_estimate_api,
+    '/rent_estimate': rent_estimate_page,
+    '/rent_estimate/bulk': bulk_rent_estimate,
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Load (or rebuild) the rent index before the first request needs it.
+            await asyncio.to_thread(get_fmr_index)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            try:
+                await get_async_geocoder().aclose()
+            except Exception as e:
+                logger.warning(f"Error closing async geocoder: {e}")
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    handler = ASYNC_ROUTES.get(scope.get('path')) if scope['type'] == 'http' else None
+    if handler is not None:
+        await handler(scope, receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
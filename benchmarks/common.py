@@ -0,0 +1,111 @@
+# benchmarks/common.py
+# Shared helpers for the benchmark scripts: latency summaries, memory readings and
+# JSON reports stored under benchmarks/results/<commit>/<suite>.json so runs of
+# different commits can be compared with `python -m benchmarks.compare`.
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+# Calculator form values (strings, as posted) used by both suites.
+SAMPLE_DEAL = {
+    'property_address': "123 Benchmark Ave", 'purchase_price': "150000", 'rehab_cost': "30000",
+    'closing_costs_1': "4000", 'arv': "230000", 'down_payment_1_pct': "10", 'interest_rate_1': "11",
+    'rehab_period_months': "5", 'refinance_pct': "75", 'interest_rate_2': "7", 'loan_term_years': "30",
+    'closing_costs_2': "5000", 'rent_estimate': "1850", 'property_tax': "250", 'insurance': "90",
+    'property_management_pct': "8", 'maintenance_pct': "5", 'vacancy_pct': "5",
+}
+
+
+def git_commit():
+    """Returns (short commit hash, dirty flag) of the working tree, or ('unknown', False)."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                    check=True, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+UNIT_SCALE = {'ms': 1e3, 'us': 1e6}
+
+
+def latency_summary(samples_seconds, unit='ms'):
+    """p50/p95/p99/mean/min/max of latency samples in `unit` ('ms' or 'us'), keyed e.g. p95_ms."""
+    samples = np.asarray(samples_seconds, dtype=float) * UNIT_SCALE[unit]
+    if samples.size == 0:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    summary = {'count': int(samples.size)}
+    for name, value in (('p50', p50), ('p95', p95), ('p99', p99), ('mean', samples.mean()),
+                        ('min', samples.min()), ('max', samples.max())):
+        summary[f"{name}_{unit}"] = round(float(value), 4)
+    return summary
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def process_rss_mb(pid):
+    """Current RSS of a process in MB from /proc (Linux only); None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    """Direct children of a process (e.g. gunicorn workers), from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_report(suite, results, output=None):
+    """
+    Writes a report to `output` or benchmarks/results/<commit>/<suite>.json
+    (with a -dirty suffix for uncommitted changes) and returns the path.
+    """
+    commit, dirty = git_commit()
+    report = {
+        'suite': suite,
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': environment(),
+        'results': results,
+    }
+    if output is None:
+        output = os.path.join(RESULTS_DIR, commit + ("-dirty" if dirty else ""), f"{suite}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    return output
@@ -0,0 +1,98 @@
+# benchmarks/compare.py
+# Compares two benchmark runs and flags regressions.
+#
+#   python -m benchmarks.compare <base> <new> [--threshold 10]
+#
+# <base> and <new> are report files or commit directories under benchmarks/results
+# (e.g. `python -m benchmarks.compare 5bb2c75 HEAD-dirty`; "HEAD" resolves to the
+# current commit). Latency percentiles that rise, or throughput that drops, by more
+# than --threshold percent are reported as regressions and make the exit status 1.
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.common import RESULTS_DIR, git_commit
+
+SUITES = ('micro', 'load', 'startup')
+# (metric, True if higher is better)
+COMPARED = (('p50', False), ('p95', False), ('p99', False), ('throughput_rps', True), ('ops_per_second', True))
+
+
+def resolve_reports(target):
+    """Maps a report file or a results directory/commit to {suite: report}."""
+    if os.path.isfile(target):
+        with open(target) as f:
+            report = json.load(f)
+        return {report['suite']: report}
+    if target.startswith('HEAD'):
+        target = git_commit()[0] + target[len('HEAD'):]
+    directory = target if os.path.isdir(target) else os.path.join(RESULTS_DIR, target)
+    reports = {}
+    for suite in SUITES:
+        path = os.path.join(directory, f"{suite}.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                reports[suite] = json.load(f)
+    if not reports:
+        raise SystemExit(f"No benchmark reports found for {target!r}")
+    return reports
+
+
+def report_entries(report):
+    """{entry name: summary dict} for the cases of a micro/startup report or the scenarios of a load report."""
+    results = report['results']
+    if 'cases' in results:
+        return results['cases']
+    return dict(results['scenarios'], overall=results['overall'])
+
+
+def metric_value(summary, metric):
+    if metric in summary:
+        return summary[metric]
+    for unit in ('ms', 'us'):
+        if f"{metric}_{unit}" in summary:
+            return summary[f"{metric}_{unit}"]
+    return None
+
+
+def compare(base, new, threshold):
+    """Yields (suite, entry, metric, base value, new value, change %, regressed)."""
+    for suite in SUITES:
+        if suite not in base or suite not in new:
+            continue
+        base_entries, new_entries = report_entries(base[suite]), report_entries(new[suite])
+        for entry in sorted(set(base_entries) & set(new_entries)):
+            for metric, higher_is_better in COMPARED:
+                old = metric_value(base_entries[entry], metric)
+                current = metric_value(new_entries[entry], metric)
+                if old is None or current is None or old == 0:
+                    continue
+                change = (current - old) / old * 100
+                regressed = -change > threshold if higher_is_better else change > threshold
+                yield suite, entry, metric, old, current, change, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs.")
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help="regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    base, new = resolve_reports(args.base), resolve_reports(args.new)
+    for suite in SUITES:
+        if suite in base and suite in new and base[suite]['environment'] != new[suite]['environment']:
+            print(f"warning: {suite} runs come from different environments; compare with care.")
+
+    regressions = 0
+    for suite, entry, metric, old, current, change, regressed in compare(base, new, args.threshold):
+        regressions += regressed
+        flag = "REGRESSION" if regressed else ""
+        print(f"{suite:5s} {entry:48s} {metric:15s} {old:14.4f} -> {current:14.4f} {change:+8.1f}%  {flag}")
+    print(f"{regressions} regression(s) beyond {args.threshold:g}%.")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
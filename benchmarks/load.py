@@ -0,0 +1,344 @@
+# benchmarks/load.py
+# HTTP load test of the calculator, saved properties and rent lookup pages against
+# a local PostgreSQL database and the stub geocoder (no network calls).
+#
+#   DATABASE_URL=postgresql://localhost/brrrr_bench python -m benchmarks.load
+#   DATABASE_URL=... python -m benchmarks.load --duration 60 --concurrency 32 --workers 4 --threads 8
+#
+# The script applies schema.sql, seeds --properties benchmark rows (addresses
+# starting with "Bench Property"), starts gunicorn on app:app with GEOCODER=stub,
+# drives a weighted mix of requests from --concurrency client threads for
+# --duration seconds, samples the server's memory, and removes the seeded rows
+# again (unless --keep-data). Use --url to target a server that is already running
+# (memory is then only sampled with --server-pid).
+#
+# Reports p50/p95/p99 latency, throughput and error counts per scenario in
+# benchmarks/results/<commit>/load.json.
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from benchmarks.common import BASE_DIR, SAMPLE_DEAL, latency_summary, process_rss_mb, child_pids, write_report
+from modules.fmr_index import get_fmr_index
+
+ADDRESS_PREFIX = "Bench Property"
+STUB_ADDRESSES = 500
+SEED = 20240101
+
+# name -> relative weight in the request mix
+DEFAULT_MIX = {
+    'calculator_get': 20,
+    'calculator_calculate': 25,
+    'calculator_save': 5,
+    'saved_properties': 15,
+    'saved_properties_filtered': 5,
+    'rent_estimate_zip': 15,
+    'rent_estimate_address': 15,
+}
+
+
+class Fixtures:
+    """Seeded data the scenarios draw from."""
+
+    def __init__(self, property_ids, zips, stub_addresses):
+        self.property_ids = property_ids
+        self.zips = zips
+        self.stub_addresses = stub_addresses
+
+
+def deal_form(rng, address, action):
+    form = dict(SAMPLE_DEAL, property_address=address, action=action)
+    form['purchase_price'] = str(rng.randrange(80_000, 400_000, 1000))
+    form['rent_estimate'] = str(rng.randrange(900, 3000, 25))
+    return form
+
+
+def build_request(name, rng, fixtures, properties):
+    """Returns (method, path, form) for one request of the given scenario."""
+    if name == 'calculator_get':
+        return 'GET', f"/brrrr_calculator?property_id={rng.choice(fixtures.property_ids)}", None
+    if name == 'calculator_calculate':
+        return 'POST', "/brrrr_calculator", deal_form(rng, f"Ad hoc {rng.randrange(10 ** 6)}", 'calculate')
+    if name == 'calculator_save':
+        # Re-saves seeded addresses, so the table does not grow during the run.
+        address = f"{ADDRESS_PREFIX} {rng.randrange(properties):06d}"
+        return 'POST', "/brrrr_calculator", deal_form(rng, address, 'save')
+    if name == 'saved_properties':
+        return 'GET', "/saved_properties", None
+    if name == 'saved_properties_filtered':
+        low = rng.randrange(80_000, 300_000, 10_000)
+        query = {'q': ADDRESS_PREFIX.lower(), 'min_price': low, 'max_price': low + 100_000}
+        return 'GET', f"/saved_properties?{urlencode(query)}", None
+    if name == 'rent_estimate_zip':
+        return 'POST', "/rent_estimate", {'address_or_zip': rng.choice(fixtures.zips),
+                                          'bedrooms': str(rng.randrange(5))}
+    if name == 'rent_estimate_address':
+        return 'POST', "/rent_estimate", {'address_or_zip': rng.choice(fixtures.stub_addresses),
+                                          'bedrooms': str(rng.randrange(5))}
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+# --- Database fixtures ---
+def connect(database_url):
+    import psycopg2
+    from psycopg2 import extras
+
+    conn = psycopg2.connect(database_url)
+    conn.cursor_factory = extras.RealDictCursor
+    return conn
+
+
+def seed_properties(database_url, count):
+    """Applies schema.sql and upserts `count` benchmark properties; returns their ids."""
+    from modules.property_store import import_properties_csv, PROPERTY_COLUMNS
+
+    rng = random.Random(SEED)
+    conn = connect(database_url)
+    try:
+        with open(os.path.join(BASE_DIR, 'schema.sql')) as f:
+            cursor = conn.cursor()
+            cursor.execute(f.read())
+            cursor.close()
+        conn.commit()
+
+        out = io.StringIO()
+        out.write(",".join(PROPERTY_COLUMNS) + "\n")
+        for i in range(count):
+            form = deal_form(rng, f"{ADDRESS_PREFIX} {i:06d}", 'save')
+            out.write(",".join(form[col] for col in PROPERTY_COLUMNS) + "\n")
+        out.seek(0)
+        report = import_properties_csv(conn, out)
+        if report['rejected']:
+            raise SystemExit(f"Seeding rejected rows: {report['errors'][:5]}")
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM properties WHERE property_address LIKE %s ORDER BY id",
+                       (ADDRESS_PREFIX + " %",))
+        ids = [row['id'] for row in cursor.fetchall()]
+        cursor.close()
+        return ids
+    finally:
+        conn.close()
+
+
+def remove_properties(database_url):
+    conn = connect(database_url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM properties WHERE property_address LIKE %s", (ADDRESS_PREFIX + " %",))
+        cursor.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_stub_geocodes(zips):
+    """Writes the GEOCODER_STUB_FILE mapping; returns (path, addresses)."""
+    mapping = {f"{n} Benchmark Street, Springfield": zips[n % len(zips)] for n in range(STUB_ADDRESSES)}
+    f = tempfile.NamedTemporaryFile('w', suffix='.json', prefix='geocoder-stub-', delete=False)
+    with f:
+        json.dump(mapping, f)
+    return f.name, list(mapping)
+
+
+# --- Server ---
+def start_server(port, workers, threads, stub_file, stub_delay, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, GEOCODER='stub', GEOCODER_STUB_FILE=stub_file,
+               GEOCODER_STUB_DELAY=str(stub_delay), GEOCODE_CACHE_PATH='')
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f"127.0.0.1:{port}", '--workers', str(workers),
+               '--threads', str(threads), '--log-level', 'warning', 'app:app']
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit("gunicorn did not become ready within 60 seconds")
+
+
+class MemorySampler(threading.Thread):
+    """Samples the total RSS of a server process and its workers every `interval` seconds."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            readings = [process_rss_mb(pid) for pid in [self.pid] + child_pids(self.pid)]
+            readings = [r for r in readings if r is not None]
+            if readings:
+                self.samples.append(sum(readings))
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        return {'peak_rss_mb': round(max(self.samples), 1), 'final_rss_mb': round(self.samples[-1], 1),
+                'mean_rss_mb': round(float(np.mean(self.samples)), 1)}
+
+
+# --- Client ---
+def client_thread(index, base_url, mix, fixtures, properties, deadline, records):
+    url = urlsplit(base_url)
+    rng = random.Random(SEED + index)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, form = build_request(name, rng, fixtures, properties)
+        body = urlencode(form) if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+        records.append((name, time.perf_counter() - start, status))
+    conn.close()
+
+
+def run_load(base_url, mix, fixtures, properties, concurrency, duration):
+    records = []  # list.append is atomic; one shared list is fine
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client_thread,
+                                args=(i, base_url, mix, fixtures, properties, deadline, records))
+               for i in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.monotonic() - start
+
+
+def summarize(records, elapsed):
+    scenarios = {}
+    for name in sorted({record[0] for record in records}):
+        rows = [record for record in records if record[0] == name]
+        summary = latency_summary([latency for _, latency, _ in rows])
+        summary['throughput_rps'] = round(len(rows) / elapsed, 2)
+        summary['errors'] = sum(1 for _, _, status in rows if status is None or status >= 400)
+        scenarios[name] = summary
+    overall = latency_summary([latency for _, latency, _ in records])
+    overall['throughput_rps'] = round(len(records) / elapsed, 2)
+    overall['errors'] = sum(summary['errors'] for summary in scenarios.values())
+    return scenarios, overall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test of the BRRRR app against a local PostgreSQL.")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of measured load (default 30)")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of unmeasured load first (default 5)")
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads (default 16)")
+    parser.add_argument('--properties', type=int, default=5000, help="benchmark rows to seed (default 5000)")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers (default 2)")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker (default 8)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--geocoder-delay', type=float, default=0.0,
+                        help="simulated upstream geocoder latency in seconds (default 0)")
+    parser.add_argument('--mix', help="JSON object overriding scenario weights, e.g. '{\"calculator_save\": 0}'")
+    parser.add_argument('--url', help="target an already running server instead of starting gunicorn")
+    parser.add_argument('--server-pid', type=int, help="with --url: server pid to sample memory from")
+    parser.add_argument('--keep-data', action='store_true', help="leave the seeded rows in the database")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/<commit>/load.json)")
+    args = parser.parse_args(argv)
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise SystemExit("Set DATABASE_URL to a local PostgreSQL database (it gets benchmark rows).")
+    mix = dict(DEFAULT_MIX, **(json.loads(args.mix) if args.mix else {}))
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    fmr_index = get_fmr_index()
+    if fmr_index is None:
+        raise SystemExit("Rent data not available: fairmarketrent.xlsx is needed for the rent scenarios.")
+    zips = [f"{int(z):05d}" for z in fmr_index.zips]
+    stub_file, stub_addresses = write_stub_geocodes(zips)
+
+    print(f"Seeding {args.properties} properties...")
+    property_ids = seed_properties(database_url, args.properties)
+    fixtures = Fixtures(property_ids, zips, stub_addresses)
+
+    server = None
+    try:
+        if args.url:
+            base_url, server_pid = args.url, args.server_pid
+        else:
+            server = start_server(args.port, args.workers, args.threads, stub_file, args.geocoder_delay,
+                                  database_url)
+            base_url, server_pid = f"http://127.0.0.1:{args.port}", server.pid
+
+        if args.warmup:
+            print(f"Warming up for {args.warmup:g}s...")
+            run_load(base_url, mix, fixtures, args.properties, args.concurrency, args.warmup)
+
+        sampler = MemorySampler(server_pid) if server_pid else None
+        if sampler:
+            sampler.start()
+        print(f"Measuring for {args.duration:g}s with {args.concurrency} clients...")
+        records, elapsed = run_load(base_url, mix, fixtures, args.properties, args.concurrency, args.duration)
+        if sampler:
+            sampler.stop()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        os.unlink(stub_file)
+        if not args.keep_data:
+            remove_properties(database_url)
+
+    scenarios, overall = summarize(records, elapsed)
+    for name, summary in scenarios.items():
+        print(f"{name:28s} {summary['count']:7d} req  {summary['throughput_rps']:8.1f} rps  "
+              f"p50 {summary['p50_ms']:8.2f}  p95 {summary['p95_ms']:8.2f}  p99 {summary['p99_ms']:8.2f} ms  "
+              f"errors {summary['errors']}")
+    print(f"{'overall':28s} {overall['count']:7d} req  {overall['throughput_rps']:8.1f} rps  "
+          f"p50 {overall['p50_ms']:8.2f}  p95 {overall['p95_ms']:8.2f}  p99 {overall['p99_ms']:8.2f} ms  "
+          f"errors {overall['errors']}")
+
+    results = {
+        'config': {'duration': args.duration, 'concurrency': args.concurrency, 'properties': args.properties,
+                   'workers': args.workers, 'threads': args.threads, 'geocoder_delay': args.geocoder_delay,
+                   'mix': mix, 'url': args.url},
+        'scenarios': scenarios,
+        'overall': overall,
+        'server_memory': sampler.summary() if sampler else None,
+    }
+    print(json.dumps({'report': write_report('load', results, args.output)}))
+
+
+if __name__ == "__main__":
+    main()
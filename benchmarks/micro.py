@@ -0,0 +1,117 @@
+# benchmarks/micro.py
+# Micro-benchmarks of the calculation and rent lookup hot paths. No database needed.
+#
+#   python -m benchmarks.micro                 # full run, report in benchmarks/results/<commit>/micro.json
+#   python -m benchmarks.micro --quick         # fewer samples, for a smoke check
+#   python -m benchmarks.micro -k fmr          # only cases whose name contains "fmr"
+#
+# Each case is timed in `repeat` samples of `number` calls; latencies are per call.
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.brrrr_module import calculate_monthly_payment, perform_brrrr_calculations
+from modules.brrrr_engine import perform_brrrr_calculations_batch, NUMERIC_INPUT_COLUMNS
+from modules.fmr_index import get_fmr_index, BEDROOM_COLUMNS
+from modules.rent_module import resolve_rent
+from benchmarks.common import SAMPLE_DEAL, latency_summary, peak_rss_mb, write_report
+
+BATCH_DEALS = 10_000
+SEED = 20240101
+
+
+def random_deals(n, seed=SEED):
+    """Columnar batch of `n` deals scattered around SAMPLE_DEAL."""
+    rng = np.random.default_rng(seed)
+    deals = {}
+    for name in NUMERIC_INPUT_COLUMNS:
+        base = float(SAMPLE_DEAL[name])
+        deals[name] = base * rng.uniform(0.8, 1.2, n) if name != 'loan_term_years' else np.full(n, base)
+    return deals
+
+
+def bench(fn, number, repeat, per_call=1):
+    """Times `repeat` samples of `number` calls; returns per-item latencies in seconds."""
+    fn()  # warm up caches and lazy imports
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / (number * per_call))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+
+def traced_peak_kb(fn):
+    """Peak Python heap allocated while running fn once, in KB."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def build_cases():
+    fmr_index = get_fmr_index()
+    if fmr_index is None:
+        raise SystemExit("Rent data not available: fairmarketrent.xlsx is needed for the FMR cases.")
+    rng = np.random.default_rng(SEED)
+    zips = [f"{int(z):05d}" for z in rng.choice(fmr_index.zips, 1000)]
+    bedrooms = [str(b) for b in rng.choice(list(BEDROOM_COLUMNS), 1000)]
+    deals = random_deals(BATCH_DEALS)
+    counter = iter(range(10 ** 12))
+
+    def next_lookup():
+        i = next(counter) % len(zips)
+        return zips[i], bedrooms[i]
+
+    return [
+        # (name, callable, calls per sample, items per call)
+        ('calculate_monthly_payment', lambda: calculate_monthly_payment(135000.0, 7.0, 30), 10_000, 1),
+        ('perform_brrrr_calculations', lambda: perform_brrrr_calculations(SAMPLE_DEAL), 2_000, 1),
+        (f'perform_brrrr_calculations_batch[{BATCH_DEALS}]/deal',
+         lambda: perform_brrrr_calculations_batch(deals), 10, BATCH_DEALS),
+        ('fmr_lookup_rent', lambda: fmr_index.lookup_rent(*next_lookup()), 10_000, 1),
+        ('rent_module.resolve_rent', lambda: resolve_rent(*next_lookup()), 10_000, 1),
+        ('fmr_lookup_many[1000]/row', lambda: fmr_index.lookup_many(zips, bedrooms), 100, len(zips)),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the BRRRR and rent lookup hot paths.")
+    parser.add_argument('--quick', action='store_true', help="5 samples per case instead of 30")
+    parser.add_argument('-k', dest='keyword', help="only run cases whose name contains this text")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/<commit>/micro.json)")
+    args = parser.parse_args(argv)
+
+    repeat = 5 if args.quick else 30
+    results = {}
+    for name, fn, number, per_call in build_cases():
+        if args.keyword and args.keyword not in name:
+            continue
+        samples = bench(fn, number, repeat, per_call)
+        summary = latency_summary(samples, unit='us')
+        summary['ops_per_second'] = round(1 / float(np.median(samples)), 1)
+        summary['traced_peak_kb'] = traced_peak_kb(fn)
+        results[name] = summary
+        print(f"{name:48s} p50 {summary['p50_us']:10.3f} us   p99 {summary['p99_us']:10.3f} us"
+              f"   {summary['ops_per_second']:>14,.0f} ops/s")
+
+    path = write_report('micro', {'cases': results, 'peak_rss_mb': peak_rss_mb(), 'repeat': repeat},
+                        args.output)
+    print(json.dumps({'report': path, 'peak_rss_mb': peak_rss_mb()}))
+
+
+if __name__ == "__main__":
+    main()
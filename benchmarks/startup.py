@@ -0,0 +1,99 @@
+# benchmarks/startup.py
+# Measures worker startup in fresh interpreters and checks it against a budget.
+#
+#   python -m benchmarks.startup                     # 5 runs, budget 1000 ms for `import app`
+#   python -m benchmarks.startup --budget-ms 600 --runs 10
+#
+# Cases: `import app` (module imports + create_app), preload_shared_data(), and
+# the first request to / and to the rent lookup API after import. The run fails
+# (exit status 1) if the median `import app` time is over budget or if a module
+# that should only load on demand (LAZY_MODULES) is imported at startup. The
+# report goes to benchmarks/results/<commit>/startup.json.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.common import BASE_DIR, latency_summary, write_report
+
+# Heavy dependencies that must not be imported just by importing the app.
+LAZY_MODULES = ('pandas', 'openpyxl', 'geopy', 'httpx')
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+lazy_loaded = [name for name in LAZY_MODULES if name in sys.modules]
+client = app.app.test_client()
+t = time.perf_counter()
+client.get('/')
+first_page = time.perf_counter() - t
+t = time.perf_counter()
+app.preload_shared_data()
+preload = time.perf_counter() - t
+t = time.perf_counter()
+client.get('/api/rent_estimate?address_or_zip=00000&bedrooms=2')
+first_rent_lookup = time.perf_counter() - t
+print(json.dumps({'import_app': imported - start, 'first_request_index': first_page,
+                  'preload_shared_data': preload, 'first_request_rent_api': first_rent_lookup,
+                  'lazy_loaded': lazy_loaded}))
+"""
+
+
+def run_probe():
+    env = dict(os.environ, GEOCODER='stub', GEOCODE_CACHE_PATH='')
+    code = f"LAZY_MODULES = {LAZY_MODULES!r}\n" + PROBE
+    result = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, env=env, check=True,
+                            capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit=10):
+    """Modules with the highest self import time (µs) from `python -X importtime -c 'import app'`."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BASE_DIR,
+                            capture_output=True, text=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        timings.append({'module': name, 'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return sorted(timings, key=lambda t: t['self_us'], reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup-time budget check for the app.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('STARTUP_BUDGET_MS', 1000)),
+                        help="maximum median `import app` time (default 1000, or STARTUP_BUDGET_MS)")
+    parser.add_argument('--output', help="report path (default: benchmarks/results/<commit>/startup.json)")
+    args = parser.parse_args(argv)
+
+    probes = [run_probe() for _ in range(args.runs)]
+    cases = {name: latency_summary([probe[name] for probe in probes])
+             for name in ('import_app', 'preload_shared_data', 'first_request_index', 'first_request_rent_api')}
+    lazy_loaded = sorted({name for probe in probes for name in probe['lazy_loaded']})
+    imports = slowest_imports()
+
+    for name, summary in cases.items():
+        print(f"{name:24s} p50 {summary['p50_ms']:9.1f} ms   max {summary['max_ms']:9.1f} ms")
+    print("slowest imports (self time):")
+    for timing in imports:
+        print(f"  {timing['module']:40s} {timing['self_us'] / 1000:8.1f} ms")
+
+    failures = []
+    if cases['import_app']['p50_ms'] > args.budget_ms:
+        failures.append(f"`import app` takes {cases['import_app']['p50_ms']:.0f} ms (budget {args.budget_ms:g} ms)")
+    if lazy_loaded:
+        failures.append(f"imported at startup but should load lazily: {', '.join(lazy_loaded)}")
+
+    path = write_report('startup', {'cases': cases, 'budget_ms': args.budget_ms, 'lazy_loaded': lazy_loaded,
+                                    'slowest_imports': imports, 'runs': args.runs}, args.output)
+    print(json.dumps({'report': path, 'failures': failures}))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
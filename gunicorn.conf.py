@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+# Read automatically by `gunicorn app:app` when started from the project directory.
+# Workers, bind address and threads keep gunicorn's defaults and environment
+# variables (WEB_CONCURRENCY, PORT, GUNICORN_CMD_ARGS).
+#
+# With GUNICORN_PRELOAD=1 (the default) the app and its read-only datasets are
+# loaded once in the master; workers are forked with them already in memory and
+# share the pages copy-on-write. gc.freeze() keeps the garbage collector from
+# touching (and so copying) those inherited objects in every worker.
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from app import preload_shared_data
+
+        preload_shared_data()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Without preloading, load the datasets before the worker accepts requests
+    # rather than on its first rent lookup.
+    if not worker.cfg.preload_app:
+        from app import preload_shared_data
+
+        preload_shared_data()
@@ -0,0 +1,250 @@
+# modules/brrrr_engine.py
+# Vectorized (NumPy) version of the BRRRR math in brrrr_module.perform_brrrr_calculations.
+# Every function here works on whole columns of deals at once and follows NumPy
+# broadcasting rules, so scalars, 1-D columns and N-D grids can be mixed freely.
+import numpy as np
+
+# The 18 input columns of the `properties` table, in schema order.
+INPUT_COLUMNS = (
+    'property_address', 'purchase_price', 'rehab_cost', 'closing_costs_1', 'arv',
+    'down_payment_1_pct', 'interest_rate_1', 'rehab_period_months',
+    'refinance_pct', 'interest_rate_2', 'loan_term_years', 'closing_costs_2',
+    'rent_estimate', 'property_tax', 'insurance', 'property_management_pct',
+    'maintenance_pct', 'vacancy_pct',
+)
+NUMERIC_INPUT_COLUMNS = INPUT_COLUMNS[1:]
+# Parsed with int() by the scalar path; truncated toward zero here.
+INTEGER_INPUT_COLUMNS = ('rehab_period_months', 'loan_term_years')
+
+OUTPUT_COLUMNS = (
+    'total_initial_investment', 'hard_money_loan_amount', 'monthly_interest_only_hm',
+    'holding_costs_rehab', 'total_out_of_pocket', 'refinance_loan_amount',
+    'money_from_refi_after_payoff', 'cash_left_in_deal', 'equity_created',
+    'monthly_mortgage_refi', 'monthly_operating_expenses', 'monthly_cash_flow',
+    'annual_cash_flow', 'cash_on_cash_return',
+)
+
+
+def calculate_monthly_payment_batch(principal, annual_interest_rate, loan_term_years):
+    """Array version of calculate_monthly_payment (same zero-rate and zero-term rules)."""
+    principal = np.asarray(principal, dtype=float)
+    annual_interest_rate = np.asarray(annual_interest_rate, dtype=float)
+    loan_term_years = np.asarray(loan_term_years, dtype=float)
+
+    monthly_interest_rate = (annual_interest_rate / 100) / 12
+    number_of_payments = loan_term_years * 12
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + monthly_interest_rate) ** number_of_payments
+        amortized = principal * (monthly_interest_rate * growth) / (growth - 1)
+        straight_line = principal / number_of_payments
+
+    payment = np.where(monthly_interest_rate == 0, straight_line, amortized)
+    return np.where((principal <= 0) | (loan_term_years <= 0), 0.0, payment)
+
+
+def cash_left_is_zero(cash_left_in_deal):
+    """True where less than a cent is left in the deal: the scalar path's 'no cash left' rule."""
+    return (cash_left_in_deal == 0) | ((cash_left_in_deal > -0.01) & (cash_left_in_deal < 0.01))
+
+
+def cash_on_cash_return_batch(annual_cash_flow, cash_left_in_deal):
+    """
+    CoC return in percent. Matches the scalar rules: infinite when the deal
+    cash-flows with (almost) no cash left in it, 0 when no cash is left otherwise.
+    """
+    near_zero = cash_left_is_zero(cash_left_in_deal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = (annual_cash_flow / cash_left_in_deal) * 100
+    return np.where(
+        (annual_cash_flow > 0) & near_zero,
+        np.inf,
+        np.where(cash_left_in_deal != 0, ratio, 0.0),
+    )
+
+
+def _column(inputs, name):
+    if name not in inputs:
+        return np.zeros(())
+    values = np.asarray(inputs[name], dtype=float)
+    if name in INTEGER_INPUT_COLUMNS:
+        values = np.trunc(values)
+    return values
+
+
+def perform_brrrr_calculations_batch(inputs):
+    """
+    Evaluates many deals at once.
+
+    `inputs` is any mapping of column name -> scalar/array (e.g. a dict of NumPy
+    arrays or a pandas DataFrame with the `properties` columns). Missing columns
+    default to 0, like the scalar path. Returns a dict mapping each name in
+    OUTPUT_COLUMNS to a float array of the broadcast input shape, plus a boolean
+    'results_calculated' array that is False for rows with non-finite inputs.
+    """
+    purchase_price = _column(inputs, 'purchase_price')
+    rehab_cost = _column(inputs, 'rehab_cost')
+    closing_costs_1 = _column(inputs, 'closing_costs_1')
+    arv = _column(inputs, 'arv')
+
+    down_payment_1_pct = _column(inputs, 'down_payment_1_pct')
+    interest_rate_1 = _column(inputs, 'interest_rate_1')
+    rehab_period_months = _column(inputs, 'rehab_period_months')
+
+    refinance_pct = _column(inputs, 'refinance_pct')
+    interest_rate_2 = _column(inputs, 'interest_rate_2')
+    loan_term_years = _column(inputs, 'loan_term_years')
+    closing_costs_2 = _column(inputs, 'closing_costs_2')
+
+    rent_estimate = _column(inputs, 'rent_estimate')
+    property_tax = _column(inputs, 'property_tax')
+    insurance = _column(inputs, 'insurance')
+    property_management_pct = _column(inputs, 'property_management_pct')
+    maintenance_pct = _column(inputs, 'maintenance_pct')
+    vacancy_pct = _column(inputs, 'vacancy_pct')
+
+    # Same expressions (and evaluation order) as perform_brrrr_calculations, so both
+    # paths agree to within floating-point rounding (NumPy's pow can differ by an ulp).
+    down_payment_1_decimal = down_payment_1_pct / 100
+    refinance_decimal = refinance_pct / 100
+    prop_management_decimal = property_management_pct / 100
+    maintenance_decimal = maintenance_pct / 100
+    vacancy_decimal = vacancy_pct / 100
+
+    hard_money_loan_amount = (purchase_price * (1 - down_payment_1_decimal)) + rehab_cost
+    monthly_interest_only_hm = (hard_money_loan_amount * (interest_rate_1 / 100)) / 12
+    monthly_property_tax_actual = property_tax / 12
+    monthly_insurance_actual = insurance / 12
+    holding_costs_rehab = (monthly_interest_only_hm * rehab_period_months) + \
+                          (monthly_property_tax_actual * rehab_period_months) + \
+                          (monthly_insurance_actual * rehab_period_months)
+
+    refinance_loan_amount = arv * refinance_decimal
+
+    total_initial_investment = (purchase_price * down_payment_1_decimal) + closing_costs_1
+    total_out_of_pocket = total_initial_investment + holding_costs_rehab
+    money_from_refi_after_payoff = refinance_loan_amount - hard_money_loan_amount - closing_costs_2
+    cash_left_in_deal = total_out_of_pocket - money_from_refi_after_payoff
+    equity_created = arv - refinance_loan_amount
+
+    monthly_mortgage_refi = calculate_monthly_payment_batch(refinance_loan_amount, interest_rate_2, loan_term_years)
+    monthly_property_management = rent_estimate * prop_management_decimal
+    monthly_maintenance = rent_estimate * maintenance_decimal
+    monthly_vacancy = rent_estimate * vacancy_decimal
+    monthly_operating_expenses = monthly_property_management + monthly_maintenance + \
+                                 monthly_vacancy + monthly_property_tax_actual + monthly_insurance_actual
+    monthly_cash_flow = rent_estimate - monthly_operating_expenses - monthly_mortgage_refi
+    annual_cash_flow = monthly_cash_flow * 12
+
+    cash_on_cash_return = cash_on_cash_return_batch(annual_cash_flow, cash_left_in_deal)
+
+    outputs = {
+        'total_initial_investment': total_initial_investment,
+        'hard_money_loan_amount': hard_money_loan_amount,
+        'monthly_interest_only_hm': monthly_interest_only_hm,
+        'holding_costs_rehab': holding_costs_rehab,
+        'total_out_of_pocket': total_out_of_pocket,
+        'refinance_loan_amount': refinance_loan_amount,
+        'money_from_refi_after_payoff': money_from_refi_after_payoff,
+        'cash_left_in_deal': cash_left_in_deal,
+        'equity_created': equity_created,
+        'monthly_mortgage_refi': monthly_mortgage_refi,
+        'monthly_operating_expenses': monthly_operating_expenses,
+        'monthly_cash_flow': monthly_cash_flow,
+        'annual_cash_flow': annual_cash_flow,
+        'cash_on_cash_return': cash_on_cash_return,
+    }
+    shape = np.broadcast_shapes(*(np.shape(v) for v in outputs.values()))
+    outputs = {name: np.broadcast_to(np.asarray(value, dtype=float), shape) for name, value in outputs.items()}
+
+    valid = np.ones(shape, dtype=bool)
+    for name in NUMERIC_INPUT_COLUMNS:
+        valid &= np.isfinite(_column(inputs, name))
+    outputs['results_calculated'] = valid
+    return outputs
+
+
+def parse_deal_inputs(mapping):
+    """
+    Converts a mapping of raw values (form strings, JSON numbers, DB rows) into the
+    numeric inputs of a deal, using the scalar path's float()/int() parsing and its
+    defaults for missing fields. Raises ValueError on anything unparseable.
+    """
+    parsed = {}
+    for name in NUMERIC_INPUT_COLUMNS:
+        value = mapping.get(name, 0)
+        if value is None or value == "":
+            raise ValueError(f"'{name}' is required.")
+        if name in INTEGER_INPUT_COLUMNS:
+            parsed[name] = int(value)
+        else:
+            parsed[name] = float(value)
+    return parsed
+
+
+def array_to_json(values):
+    """Converts an array to nested lists, mapping non-finite numbers (e.g. infinite CoC) to None."""
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    as_objects = values.astype(object)
+    as_objects[~finite] = None
+    return as_objects.tolist()
+
+
+# --- Sensitivity grids ---
+GRID_OUTPUTS = ('monthly_cash_flow', 'cash_left_in_deal', 'cash_on_cash_return')
+GRID_MAX_AXES = 3
+GRID_MAX_CELLS = 1_000_000
+
+
+def build_grid_axes(axes_spec):
+    """
+    Turns a list of axis specs into [(input_name, values_array), ...]. Each spec
+    names a numeric input and gives either explicit `values` or a
+    `start`/`stop`/`num` range (inclusive, like numpy.linspace).
+    """
+    if not axes_spec or len(axes_spec) > GRID_MAX_AXES:
+        raise ValueError(f"Provide between 1 and {GRID_MAX_AXES} axes.")
+    axes = []
+    cells = 1
+    for spec in axes_spec:
+        name = spec.get('name')
+        if name not in NUMERIC_INPUT_COLUMNS:
+            raise ValueError(f"'{name}' is not a numeric BRRRR input.")
+        if name in (axis_name for axis_name, _ in axes):
+            raise ValueError(f"'{name}' appears on more than one axis.")
+        if 'values' in spec:
+            values = np.asarray([float(v) for v in spec['values']], dtype=float)
+        else:
+            num = int(spec.get('num', 10))
+            if num < 1:
+                raise ValueError(f"Axis '{name}' needs at least one point.")
+            # Checked before the axis is allocated, since `num` comes straight from the request.
+            if cells * num > GRID_MAX_CELLS:
+                raise ValueError(f"Grid has at least {cells * num} cells; the limit is {GRID_MAX_CELLS}.")
+            values = np.linspace(float(spec['start']), float(spec['stop']), num)
+        if values.size == 0 or not np.isfinite(values).all():
+            raise ValueError(f"Axis '{name}' needs at least one finite value.")
+        if name in INTEGER_INPUT_COLUMNS:
+            values = np.trunc(values)
+        cells *= values.size
+        axes.append((name, values))
+    if cells > GRID_MAX_CELLS:
+        raise ValueError(f"Grid has {cells} cells; the limit is {GRID_MAX_CELLS}.")
+    return axes
+
+
+def calculate_brrrr_grid(base_inputs, axes):
+    """
+    Evaluates a deal over the outer product of the given axes in one broadcasted
+    pass. Axis i varies along dimension i of every returned array.
+    """
+    inputs = dict(base_inputs)
+    for i, (name, values) in enumerate(axes):
+        shape = [1] * len(axes)
+        shape[i] = values.size
+        inputs[name] = values.reshape(shape)
+    outputs = perform_brrrr_calculations_batch(inputs)
+    return {name: outputs[name] for name in GRID_OUTPUTS}
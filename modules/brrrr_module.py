@@ -1,6 +1,18 @@
 # modules/brrrr_module.py
-from flask import Blueprint, render_template, request, url_for, redirect
-from app import get_db  # Import get_db from main app
+from flask import Blueprint, render_template, request, url_for, redirect, jsonify, Response, stream_with_context
+import hashlib
+import json
+import os
+from modules.db import get_db
+from modules.brrrr_engine import parse_deal_inputs, build_grid_axes, calculate_brrrr_grid, array_to_json, \
+    NUMERIC_INPUT_COLUMNS, OUTPUT_COLUMNS
+from modules.brrrr_simulation import run_simulation, DEFAULT_ASSUMPTIONS, MAX_TRIALS
+from modules.deal_optimizer import solve_deals, parse_targets, SOLVE_OUTPUTS
+from modules.property_store import upsert_property, METRICS_VERSION
+from modules.cache_utils import TTLCache
+from modules import metrics
+from modules.jobs import enqueue_job
+from modules.jobs_module import background_requested, job_accepted
 
 brrrr_bp = Blueprint('brrrr_bp', __name__)
 
@@ -122,6 +134,15 @@ def perform_brrrr_calculations(form_inputs):
 
     return calculated_outputs, error
 
+def load_property(property_id):
+    """Fetches one saved property row by id, or None if it does not exist."""
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute("SELECT * FROM properties WHERE id = %s", (property_id,))
+    prop_data = cursor.fetchone()
+    cursor.close()
+    return prop_data
+
 @brrrr_bp.route("/brrrr_calculator", methods=["GET", "POST"], endpoint="brrrr_calculator_full_page")
 def brrrr_calculator_page():
     error = None
@@ -140,11 +161,7 @@ def brrrr_calculator_page():
 
     property_id = request.args.get('property_id')
     if request.method == "GET" and property_id:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("SELECT * FROM properties WHERE id = %s", (property_id,))
-        prop_data = cursor.fetchone()
-        cursor.close()
+        prop_data = load_property(property_id)
 
         if prop_data:
             message = f"Property '{prop_data['property_address']}' loaded successfully! Click 'Calculate BRRRR' to view results."
@@ -165,58 +182,16 @@ def brrrr_calculator_page():
 
         if not error and action == 'save':
             db = get_db()
-            cursor = db.cursor()
             try:
                 property_address = form_inputs.get("property_address")
                 if not property_address:
                     raise ValueError("Cannot save property: Address/Name is required.")
 
-                cursor.execute("SELECT id FROM properties WHERE property_address = %s", (property_address,))
-                existing_property = cursor.fetchone()
-
-                columns = """
-                    property_address, purchase_price, rehab_cost, closing_costs_1, arv,
-                    down_payment_1_pct, interest_rate_1, rehab_period_months,
-                    refinance_pct, interest_rate_2, loan_term_years, closing_costs_2,
-                    rent_estimate, property_tax, insurance, property_management_pct,
-                    maintenance_pct, vacancy_pct
-                """
-                values_tuple = (
-                    property_address,
-                    float(form_inputs.get('purchase_price', 0.0)),
-                    float(form_inputs.get('rehab_cost', 0.0)),
-                    float(form_inputs.get('closing_costs_1', 0.0)),
-                    float(form_inputs.get('arv', 0.0)),
-                    float(form_inputs.get('down_payment_1_pct', 0.0)),
-                    float(form_inputs.get('interest_rate_1', 0.0)),
-                    int(form_inputs.get('rehab_period_months', 0)),
-                    float(form_inputs.get('refinance_pct', 0.0)),
-                    float(form_inputs.get('interest_rate_2', 0.0)),
-                    int(form_inputs.get('loan_term_years', 0)),
-                    float(form_inputs.get('closing_costs_2', 0.0)),
-                    float(form_inputs.get('rent_estimate', 0.0)),
-                    float(form_inputs.get('property_tax', 0.0)),
-                    float(form_inputs.get('insurance', 0.0)),
-                    float(form_inputs.get('property_management_pct', 0.0)),
-                    float(form_inputs.get('maintenance_pct', 0.0)),
-                    float(form_inputs.get('vacancy_pct', 0.0))
-                )
-
-                if existing_property:
-                    set_clause_parts = [f"{col} = %s" for col in columns.split(', ') if col.strip() != 'property_address']
-                    set_clause = ", ".join(set_clause_parts)
-                    update_values = values_tuple[1:] + (property_address,)
-                    cursor.execute(f"""
-                       UPDATE properties SET {set_clause}, saved_at = CURRENT_TIMESTAMP
-                        WHERE property_address = %s
-                    """, update_values)
-                    message = f"Property '{property_address}' updated successfully!"
-                else:
-                    placeholders = ", ".join(["%s"] * len(values_tuple))
-                    cursor.execute(f"""
-                        INSERT INTO properties ({columns}) VALUES ({placeholders})
-                    """, values_tuple)
+                _, inserted = upsert_property(db, form_inputs)
+                if inserted:
                     message = f"Property '{property_address}' saved successfully!"
+                else:
+                    message = f"Property '{property_address}' updated successfully!"
                 db.commit()
 
             except ValueError as ve:
@@ -224,8 +199,6 @@ def brrrr_calculator_page():
             except Exception as e:
                 db.rollback()
                 error = f"Database error while saving: {e}"
-            finally:
-                cursor.close()
 
         for key, value in form_data_for_template.items():
             if not isinstance(value, str) and value is not None:
@@ -249,4 +222,183 @@ def brrrr_calculator_page():
         hide_default_inputs=False,
         **form_data_for_template,
         **calculated_outputs
-    )
\ No newline at end of file
+    )
+
+@brrrr_bp.route("/brrrr_calculator/grid", methods=["POST"])
+def brrrr_grid():
+    """
+    Sensitivity grid: evaluates a base deal over ranges of 1-3 inputs in one pass.
+
+    JSON body: {"base": {...inputs...}} or {"property_id": 1}, plus
+    "axes": [{"name": "interest_rate_2", "start": 5, "stop": 8, "num": 50}, ...]
+    (or {"name": ..., "values": [...]}). Returns the axis values and the
+    monthly_cash_flow, cash_left_in_deal and cash_on_cash_return grids;
+    infinite CoC values are returned as null.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if payload.get('property_id') is not None:
+            base = load_property(int(payload['property_id']))
+            if not base:
+                return jsonify({'error': "Property not found."}), 404
+        else:
+            base = payload.get('base') or {}
+        base_inputs = parse_deal_inputs(base)
+        axes = build_grid_axes(payload.get('axes') or [])
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': f"Invalid grid request: {e}"}), 400
+
+    grid = calculate_brrrr_grid(base_inputs, axes)
+    response = {'axes': [{'name': name, 'values': values.tolist()} for name, values in axes]}
+    response.update({name: array_to_json(values) for name, values in grid.items()})
+    return jsonify(response)
+
+@brrrr_bp.route("/brrrr_calculator/solve", methods=["POST"])
+def brrrr_solve():
+    """
+    Solver mode: finds the max purchase_price, min rent_estimate or min
+    refinance_pct at which a deal meets every target.
+
+    JSON body: {"base": {...inputs...}} or {"property_id": 1}, plus
+    "solve_for": "purchase_price", "targets": {"min_cash_on_cash_return": 12,
+    "max_cash_left_in_deal": 5000, "min_monthly_cash_flow": 200} (any subset) and
+    optionally "bounds": [lo, hi] for the search. Returns the solved value, its
+    status and the resulting cash left, cash flow and CoC return.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        if payload.get('property_id') is not None:
+            base = load_property(int(payload['property_id']))
+            if not base:
+                return jsonify({'error': "Property not found."}), 404
+        else:
+            base = payload.get('base') or {}
+        base_inputs = parse_deal_inputs(base)
+        solve_for = payload.get('solve_for', 'purchase_price')
+        targets = parse_targets(payload.get('targets') or {})
+        bounds = payload.get('bounds')
+        if bounds is not None:
+            bounds = (float(bounds[0]), float(bounds[1]))
+        solution = solve_deals(base_inputs, solve_for, targets, bounds)
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        return jsonify({'error': f"Invalid solve request: {e}"}), 400
+
+    response = {
+        'solve_for': solve_for,
+        'targets': targets,
+        'current_value': base_inputs[solve_for],
+        'value': array_to_json(solution['value'])[0],
+        'status': solution['status'][0],
+    }
+    response.update({name: array_to_json(solution[name])[0] for name in SOLVE_OUTPUTS})
+    return jsonify(response)
+
+# Bounds the work one streamed simulation request can do; larger runs go to a job.
+MAX_INLINE_TRIALS = int(os.environ.get('SIMULATION_MAX_INLINE_TRIALS', 1_000_000))
+
+@brrrr_bp.route("/brrrr_calculator/simulate/<int:property_id>", methods=["GET", "POST"])
+def brrrr_simulate(property_id):
+    """
+    Monte Carlo risk simulation for a saved property. Streams newline-delimited
+    JSON: one cumulative percentile summary per completed chunk of trials.
+
+    Options (query string or JSON body): trials (default 100000), seed,
+    processes (fan out across worker processes, see brrrr_simulation.MAX_PROCESSES)
+    and assumptions (overrides for brrrr_simulation.DEFAULT_ASSUMPTIONS). POST with
+    ?background=1 runs it as a job whose result is the final summary; streamed
+    runs are limited to SIMULATION_MAX_INLINE_TRIALS trials.
+    """
+    options = dict(request.args)
+    options.update(request.get_json(silent=True) or {})
+    try:
+        trials = int(options.get('trials', 100_000))
+        seed = int(options['seed']) if options.get('seed') not in (None, "") else None
+        processes = min(int(options.get('processes', 1)), os.cpu_count() or 1)
+        assumptions = {key: float(value) for key, value in (options.get('assumptions') or {}).items()
+                       if key in DEFAULT_ASSUMPTIONS}
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f"Invalid simulation options: {e}"}), 400
+    if trials > MAX_INLINE_TRIALS and not background_requested():
+        return jsonify({'error': f"Invalid simulation options: more than {MAX_INLINE_TRIALS} trials must run "
+                                 "in the background (POST with ?background=1)."}), 400
+
+    prop_data = load_property(property_id)
+    if not prop_data:
+        return jsonify({'error': "Property not found."}), 404
+    if background_requested():
+        if not 1 <= trials <= MAX_TRIALS:
+            return jsonify({'error': f"Invalid simulation options: trials must be between 1 and {MAX_TRIALS}."}), 400
+        job = enqueue_job(get_db(), 'simulation', {'property_id': property_id, 'trials': trials, 'seed': seed,
+                                                   'processes': processes, 'assumptions': assumptions})
+        return job_accepted(job)
+    try:
+        base_inputs = parse_deal_inputs(prop_data)
+        summaries = run_simulation(base_inputs, trials=trials, seed=seed,
+                                   assumptions=assumptions, processes=processes)
+        first = next(summaries)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid simulation options: {e}"}), 400
+
+    def generate():
+        yield json.dumps(dict(first, property_id=property_id, seed=seed)) + "\n"
+        for summary in summaries:
+            yield json.dumps(dict(summary, property_id=property_id, seed=seed)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# --- JSON API ---
+# Results depend only on the numeric inputs, so they are cached on the canonical
+# input vector (shared across addresses) for BRRRR_API_CACHE_TTL seconds.
+api_cache = TTLCache(
+    maxsize=int(os.environ.get('BRRRR_API_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('BRRRR_API_CACHE_TTL', 600)),
+)
+metrics.register_stats('brrrr_api_cache', "/api/brrrr response cache", api_cache.stats)
+
+def canonical_input_key(form_inputs):
+    """The parsed numeric inputs in column order; equal deals give equal keys however they were typed."""
+    parsed = parse_deal_inputs(form_inputs)
+    return tuple(parsed[name] for name in NUMERIC_INPUT_COLUMNS)
+
+@brrrr_bp.route("/api/brrrr", methods=["GET", "POST"])
+def brrrr_api():
+    """
+    JSON version of the calculator: takes the same 18 inputs (JSON body or query
+    string) and returns the calculated outputs without rendering a template.
+    Responses carry an ETag derived from the inputs, so polling clients can send
+    If-None-Match and get 304 Not Modified for unchanged deals. Infinite CoC is
+    returned as null with "infinite_coc": true.
+    """
+    form_inputs = dict(request.args)
+    form_inputs.update(request.get_json(silent=True) or {})
+
+    try:
+        if not str(form_inputs.get("property_address", "")).strip():
+            raise ValueError("Property Address/Name is required to calculate.")
+        key = canonical_input_key(form_inputs)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f"Please ensure all inputs are valid numbers and all required fields are filled. Error: {e}"}), 400
+
+    hit, cached = api_cache.get(key)
+    if hit:
+        body, etag = cached
+    else:
+        calculated_outputs, error = perform_brrrr_calculations(form_inputs)
+        if error:
+            return jsonify({'error': error}), 400
+        body = {name: array_to_json(calculated_outputs[name]) for name in OUTPUT_COLUMNS}
+        body['infinite_coc'] = calculated_outputs['cash_on_cash_return'] == float('inf')
+        # Same inputs and the same formula version always give the same outputs.
+        etag = hashlib.sha256(json.dumps([METRICS_VERSION, key]).encode()).hexdigest()[:32]
+        api_cache.set(key, (body, etag))
+
+    response = jsonify(body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response.make_conditional(request)
+
+@brrrr_bp.route("/api/brrrr/cache_stats")
+def brrrr_api_cache_stats():
+    """Hit/miss counters for the /api/brrrr response cache."""
+    return jsonify(api_cache.stats())
@@ -0,0 +1,132 @@
+# modules/brrrr_simulation.py
+# Monte Carlo risk simulation for a single deal, built on the batch engine.
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from modules.brrrr_engine import perform_brrrr_calculations_batch
+
+SIMULATION_OUTPUTS = ('cash_left_in_deal', 'monthly_cash_flow', 'cash_on_cash_return')
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+CHUNK_SIZE = 25_000
+MAX_TRIALS = 5_000_000
+PROGRESS_UPDATES = 20  # intermediate summaries per run, however many chunks it has
+# Each web worker runs at most SIMULATION_MAX_PARALLEL process-pool simulations at
+# once, of at most SIMULATION_MAX_PROCESSES processes each; others run inline.
+MAX_PROCESSES = int(os.environ.get('SIMULATION_MAX_PROCESSES', min(4, os.cpu_count() or 1)))
+MAX_PARALLEL = int(os.environ.get('SIMULATION_MAX_PARALLEL', 1))
+_parallel_slots = threading.BoundedSemaphore(max(MAX_PARALLEL, 1))
+
+# How each uncertain input is sampled around the deal's own value.
+DEFAULT_ASSUMPTIONS = {
+    'arv_sd_pct': 7.5,                 # ARV ~ Normal(arv, arv * 7.5%)
+    'rehab_cost_low_pct': 90.0,        # rehab cost ~ Triangular(90%, 100%, 140%) of estimate
+    'rehab_cost_high_pct': 140.0,
+    'rehab_delay_mean_months': 1.0,    # extra rehab months ~ Poisson(1)
+    'vacancy_sd_points': 3.0,          # vacancy % ~ Normal(vacancy_pct, 3), clipped to [0, 100]
+    'interest_rate_2_sd_points': 0.75, # refinance rate % ~ Normal(interest_rate_2, 0.75), clipped at 0
+}
+
+
+def sample_deals(base_inputs, assumptions, trials, rng):
+    """Draws `trials` perturbed copies of a deal as columnar batch-engine inputs."""
+    inputs = {name: np.full(trials, float(value)) for name, value in base_inputs.items()}
+
+    arv = base_inputs['arv']
+    inputs['arv'] = np.maximum(rng.normal(arv, abs(arv) * assumptions['arv_sd_pct'] / 100, trials), 0.0)
+
+    low = assumptions['rehab_cost_low_pct'] / 100
+    high = assumptions['rehab_cost_high_pct'] / 100
+    low, high = min(low, 1.0), max(high, 1.0)
+    # numpy rejects a zero-width triangular distribution, i.e. a fixed rehab cost.
+    factor = rng.triangular(low, 1.0, high, trials) if low < high else np.full(trials, 1.0)
+    inputs['rehab_cost'] = base_inputs['rehab_cost'] * factor
+
+    inputs['rehab_period_months'] = base_inputs['rehab_period_months'] + \
+        rng.poisson(assumptions['rehab_delay_mean_months'], trials)
+
+    inputs['vacancy_pct'] = np.clip(
+        rng.normal(base_inputs['vacancy_pct'], assumptions['vacancy_sd_points'], trials), 0.0, 100.0)
+
+    inputs['interest_rate_2'] = np.maximum(
+        rng.normal(base_inputs['interest_rate_2'], assumptions['interest_rate_2_sd_points'], trials), 0.0)
+    return inputs
+
+
+def simulate_chunk(base_inputs, assumptions, trials, seed_sequence):
+    """Runs one independent chunk of trials; top-level so it can run in a worker process."""
+    rng = np.random.default_rng(seed_sequence)
+    outputs = perform_brrrr_calculations_batch(sample_deals(base_inputs, assumptions, trials, rng))
+    return {name: np.ascontiguousarray(outputs[name]) for name in SIMULATION_OUTPUTS}
+
+
+def summarize(samples, trials):
+    """Percentiles (and a few risk probabilities) over the samples collected so far."""
+    completed = samples['cash_left_in_deal'].size
+    summary = {'completed': completed, 'trials': trials, 'done': completed >= trials, 'percentiles': {}}
+    for name in SIMULATION_OUTPUTS:
+        values = samples[name]
+        # No interpolation, so infinite CoC trials don't turn neighbouring percentiles into NaN.
+        points = np.percentile(values, PERCENTILES, method='inverted_cdf')
+        summary['percentiles'][name] = {
+            f"p{p}": (float(v) if np.isfinite(v) else None) for p, v in zip(PERCENTILES, points)
+        }
+    summary['prob_negative_cash_flow'] = float(np.mean(samples['monthly_cash_flow'] < 0))
+    summary['prob_cash_left_above_zero'] = float(np.mean(samples['cash_left_in_deal'] > 0))
+    summary['prob_infinite_coc'] = float(np.mean(np.isinf(samples['cash_on_cash_return'])))
+    return summary
+
+
+def _chunk_results(base_inputs, assumptions, chunk_sizes, seeds, processes):
+    """Yields chunk outputs in completion order, on a process pool when one is allowed."""
+    processes = min(processes or 1, MAX_PROCESSES, len(chunk_sizes))
+    if processes <= 1 or not _parallel_slots.acquire(blocking=False):
+        for size, seq in zip(chunk_sizes, seeds):
+            yield simulate_chunk(base_inputs, assumptions, size, seq)
+        return
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [executor.submit(simulate_chunk, base_inputs, assumptions, size, seq)
+                   for size, seq in zip(chunk_sizes, seeds)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Don't run the remaining chunks if the consumer stops early (e.g. a client disconnects).
+        executor.shutdown(wait=True, cancel_futures=True)
+        _parallel_slots.release()
+
+
+def run_simulation(base_inputs, trials=100_000, seed=None, assumptions=None, processes=None,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Generator running a seeded Monte Carlo simulation in chunks and yielding a
+    cumulative summary as chunks complete: at most PROGRESS_UPDATES of them,
+    the last with done=True.
+
+    Each chunk gets its own child of SeedSequence(seed), so the final result is
+    identical for a given seed whether chunks run inline or across `processes`
+    worker processes (only the intermediate summaries may differ).
+    """
+    if trials < 1 or trials > MAX_TRIALS:
+        raise ValueError(f"trials must be between 1 and {MAX_TRIALS}.")
+    assumptions = dict(DEFAULT_ASSUMPTIONS, **(assumptions or {}))
+    chunk_sizes = [chunk_size] * (trials // chunk_size)
+    if trials % chunk_size:
+        chunk_sizes.append(trials % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    # Chunks are stored in completion order; the summaries don't depend on order.
+    samples = {name: np.empty(trials) for name in SIMULATION_OUTPUTS}
+    completed = 0
+    next_update = 1
+    chunks = _chunk_results(base_inputs, assumptions, chunk_sizes, seeds, processes)
+    for done, chunk in enumerate(chunks, start=1):
+        size = chunk['cash_left_in_deal'].size
+        for name in SIMULATION_OUTPUTS:
+            samples[name][completed:completed + size] = chunk[name]
+        completed += size
+        if done * PROGRESS_UPDATES >= next_update * len(chunk_sizes) or done == len(chunk_sizes):
+            next_update = done * PROGRESS_UPDATES // len(chunk_sizes) + 1
+            yield summarize({name: values[:completed] for name, values in samples.items()}, trials)
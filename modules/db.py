@@ -0,0 +1,97 @@
+# modules/db.py
+# Per-request PostgreSQL connections from a process-wide pool. Lives outside app.py
+# so blueprints can import get_db without importing the application module.
+import os
+import threading
+
+import psycopg2
+from flask import g, current_app
+
+from modules.db_pool import pool_from_env
+from modules import metrics
+
+# DATABASE_URL will be set as an environment variable on Render
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+    Pool size and timeouts come from DB_POOL_MIN, DB_POOL_MAX,
+    DB_POOL_IDLE_TIMEOUT, DB_POOL_TIMEOUT and DB_POOL_CHECK_AFTER (idle
+    seconds after which a connection is probed before reuse).
+    """
+    global _db_pool
+    if _db_pool is None:
+        if not DATABASE_URL:
+            current_app.logger.error("DATABASE_URL environment variable is not set.")
+            raise ValueError("DATABASE_URL environment variable is not set.")
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = pool_from_env(DATABASE_URL, cursor_factory=metrics.TimedCursor)
+                current_app.logger.info(
+                    f"Database connection pool created (min={_db_pool.minconn}, max={_db_pool.maxconn})."
+                )
+    return _db_pool
+
+
+def pool_stats():
+    """Pool counters, or None if no connection has been requested yet in this process."""
+    return _db_pool.stats() if _db_pool is not None else None
+
+
+def get_db():
+    """
+    Checks a PostgreSQL connection out of the pool or returns the one already held.
+    Uses Flask's g object to keep the connection for the duration of the request;
+    it goes back to the pool in close_connection.
+    """
+    db = getattr(g, '_database', None)
+    if db is None:
+        try:
+            pool = get_db_pool()
+            with metrics.timed('db_checkout'):
+                db = g._database = pool.getconn()
+        except Exception as e:
+            current_app.logger.error(f"Failed to get a database connection: {e}")
+            # Re-raise the exception to make the error visible in the application
+            raise
+    return db
+
+
+def close_connection(exception):
+    """
+    Returns the request's database connection to the pool at the end of the
+    application context. Connections that failed at the connection level are
+    discarded instead of being reused.
+    """
+    db = g.pop('_database', None)
+    if db is not None:
+        broken = db.closed or isinstance(exception, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        if broken:
+            current_app.logger.warning("Discarding broken database connection.")
+        get_db_pool().putconn(db, discard=broken)
+
+
+def init_db(app):
+    """
+    Initializes the database by executing the schema.sql script.
+    """
+    with app.app_context():
+        db = get_db() # Use get_db to ensure a connection
+        with app.open_resource('schema.sql', mode='r') as f:
+            cursor = db.cursor()
+            cursor.execute(f.read())
+            db.commit()
+            cursor.close()
+    app.logger.info("Database initialized/updated successfully.")
+
+
+def init_app(app):
+    app.teardown_appcontext(close_connection)
+
+
+metrics.register_stats('db_pool', "Database connection pool", pool_stats)
@@ -0,0 +1,299 @@
+# modules/db_pool.py
+import os
+import threading
+import time
+import logging
+import weakref
+
+import psycopg2
+from psycopg2 import extensions, extras
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe PostgreSQL connection pool.
+
+    - Opens connections on demand, up to `maxconn`; once opened, at least
+      `minconn` of them are kept rather than expired (none are opened up front).
+    - Callers block (up to `timeout` seconds) when every connection is checked out.
+    - Idle connections beyond `minconn` are closed after `idle_timeout` seconds,
+      by a background reaper thread as well as on checkout/return, so they also
+      expire on a quiet worker.
+    - A connection that sat idle for more than `check_after` seconds is probed
+      with `SELECT 1` on checkout (outside the pool lock) and replaced if the
+      server side went away, so a killed backend never reaches a request.
+      Recently used connections are handed out without a round trip.
+    - Fork-aware: a process that inherits the pool (e.g. a gunicorn worker forked
+      from a --preload master) starts over with fresh connections.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, idle_timeout=300.0, timeout=30.0,
+                 cursor_factory=extras.RealDictCursor, check_after=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.cursor_factory = cursor_factory
+        self.check_after = check_after
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._reset_state()
+        if hasattr(os, 'register_at_fork'):
+            pool_ref = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _reset_after_fork(pool_ref))
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []          # list of (connection, returned_at), most recently used last
+        self._in_use = set()
+        self._closed = False
+        self._reaper = None      # started lazily, so a forking master never owns one
+        self._stats = {
+            'connections_created': 0,
+            'connections_discarded': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_seconds': 0.0,
+            'timeouts': 0,
+            'liveness_checks': 0,
+            'liveness_failures': 0,
+        }
+
+    def _after_fork_in_child(self):
+        # Connections inherited across fork() share their sockets with the parent.
+        # Never use or close them here: closing would terminate the parent's sessions.
+        # The lock may have been held by another parent thread at fork time, so it
+        # is replaced rather than acquired.
+        _orphaned_connections.extend(conn for conn, _ in self._idle)
+        _orphaned_connections.extend(c for c in self._in_use if hasattr(c, 'closed'))
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._reset_state()
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.cursor_factory = self.cursor_factory
+        return conn
+
+    def _discard(self, conn):
+        self._stats['connections_discarded'] += 1
+        if not conn.closed:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.warning(f"Error while closing pooled connection: {e}")
+
+    def _evict_idle(self):
+        """Closes idle connections past `idle_timeout` while keeping at least `minconn` open."""
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        total = len(self._idle) + len(self._in_use)
+        keep = []
+        # Oldest first, so the most recently used connections survive.
+        for conn, returned_at in self._idle:
+            if now - returned_at > self.idle_timeout and total > self.minconn:
+                self._discard(conn)
+                total -= 1
+            else:
+                keep.append((conn, returned_at))
+        self._idle = keep
+
+    def getconn(self):
+        """
+        Checks a connection out of the pool, opening a new one if below `maxconn`.
+        Connections idle for longer than `check_after` are probed first; dead ones
+        are discarded and the checkout is retried.
+        """
+        while True:
+            conn, idle_for, placeholder, waited_since = self._reserve()
+            if conn is None:
+                return self._open(placeholder, waited_since)
+            if self.check_after is None or idle_for <= self.check_after or self._is_alive(conn):
+                return conn
+            with self._available:
+                self._stats['liveness_failures'] += 1
+                self._in_use.discard(conn)
+                self._discard(conn)
+                self._available.notify()
+            logger.warning("Discarded a pooled connection that failed its liveness check.")
+
+    def _reserve(self):
+        """
+        Waits for an idle connection or a free slot. Returns (connection, seconds
+        idle, None, None), or (None, None, placeholder, waited_since) with the slot
+        held by `placeholder` until a new connection is opened.
+        """
+        deadline = None
+        waited_since = None
+        with self._available:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed.")
+                self._evict_idle()
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if conn.closed:
+                        self._discard(conn)
+                        continue
+                    return self._checkout(conn, waited_since), time.monotonic() - returned_at, None, None
+                if len(self._in_use) < self.maxconn:
+                    # Reserve the slot before releasing the lock to connect.
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    return None, None, placeholder, waited_since
+                if waited_since is None:
+                    waited_since = time.monotonic()
+                    deadline = waited_since + self.timeout
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_time_seconds'] += time.monotonic() - waited_since
+                    raise PoolTimeout(f"No database connection available after {self.timeout} seconds.")
+                self._available.wait(remaining)
+
+    def _open(self, placeholder, waited_since):
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._available:
+                self._in_use.discard(placeholder)
+                self._available.notify()
+            raise
+        with self._available:
+            self._in_use.discard(placeholder)
+            self._stats['connections_created'] += 1
+            return self._checkout(conn, waited_since)
+
+    def _is_alive(self, conn):
+        """Round-trips `SELECT 1` on a connection that has been idle for a while."""
+        with self._lock:
+            self._stats['liveness_checks'] += 1
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _checkout(self, conn, waited_since):
+        self._in_use.add(conn)
+        self._stats['checkouts'] += 1
+        if waited_since is not None:
+            self._stats['wait_time_seconds'] += time.monotonic() - waited_since
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Returns a connection to the pool. Pass `discard=True` when the connection
+        raised an OperationalError/InterfaceError so it is replaced rather than reused.
+        """
+        with self._available:
+            if conn not in self._in_use:
+                # Checked out before a fork, or returned twice; nothing to do.
+                return
+            reusable = not discard and not conn.closed and not self._closed
+        # The rollback is a server round trip, so it runs outside the lock. The
+        # connection still counts as in use meanwhile, so its slot is not handed out.
+        if reusable:
+            try:
+                # Never hand the next request an open transaction.
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                discard = True
+        with self._available:
+            if conn not in self._in_use:
+                # Returned concurrently by another thread, or the process forked meanwhile.
+                return
+            self._in_use.discard(conn)
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._start_reaper()
+            self._evict_idle()
+            self._available.notify()
+
+    def _start_reaper(self):
+        """Starts the idle-eviction thread for this process on first use (called with the lock held)."""
+        if self._reaper is not None or not self.idle_timeout:
+            return
+        self._reaper = threading.Thread(target=_reap_idle, args=(weakref.ref(self), self.idle_timeout / 2),
+                                        name='db-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def closeall(self):
+        """Closes every idle connection and refuses further checkouts."""
+        with self._available:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._available.notify_all()
+
+    def stats(self):
+        """Returns a snapshot of pool counters for sizing and monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'pid': self._pid,
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+            })
+        stats['avg_wait_seconds'] = (stats['wait_time_seconds'] / stats['waits']) if stats['waits'] else 0.0
+        return stats
+
+
+# Connections inherited from a parent process; referenced here so they are never
+# garbage collected (and therefore never closed) in the child.
+_orphaned_connections = []
+
+
+def _reap_idle(pool_ref, interval):
+    """Evicts expired idle connections every `interval` seconds until the pool is closed or collected."""
+    while True:
+        time.sleep(interval)
+        pool = pool_ref()
+        if pool is None or pool._closed or pool._pid != os.getpid():
+            return
+        with pool._available:
+            pool._evict_idle()
+        del pool
+
+
+def _reset_after_fork(pool_ref):
+    pool = pool_ref()
+    if pool is not None:
+        pool._after_fork_in_child()
+
+
+def pool_from_env(dsn, cursor_factory=extras.RealDictCursor):
+    """Builds a ConnectionPool configured from DB_POOL_* environment variables."""
+    return ConnectionPool(
+        dsn,
+        cursor_factory=cursor_factory,
+        minconn=int(os.environ.get('DB_POOL_MIN', 1)),
+        maxconn=int(os.environ.get('DB_POOL_MAX', 10)),
+        idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+        timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        check_after=float(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+    )
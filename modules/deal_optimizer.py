@@ -0,0 +1,211 @@
+# modules/deal_optimizer.py
+# Solver mode for the BRRRR model: given return targets (e.g. CoC >= 12%, cash
+# left <= $5,000), finds the max purchase price, min rent or min refinance % that
+# meets all of them, for one deal or a whole block of deals at once.
+#
+# cash_left_in_deal and monthly_cash_flow are affine in each of the solvable
+# inputs (the refinance payment is linear in the loan amount). Every target is
+# therefore a set of affine conditions, inverted in closed form from two engine
+# evaluations per deal: a CoC target t is monthly cash flow > 0, cash left above
+# the engine's no-cash-left threshold and 1200 * monthly_cash_flow - t * cash_left >= 0.
+import math
+
+import numpy as np
+
+from modules.brrrr_engine import perform_brrrr_calculations_batch, cash_left_is_zero, NUMERIC_INPUT_COLUMNS
+from modules.projections import BLOCK_SIZE, _blocks
+
+# Solvable input -> which end of the feasible range is wanted.
+SOLVE_FOR = {'purchase_price': 'max', 'rent_estimate': 'min', 'refinance_pct': 'min'}
+# Target name -> (engine output, comparison).
+TARGETS = {
+    'min_cash_on_cash_return': ('cash_on_cash_return', '>='),
+    'max_cash_left_in_deal': ('cash_left_in_deal', '<='),
+    'min_monthly_cash_flow': ('monthly_cash_flow', '>='),
+}
+SOLVE_OUTPUTS = ('cash_left_in_deal', 'monthly_cash_flow', 'cash_on_cash_return')
+SOLVE_FIELDS = ('property_id', 'property_address', 'solve_for', 'current_value', 'value', 'status') + SOLVE_OUTPUTS
+
+
+def parse_targets(spec):
+    """Validates a {target name: value} mapping; raises ValueError if it is empty or unknown."""
+    if not spec:
+        raise ValueError(f"Provide at least one target: {', '.join(TARGETS)}.")
+    targets = {}
+    for name, value in spec.items():
+        if name not in TARGETS:
+            raise ValueError(f"Unknown target '{name}'; expected one of {', '.join(TARGETS)}.")
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"Target '{name}' must be a finite number.")
+        targets[name] = value
+    return targets
+
+
+def default_bounds(deals, solve_for):
+    """Search bracket used when the caller gives none: wide enough for any sensible deal."""
+    if solve_for == 'purchase_price':
+        return 0.0, 2 * np.maximum(np.abs(deals['arv']), np.abs(deals['purchase_price']))
+    if solve_for == 'rent_estimate':
+        return 0.0, np.maximum(np.maximum(4 * np.abs(deals['rent_estimate']), 0.05 * np.abs(deals['arv'])), 100.0)
+    return 0.0, 100.0
+
+
+def _evaluate(deals, solve_for, values):
+    inputs = dict(deals)
+    inputs[solve_for] = values
+    return perform_brrrr_calculations_batch(inputs)
+
+
+def _meets(outputs, targets):
+    """
+    True where every target holds. A CoC target is only met by a deal that
+    cash-flows; one with no cash left in it (the engine's rule) has an infinite
+    CoC return and meets any CoC target.
+    """
+    ok = np.ones(np.shape(outputs['cash_left_in_deal']), dtype=bool)
+    for name, target in targets.items():
+        output, comparison = TARGETS[name]
+        if output == 'cash_on_cash_return':
+            infinite = cash_left_is_zero(outputs['cash_left_in_deal'])
+            ok &= (outputs['monthly_cash_flow'] > 0) & (infinite | (outputs['cash_on_cash_return'] >= target))
+        elif comparison == '>=':
+            ok &= outputs[output] >= target
+        else:
+            ok &= outputs[output] <= target
+    return ok
+
+
+def _affine_conditions(outputs, targets):
+    """
+    Yields (value, comparison, bound) conditions on outputs, each affine in the
+    solved input, that together imply every target. A CoC target holds wherever
+    the deal cash-flows and either no cash is left in it (infinite CoC) or
+    1200 * monthly cash flow >= target * cash left with cash left positive.
+    The conditions cover that set except for a sub-cent sliver around zero cash left.
+    """
+    for name, target in targets.items():
+        output, comparison = TARGETS[name]
+        if output == 'cash_on_cash_return':
+            cash_flow, cash_left = outputs['monthly_cash_flow'], outputs['cash_left_in_deal']
+            yield cash_flow, '>=', 0.0
+            yield cash_left, '>=', -0.01
+            yield 1200 * cash_flow - target * cash_left, '>=', 0.0
+        else:
+            yield outputs[output], comparison, target
+
+
+def _affine_interval(deals, solve_for, targets, lo, hi):
+    """
+    Narrows [lo, hi] to where all targets hold, from the outputs at the two ends
+    of the bracket. Returns (low, high); low > high where no value works. Strict
+    inequalities (cash flow > 0) are checked again after rounding in solve_deals.
+    """
+    ends = _evaluate(deals, solve_for, np.stack([lo, hi]))
+    low, high = lo.copy(), hi.copy()
+    width = hi - lo
+    for values, comparison, target in _affine_conditions(ends, targets):
+        at_lo, at_hi = values[0], values[1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(width > 0, (at_hi - at_lo) / width, 0.0)
+            crossing = lo + (target - at_lo) / slope
+        # For '>=' a rising value gives a lower bound, a falling one an upper bound.
+        rising = slope > 0 if comparison == '>=' else slope < 0
+        falling = slope < 0 if comparison == '>=' else slope > 0
+        flat = slope == 0
+        low = np.where(rising, np.maximum(low, crossing), low)
+        high = np.where(falling, np.minimum(high, crossing), high)
+        flat_ok = at_lo >= target if comparison == '>=' else at_lo <= target
+        high = np.where(flat & ~flat_ok, -np.inf, high)
+    return low, high
+
+
+def solve_deals(deals, solve_for, targets, bounds=None):
+    """
+    Solves a block of deals at once.
+
+    `deals` maps each numeric input to a scalar or 1-D array (one entry per deal).
+    `solve_for` is a key of SOLVE_FOR and `targets` a parsed {target: value}
+    mapping. `bounds` optionally replaces the default (lo, hi) search bracket.
+
+    Returns a dict of arrays: 'value' (NaN when infeasible), 'status' ('solved';
+    'at_bound' when the targets never bind inside the bracket; 'infeasible'; or
+    'invalid' for non-finite inputs) and the SOLVE_OUTPUTS at the solution.
+    """
+    if solve_for not in SOLVE_FOR:
+        raise ValueError(f"Can only solve for {', '.join(SOLVE_FOR)}.")
+    direction = SOLVE_FOR[solve_for]
+    deals = {name: np.asarray(deals.get(name, 0), dtype=float) for name in NUMERIC_INPUT_COLUMNS}
+    shape = np.broadcast_shapes(*(np.shape(values) for values in deals.values()))
+    if len(shape) > 1:
+        raise ValueError("Deals must be scalars or 1-D columns.")
+    deals = {name: np.broadcast_to(values, shape).reshape(-1) for name, values in deals.items()}
+    count = deals['purchase_price'].size
+
+    lo, hi = bounds if bounds is not None else default_bounds(deals, solve_for)
+    lo = np.broadcast_to(np.asarray(lo, dtype=float), (count,)).copy()
+    hi = np.broadcast_to(np.asarray(hi, dtype=float), (count,)).copy()
+    if (lo > hi).any():
+        raise ValueError("The lower bound must not exceed the upper bound.")
+
+    valid = np.ones(count, dtype=bool)
+    for values in deals.values():
+        valid &= np.isfinite(values)
+    valid &= np.isfinite(lo) & np.isfinite(hi)
+    # Keep invalid rows numeric so they cannot poison the vectorized search.
+    lo, hi = np.where(valid, lo, 0.0), np.where(valid, hi, 0.0)
+    deals = {name: np.where(valid, values, 0.0) for name, values in deals.items()}
+
+    low, high = _affine_interval(deals, solve_for, targets, lo, hi)
+    feasible = low <= high
+    low, high = np.where(feasible, low, lo), np.where(feasible, high, lo)
+
+    value = np.where(feasible, high if direction == 'max' else low, np.nan)
+
+    bound = hi if direction == 'max' else lo
+    at_bound = value == bound
+    # Round to the cent (or hundredth of a point) towards the feasible side.
+    if direction == 'max':
+        rounded = np.floor(value * 100) / 100
+        value = np.where(rounded >= low, rounded, value)
+        step = -0.01
+    else:
+        rounded = np.ceil(value * 100) / 100
+        value = np.where(rounded <= high, rounded, value)
+        step = 0.01
+
+    # Rounding, floating point error or a strict inequality at the boundary can
+    # still land just outside the targets: re-check once and step one unit towards feasibility.
+    solved = valid & np.isfinite(value)
+    ok = _meets(_evaluate(deals, solve_for, np.where(solved, value, lo)), targets)
+    stepped = np.round(value + step, 2)
+    retry = solved & ~ok & (stepped >= lo) & (stepped <= hi)
+    if retry.any():
+        ok_stepped = _meets(_evaluate(deals, solve_for, np.where(retry, stepped, lo)), targets)
+        value = np.where(retry & ok_stepped, stepped, value)
+        ok |= retry & ok_stepped
+        at_bound &= ~retry
+    solved &= ok
+    value = np.where(solved, value, np.nan)
+    status = np.where(~valid, 'invalid',
+                      np.where(~solved, 'infeasible', np.where(at_bound, 'at_bound', 'solved'))).astype(object)
+
+    outputs = _evaluate(deals, solve_for, np.where(solved, value, lo))
+    result = {'value': value, 'status': status}
+    result.update({name: np.where(solved, outputs[name], np.nan) for name in SOLVE_OUTPUTS})
+    return result
+
+
+def iter_solution_rows(properties, solve_for, targets, bounds=None, block_size=BLOCK_SIZE):
+    """Yields one SOLVE_FIELDS row per property, solving block_size properties per engine pass."""
+    for block in _blocks(properties, block_size):
+        deals = {name: [float(prop[name]) if prop[name] is not None else math.nan for prop in block]
+                 for name in NUMERIC_INPUT_COLUMNS}
+        solution = solve_deals(deals, solve_for, targets, bounds)
+        for i, prop in enumerate(block):
+            row = {'property_id': prop['id'], 'property_address': prop['property_address'],
+                   'solve_for': solve_for, 'current_value': deals[solve_for][i], 'status': solution['status'][i]}
+            for name in ('value',) + SOLVE_OUTPUTS:
+                number = float(solution[name][i])
+                row[name] = round(number, 2) if math.isfinite(number) else None
+            yield row
@@ -0,0 +1,505 @@
+# modules/fmr_index.py
+# Compiled, memory-mapped Fair Market Rent store.
+#
+# Rent tables are compiled into one binary file of columnar arrays (a JSON header
+# followed by aligned raw arrays). Every process memory-maps the same file
+# read-only, so gunicorn workers share one copy through the page cache. It holds:
+#
+#   zip_keys / zip_rents     Small Area FMRs keyed by zip * 10000 + fiscal year,
+#                            one row of all bedroom sizes per key
+#   area_keys / area_rents   county (metro) FMRs keyed by county FIPS * 10000 + year
+#   crosswalk_zips/_areas    ZIP -> county FIPS, used when a ZIP has no SAFMR row
+#   zips                     distinct ZIP codes
+#
+# A lookup is a binary search for the most recent year at or before the requested
+# one (the latest year by default), falling back to the ZIP's county.
+#
+# The bundled fairmarketrent.xlsx sheet is compiled automatically (as undated
+# data, year 0) whenever it is newer than the compiled file. The files are
+# checked for changes at most every FMR_RELOAD_CHECK_INTERVAL seconds, and a
+# failed load is retried with exponential backoff rather than on every request.
+# National HUD files are compiled with the CLI:
+#
+#   python -m modules.fmr_index                      # compile fairmarketrent.xlsx
+#   python -m modules.fmr_index build --safmr 2025=fy2025_safmrs.xlsx --safmr 2024=fy2024_safmrs.xlsx \
+#       --county 2025=FY25_FMRs.xlsx --county 2024=FY24_FMRs.xlsx --crosswalk ZIP_COUNTY_122024.xlsx
+#   python -m modules.fmr_index info
+import argparse
+import json
+import os
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XLSX_PATH = os.path.join(BASE_DIR, "fairmarketrent.xlsx")
+SHEET_NAME = "can you organize this in a tabl"
+INDEX_PATH = os.environ.get('FMR_INDEX_PATH', os.path.join(BASE_DIR, "fairmarketrent.fmrstore"))
+RELOAD_CHECK_INTERVAL = float(os.environ.get('FMR_RELOAD_CHECK_INTERVAL', 10))
+RETRY_INTERVAL = 30.0       # first retry after a failed load; doubles on each failure...
+MAX_RETRY_INTERVAL = 600.0  # ...up to this
+
+# Bedroom count (as submitted by the form) -> sheet column, in rent column order.
+BEDROOM_COLUMNS = {
+    '0': 'Efficiency',
+    '1': 'One-Bedroom',
+    '2': 'Two-Bedroom',
+    '3': 'Three-Bedroom',
+    '4': 'Four-Bedroom',
+}
+BEDROOMS = list(BEDROOM_COLUMNS)
+
+YEAR_SPAN = 10_000     # keys are id * YEAR_SPAN + year
+LATEST = YEAR_SPAN - 1  # year used to ask for the most recent data
+UNDATED = 0             # year of data compiled from the bundled sheet
+SOURCES = (None, 'zip', 'county')  # lookup source codes -> names
+
+STORE_MAGIC = b"FMRSTOR1"
+ALIGNMENT = 64
+
+
+# --- Store file ---
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_store(path, arrays, meta):
+    """Writes named arrays and a metadata dict to `path` atomically."""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({'arrays': specs, 'meta': meta}).encode()
+    data_start = _aligned(len(STORE_MAGIC) + 8 + len(header))
+
+    # Write to a temp file and rename, so concurrent readers only ever see a complete store.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(STORE_MAGIC + len(header).to_bytes(8, 'little') + header)
+        for name, array in arrays.items():
+            f.seek(data_start + specs[name]['offset'])
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_store(path):
+    """Memory-maps a store file; returns ({name: read-only array}, meta)."""
+    with open(path, 'rb') as f:
+        if f.read(len(STORE_MAGIC)) != STORE_MAGIC:
+            raise ValueError(f"{path} is not a compiled rent store.")
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length))
+    data_start = _aligned(len(STORE_MAGIC) + 8 + header_length)
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        start = data_start + spec['offset']
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(shape)
+    return arrays, header['meta']
+
+
+# --- Building ---
+def _normalized(name):
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+def _find_column(df, candidates, description, path):
+    columns = {_normalized(column): column for column in df.columns}
+    for candidate in candidates:
+        if candidate in columns:
+            return columns[candidate]
+    raise ValueError(f"{path}: no {description} column (looked for {', '.join(candidates)}).")
+
+
+def _bedroom_columns(df, prefixes, path):
+    return [_find_column(df, [f"{prefix}{b}{suffix}" for prefix in prefixes for suffix in ('br', '')]
+                         + [_normalized(BEDROOM_COLUMNS[b])], f"{b}-bedroom rent", path)
+            for b in BEDROOMS]
+
+
+def _read_table(path, sheet_name=0):
+    import pandas as pd  # Only needed for the build step
+
+    if path.lower().endswith(('.csv', '.txt')):
+        return pd.read_csv(path, dtype=str)
+    return pd.read_excel(path, sheet_name=sheet_name, dtype=str)
+
+
+def _numbers(series):
+    """Floats from a text column, accepting HUD's "$1,234" formatting; blanks become NaN."""
+    import pandas as pd
+
+    cleaned = series.astype(str).str.replace(r'[$,\s]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _digits(series):
+    """Integer codes from a text column (ZIPs, FIPS); rows without digits become -1."""
+    import pandas as pd
+
+    digits = series.astype(str).str.extract(r'(\d+)', expand=False)
+    return pd.to_numeric(digits, errors='coerce').fillna(-1).astype(np.int64).to_numpy()
+
+
+def _keyed_table(df, ids, year, rent_columns):
+    rents = np.column_stack([_numbers(df[column]) for column in rent_columns]) if len(df) \
+        else np.empty((0, len(rent_columns)))
+    keep = ids >= 0
+    return ids[keep] * YEAR_SPAN + year, rents[keep]
+
+
+def _first_per_key(keys, *columns):
+    """Keeps the first row for each key (keys must already be grouped)."""
+    first = np.ones(keys.size, dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return (keys[first],) + tuple(column[first] for column in columns)
+
+
+def read_safmr_file(path, year, sheet_name=0):
+    """(keys, rents) for a HUD Small Area FMR file (or a sheet shaped like fairmarketrent.xlsx)."""
+    df = _read_table(path, sheet_name)
+    zip_column = _find_column(df, ['zipcode', 'zip', 'zipcodes'], "ZIP", path)
+    return _keyed_table(df, _digits(df[zip_column]), year, _bedroom_columns(df, ['safmr', 'fmr'], path))
+
+
+def read_county_file(path, year, sheet_name=0):
+    """(keys, rents) for a HUD county-level FMR file, keyed by 5-digit county FIPS."""
+    df = _read_table(path, sheet_name)
+    fips_column = _find_column(df, ['fips2010', 'fips', 'fips2000', 'fipscode', 'county', 'countyfips'],
+                               "FIPS", path)
+    fips = _digits(df[fips_column])
+    # New England files use 10-digit state + county + town codes; key them by county.
+    fips = np.where(fips > 99_999, fips // 100_000, fips)
+    return _keyed_table(df, fips, year, _bedroom_columns(df, ['fmr'], path))
+
+
+def read_crosswalk_file(path, sheet_name=0):
+    """(zips, county FIPS) from a HUD USPS ZIP-county crosswalk; each ZIP maps to its largest county."""
+    df = _read_table(path, sheet_name)
+    zips = _digits(df[_find_column(df, ['zip', 'zipcode'], "ZIP", path)])
+    counties = _digits(df[_find_column(df, ['county', 'countyfips', 'geoid', 'fips'], "county", path)])
+    try:
+        ratios = np.nan_to_num(_numbers(df[_find_column(df, ['resratio', 'totratio'], "ratio", path)]))
+    except ValueError:
+        ratios = np.zeros(zips.size)
+    keep = (zips >= 0) & (counties >= 0)
+    zips, counties, ratios = zips[keep], counties[keep], ratios[keep]
+    order = np.lexsort((-ratios, zips))  # by ZIP, largest share first
+    return _first_per_key(zips[order], counties[order])
+
+
+def _merged(tables):
+    """Concatenates (keys, rents) tables and sorts them by key; the first row wins for duplicate keys."""
+    if not tables:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(BEDROOMS)))
+    keys = np.concatenate([keys for keys, _ in tables])
+    rents = np.concatenate([rents for _, rents in tables])
+    order = np.argsort(keys, kind='stable')
+    return _first_per_key(keys[order], rents[order])
+
+
+def build_store(safmr_files=None, county_files=None, crosswalk_path=None, index_path=INDEX_PATH,
+                from_sheet=False):
+    """
+    Compiles rent files into a store. `safmr_files` and `county_files` map fiscal
+    year -> path; every (ZIP or county, year) pair is kept. Returns the store metadata.
+    """
+    safmr_files, county_files = safmr_files or {}, county_files or {}
+    zip_keys, zip_rents = _merged([read_safmr_file(path, year, SHEET_NAME if from_sheet else 0)
+                                   for year, path in sorted(safmr_files.items())])
+    area_keys, area_rents = _merged([read_county_file(path, year) for year, path in sorted(county_files.items())])
+    if crosswalk_path:
+        crosswalk_zips, crosswalk_areas = read_crosswalk_file(crosswalk_path)
+    else:
+        crosswalk_zips, crosswalk_areas = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    meta = {
+        'bedrooms': BEDROOMS,
+        'years': sorted(set(safmr_files) | set(county_files)),
+        'from_sheet': from_sheet,
+        'sources': {
+            'safmr': {str(year): os.path.basename(path) for year, path in safmr_files.items()},
+            'county': {str(year): os.path.basename(path) for year, path in county_files.items()},
+            'crosswalk': os.path.basename(crosswalk_path) if crosswalk_path else None,
+        },
+        'counts': {'zip_rows': int(zip_keys.size), 'county_rows': int(area_keys.size),
+                   'crosswalk_zips': int(crosswalk_zips.size)},
+    }
+    write_store(index_path, {
+        'zip_keys': zip_keys, 'zip_rents': zip_rents,
+        'area_keys': area_keys, 'area_rents': area_rents,
+        'crosswalk_zips': crosswalk_zips, 'crosswalk_areas': crosswalk_areas,
+        'zips': np.unique(zip_keys // YEAR_SPAN),
+    }, meta)
+    logger.info(f"Compiled {zip_keys.size} ZIP rows, {area_keys.size} county rows and "
+                f"{crosswalk_zips.size} crosswalk ZIPs into {index_path}.")
+    return meta
+
+
+def build_index(xlsx_path=XLSX_PATH, index_path=INDEX_PATH):
+    """Compiles the bundled HUD sheet (undated) into the store. Returns the number of ZIPs written."""
+    meta = build_store({UNDATED: xlsx_path}, index_path=index_path, from_sheet=True)
+    return meta['counts']['zip_rows']
+
+
+# --- Lookups ---
+def _latest_rows(keys, ids, years):
+    """Rows of `keys` holding each id's most recent year <= the requested year; (rows, found)."""
+    if keys.size == 0:
+        return np.zeros(ids.shape, dtype=np.intp), np.zeros(ids.shape, dtype=bool)
+    positions = np.searchsorted(keys, ids * YEAR_SPAN + years, side='right') - 1
+    rows = np.maximum(positions, 0)
+    return rows, (positions >= 0) & (keys[rows] // YEAR_SPAN == ids)
+
+
+def _latest_row(keys, id_value, year):
+    position = int(np.searchsorted(keys, id_value * YEAR_SPAN + year, side='right')) - 1
+    if position >= 0 and int(keys[position]) // YEAR_SPAN == id_value:
+        return position
+    return None
+
+
+def _year_value(year):
+    if year is None or year == '':
+        return LATEST
+    year = int(year)
+    if not 0 <= year < LATEST:
+        raise ValueError(f"Invalid fiscal year: {year}")
+    return year
+
+
+class FmrIndex:
+    """Read-only view over a compiled store file."""
+
+    def __init__(self, index_path):
+        arrays, self.meta = read_store(index_path)
+        self.path = index_path
+        self.zip_keys = arrays['zip_keys']
+        self.zip_rents = arrays['zip_rents']
+        self.area_keys = arrays['area_keys']
+        self.area_rents = arrays['area_rents']
+        self.crosswalk_zips = arrays['crosswalk_zips']
+        self.crosswalk_areas = arrays['crosswalk_areas']
+        self.zips = arrays['zips']
+        self.mtime = os.path.getmtime(index_path)
+
+    def __len__(self):
+        return self.zips.size
+
+    @property
+    def years(self):
+        """Fiscal years in the store, oldest first (empty for the undated bundled sheet)."""
+        return [year for year in self.meta['years'] if year != UNDATED]
+
+    @property
+    def from_sheet(self):
+        return self.meta.get('from_sheet', False)
+
+    def _county_of(self, zip_value):
+        position = int(np.searchsorted(self.crosswalk_zips, zip_value))
+        if position < self.crosswalk_zips.size and int(self.crosswalk_zips[position]) == zip_value:
+            return int(self.crosswalk_areas[position])
+        return None
+
+    def lookup(self, zip_code, year=None):
+        """
+        All bedroom sizes for a ZIP code: {'zip', 'year', 'source', 'county',
+        'rents': {bedrooms: rent}}, from the ZIP's own row or else its county's,
+        for the most recent year at or before `year`. None if neither exists.
+        """
+        zip_value = int(zip_code)
+        year_value = _year_value(year)
+        county = None
+        row = _latest_row(self.zip_keys, zip_value, year_value)
+        if row is not None:
+            key, rents, source = self.zip_keys[row], self.zip_rents[row], 'zip'
+        else:
+            county = self._county_of(zip_value)
+            row = _latest_row(self.area_keys, county, year_value) if county is not None else None
+            if row is None:
+                return None
+            key, rents, source = self.area_keys[row], self.area_rents[row], 'county'
+        found_year = int(key) % YEAR_SPAN
+        return {
+            'zip': f"{zip_value:05d}",
+            'year': found_year if found_year != UNDATED else None,
+            'source': source,
+            'county': f"{county:05d}" if county is not None else None,
+            'rents': {b: (None if rent != rent else rent) for b, rent in zip(BEDROOMS, rents.tolist())},
+        }
+
+    def lookup_rent(self, zip_code, bedrooms, year=None):
+        """Returns the rent for one ZIP code and bedroom count, or None if there is no data for it."""
+        if bedrooms not in BEDROOM_COLUMNS:
+            raise KeyError(bedrooms)
+        record = self.lookup(zip_code, year)
+        return record['rents'][bedrooms] if record is not None else None
+
+    def lookup_all_many(self, zip_codes, years=None):
+        """
+        Vectorized lookup of many ZIP codes (each at the matching entry of `years`,
+        one year for all, or the latest). Returns a dict of arrays: rents
+        (n x bedroom sizes, NaN where missing), year (-1 where missing) and source
+        (index into SOURCES: 0 missing, 1 ZIP row, 2 county fallback).
+        """
+        zip_values = np.asarray(zip_codes, dtype=np.int64)
+        if years is None or np.isscalar(years):
+            year_values = np.full(zip_values.shape, _year_value(years), dtype=np.int64)
+        else:
+            year_values = np.array([_year_value(y) for y in years], dtype=np.int64)
+
+        rents = np.full((zip_values.size, len(BEDROOMS)), np.nan)
+        found_years = np.full(zip_values.shape, -1, dtype=np.int64)
+        source = np.zeros(zip_values.shape, dtype=np.int8)
+
+        rows, found = _latest_rows(self.zip_keys, zip_values, year_values)
+        rents[found] = self.zip_rents[rows[found]]
+        found_years[found] = self.zip_keys[rows[found]] % YEAR_SPAN
+        source[found] = 1
+
+        missing = np.flatnonzero(~found)
+        if missing.size and self.crosswalk_zips.size and self.area_keys.size:
+            positions = np.searchsorted(self.crosswalk_zips, zip_values[missing])
+            clipped = np.minimum(positions, self.crosswalk_zips.size - 1)
+            in_crosswalk = (positions < self.crosswalk_zips.size) & \
+                (self.crosswalk_zips[clipped] == zip_values[missing])
+            area_rows, area_found = _latest_rows(self.area_keys, self.crosswalk_areas[clipped], year_values[missing])
+            area_found &= in_crosswalk
+            filled = missing[area_found]
+            rents[filled] = self.area_rents[area_rows[area_found]]
+            found_years[filled] = self.area_keys[area_rows[area_found]] % YEAR_SPAN
+            source[filled] = 2
+        return {'rents': rents, 'year': found_years, 'source': source}
+
+    def lookup_many(self, zip_codes, bedrooms, years=None):
+        """
+        Vectorized join of many (zip, bedrooms) pairs against the store in one pass.
+        Returns (rents, zip_found, bedrooms_valid); rents is NaN where either is False.
+        """
+        columns = np.array([BEDROOMS.index(b) if b in BEDROOM_COLUMNS else -1 for b in bedrooms], dtype=np.intp)
+        result = self.lookup_all_many(zip_codes, years)
+        zip_found = result['source'] > 0
+        bedrooms_valid = columns >= 0
+        rents = np.full(zip_found.shape, np.nan)
+        hit = zip_found & bedrooms_valid
+        rents[hit] = result['rents'][np.flatnonzero(hit), columns[hit]]
+        return rents, zip_found, bedrooms_valid
+
+
+_index = None
+_index_lock = threading.Lock()
+_checked_at = 0.0   # monotonic time the loaded index was last checked against the files
+_failure = None     # ((xlsx_path, index_path), retry_at, delay) after a failed load
+
+
+def _sheet_is_newer(index_path, xlsx_path):
+    return os.path.exists(xlsx_path) and os.path.getmtime(xlsx_path) > os.path.getmtime(index_path)
+
+
+def _needs_reload(index, index_path, xlsx_path):
+    try:
+        if index.path != index_path or os.path.getmtime(index_path) != index.mtime:
+            return True
+        # Stores compiled from national files are never replaced by the bundled sheet.
+        return index.from_sheet and _sheet_is_newer(index_path, xlsx_path)
+    except OSError:
+        return True
+
+
+def _cached_result(xlsx_path, index_path, now):
+    """(True, index) when the loaded index or a recent failure can answer without touching the files."""
+    index = _index
+    if index is not None and index.path == index_path and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return True, index
+    failure = _failure
+    if index is None and failure is not None and failure[0] == (xlsx_path, index_path) and now < failure[1]:
+        return True, None
+    return False, None
+
+
+def get_fmr_index(xlsx_path=XLSX_PATH, index_path=INDEX_PATH):
+    """
+    Returns the shared FmrIndex. The bundled sheet is compiled first if there is
+    no store yet or the store came from an older copy of it. Returns None if no
+    rent data is available.
+    """
+    global _index, _checked_at, _failure
+    cached, index = _cached_result(xlsx_path, index_path, time.monotonic())
+    if cached:
+        return index
+    with _index_lock:
+        now = time.monotonic()
+        cached, index = _cached_result(xlsx_path, index_path, now)
+        if cached:
+            return index
+        index = _index
+        if index is not None and not _needs_reload(index, index_path, xlsx_path):
+            _checked_at = now
+            return index
+        try:
+            if not os.path.exists(index_path):
+                build_index(xlsx_path, index_path)
+            index = FmrIndex(index_path)
+            if index.from_sheet and _sheet_is_newer(index_path, xlsx_path):
+                build_index(xlsx_path, index_path)
+                index = FmrIndex(index_path)
+            _index = index
+            _checked_at = now
+            _failure = None
+            years = f", fiscal years {', '.join(map(str, index.years))}" if index.years else ""
+            logger.info(f"Fair Market Rent index loaded: {len(index)} ZIP codes{years}.")
+        except Exception as e:
+            _index = None
+            paths = (xlsx_path, index_path)
+            delay = min(_failure[2] * 2, MAX_RETRY_INTERVAL) if _failure and _failure[0] == paths else RETRY_INTERVAL
+            _failure = (paths, now + delay, delay)
+            if isinstance(e, FileNotFoundError):
+                logger.error(f"Error: fairmarketrent.xlsx not found at {xlsx_path}. Rent lookup will not work.")
+            else:
+                logger.error(f"Error loading Fair Market Rent index: {e}")
+            logger.info(f"Retrying the Fair Market Rent index in {delay:.0f}s.")
+    return _index
+
+
+def _year_paths(values, option):
+    paths = {}
+    for value in values or []:
+        year, sep, path = value.partition('=')
+        if not sep or not year.isdigit():
+            raise SystemExit(f"{option} expects YEAR=PATH, got {value!r}")
+        paths[int(year)] = path
+    return paths
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m modules.fmr_index",
+                                     description="Compile Fair Market Rent data into the memory-mapped store.")
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('build', help="compile HUD Small Area / county FMR files")
+    build.add_argument('--safmr', action='append', metavar='YEAR=PATH', help="Small Area FMR file for a fiscal year")
+    build.add_argument('--county', action='append', metavar='YEAR=PATH', help="county FMR file for a fiscal year")
+    build.add_argument('--crosswalk', metavar='PATH', help="HUD USPS ZIP-county crosswalk for the county fallback")
+    build.add_argument('--output', default=INDEX_PATH, help=f"store path (default {INDEX_PATH})")
+    commands.add_parser('info', help="describe the compiled store")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        safmr_files, county_files = _year_paths(args.safmr, '--safmr'), _year_paths(args.county, '--county')
+        if not safmr_files and not county_files:
+            parser.error("build needs at least one --safmr or --county file")
+        print(json.dumps(build_store(safmr_files, county_files, args.crosswalk, args.output), indent=2))
+    elif args.command == 'info':
+        print(json.dumps(dict(FmrIndex(INDEX_PATH).meta, path=INDEX_PATH), indent=2))
+    else:
+        build_index()
@@ -0,0 +1,450 @@
+# modules/geocoding.py
+# Address -> ZIP code resolution for the rent lookup.
+#
+# get_geocoder() returns a CachedGeocoder wrapping the upstream service with:
+#   - an in-process LRU,
+#   - a persistent SQLite store shared by every worker on the host,
+#   - negative caching of "no postcode" answers (shorter TTL),
+#   - per-key request coalescing, so concurrent identical lookups make one upstream call.
+# get_async_geocoder() is the non-blocking equivalent used by the ASGI entry point
+# (asgi.py); it shares the same caches.
+#
+# Calls to public Nominatim are spaced by one RateLimiter per process, shared by
+# the sync and async clients (GEOCODER_RATE_LIMIT requests/second, default 1 as
+# its usage policy asks; 0 disables it for self-hosted instances).
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+from modules.cache_utils import TTLCache
+from modules.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TTL = 30 * 24 * 3600          # resolved ZIPs: 30 days
+DEFAULT_NEGATIVE_TTL = 24 * 3600      # "no postcode" answers: 1 day
+DEFAULT_RATE_LIMIT = 1.0              # upstream requests per second
+
+
+class GeocodingError(Exception):
+    """The upstream geocoding service failed (timeout, service error). Never cached."""
+
+
+def normalize_address(address):
+    """Canonical cache key for free-text addresses: case, punctuation and spacing are ignored."""
+    address = re.sub(r"[^\w\s#-]", " ", address.lower())
+    return " ".join(address.split())
+
+
+def extract_zip(postcode):
+    """Reduces a postcode such as '60601-1234' to a 5-digit ZIP, or None if it isn't one."""
+    if not postcode:
+        return None
+    zip_code = postcode.split('-')[0].strip()
+    if zip_code.isdigit() and len(zip_code) == 5:
+        return zip_code
+    return None
+
+
+# --- Rate limiting ---
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart across every thread and event loop
+    of the process that share it. A rate of 0 (or less) means no limit.
+    """
+
+    def __init__(self, rate, clock=time.monotonic):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.clock = clock
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Books the next free slot; returns how many seconds the caller must wait for it."""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        return start - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# --- Upstream geocoders ---
+class NominatimGeocoder:
+    """Resolves addresses to ZIP codes with OpenStreetMap Nominatim."""
+
+    def __init__(self, user_agent="fair_market_rent_app", timeout=5, rate_limiter=None):
+        from geopy.geocoders import Nominatim  # Imported on first use: geopy is slow to import
+
+        self.geolocator = Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+
+    def geocode_zip(self, address):
+        from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        try:
+            location = self.geolocator.geocode(address, country_codes=['US'], addressdetails=True,
+                                               timeout=self.timeout)
+        except (GeocoderTimedOut, GeocoderServiceError) as e:
+            raise GeocodingError(str(e)) from e
+        if location and location.raw and 'address' in location.raw:
+            return extract_zip(location.raw['address'].get('postcode'))
+        return None
+
+
+class StubGeocoder:
+    """
+    Offline geocoder for tests and load tests: answers from a dict keyed on
+    normalized address, optionally sleeping to simulate upstream latency.
+    `on_call(address)`, if given, runs on every lookup (e.g. to count or block calls).
+    """
+
+    def __init__(self, mapping=None, delay=0.0, on_call=None):
+        self.mapping = {normalize_address(k): v for k, v in (mapping or {}).items()}
+        self.delay = delay
+        self.on_call = on_call
+        self.calls = 0
+
+    def geocode_zip(self, address):
+        self.calls += 1
+        if self.on_call is not None:
+            self.on_call(address)
+        if self.delay:
+            time.sleep(self.delay)
+        return self.mapping.get(normalize_address(address))
+
+
+class AsyncNominatimGeocoder:
+    """
+    Non-blocking Nominatim client for the ASGI serving path (see asgi.py): waiting
+    on the service yields the event loop instead of holding a worker thread.
+    """
+    SEARCH_URL = "https://nominatim.openstreetmap.org/search"
+
+    def __init__(self, user_agent="fair_market_rent_app", timeout=5, rate_limiter=None):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self._client = None
+
+    async def geocode_zip(self, address):
+        import httpx  # Only needed when serving through ASGI
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(headers={'User-Agent': self.user_agent}, timeout=self.timeout)
+        params = {'q': address, 'format': 'jsonv2', 'addressdetails': 1, 'countrycodes': 'us', 'limit': 1}
+        if self.rate_limiter is not None:
+            await self.rate_limiter.wait_async()
+        try:
+            response = await self._client.get(self.SEARCH_URL, params=params)
+            response.raise_for_status()
+            results = response.json()
+        except httpx.TimeoutException as e:
+            raise GeocodingError(f"Service timed out: {e}") from e
+        except (httpx.HTTPError, ValueError) as e:
+            raise GeocodingError(str(e)) from e
+        if results:
+            return extract_zip((results[0].get('address') or {}).get('postcode'))
+        return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AsyncStubGeocoder(StubGeocoder):
+    """Async twin of StubGeocoder; the simulated latency does not block the event loop."""
+
+    async def geocode_zip(self, address):
+        self.calls += 1
+        if self.on_call is not None:
+            self.on_call(address)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.mapping.get(normalize_address(address))
+
+    async def aclose(self):
+        pass
+
+
+# --- Persistent store ---
+class SqliteGeocodeStore:
+    """
+    Persistent geocode cache in a local SQLite file (safe for many processes and
+    threads). Expiry times are wall-clock `clock()` seconds so they survive restarts.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                address_key TEXT PRIMARY KEY,
+                zip_code TEXT,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Returns (found, zip_code) for an unexpired entry."""
+        row = self._connection().execute(
+            "SELECT zip_code, expires_at FROM geocode_cache WHERE address_key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= self.clock():
+            return False, None
+        return True, row[0]
+
+    def put(self, key, zip_code, ttl):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache (address_key, zip_code, expires_at) VALUES (?, ?, ?)",
+            (key, zip_code, self.clock() + ttl),
+        )
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._connection()
+        deleted = conn.execute("DELETE FROM geocode_cache WHERE expires_at <= ?", (self.clock(),)).rowcount
+        conn.commit()
+        return deleted
+
+
+# --- Cache layer ---
+class CachedGeocoder:
+    """
+    Wraps an upstream geocoder with LRU + persistent caching and request
+    coalescing. `clock` drives the in-process LRU's expiry (tests pass a fake one).
+    """
+
+    def __init__(self, upstream, store=None, lru_size=10_000, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 clock=time.monotonic):
+        self.upstream = upstream
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.lru = TTLCache(maxsize=lru_size, ttl=ttl, clock=clock)
+        self._in_flight = {}  # address_key -> Future
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def _ttl_for(self, zip_code):
+        return self.ttl if zip_code else self.negative_ttl
+
+    def cached(self, key):
+        """Returns (found, zip_code) from the LRU or, failing that, the persistent store."""
+        hit, zip_code = self.lru.get(key)
+        if hit:
+            return True, zip_code
+        if self.store is not None:
+            try:
+                found, zip_code = self.store.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Geocode cache read failed: {e}")
+                found = False
+            if found:
+                self.lru.set(key, zip_code, ttl=self._ttl_for(zip_code))
+                return True, zip_code
+        return False, None
+
+    def remember(self, key, zip_code):
+        """Stores an upstream answer in both cache tiers (negative answers with the shorter TTL)."""
+        ttl = self._ttl_for(zip_code)
+        self.lru.set(key, zip_code, ttl=ttl)
+        if self.store is not None:
+            try:
+                self.store.put(key, zip_code, ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"Geocode cache write failed: {e}")
+
+    def geocode_zip(self, address):
+        """
+        Returns the 5-digit ZIP for an address, or None if the service has no
+        postcode for it. Raises GeocodingError if the upstream call fails.
+        """
+        key = normalize_address(address)
+        found, zip_code = self.cached(key)
+        if found:
+            return zip_code
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            self.upstream_calls += 1
+            with timed('geocode_upstream'):
+                zip_code = self.upstream.geocode_zip(address)
+            self.remember(key, zip_code)
+            future.set_result(zip_code)
+            return zip_code
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self):
+        return dict(self.lru.stats(), upstream_calls=self.upstream_calls, coalesced=self.coalesced)
+
+
+class AsyncCachedGeocoder:
+    """
+    Async front end over the same two cache tiers as a CachedGeocoder, so the
+    sync (Flask) and async (ASGI) paths share cached answers. Identical
+    concurrent lookups on the event loop are coalesced into one upstream call.
+    """
+
+    def __init__(self, upstream, cache):
+        self.upstream = upstream
+        self.cache = cache
+        self._in_flight = {}  # address_key -> asyncio.Future
+
+    async def geocode_zip(self, address):
+        key = normalize_address(address)
+        # The SQLite read can wait on a writer lock, so keep it off the event loop.
+        found, zip_code = await asyncio.to_thread(self.cache.cached, key)
+        if found:
+            return zip_code
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.cache.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            self.cache.upstream_calls += 1
+            with timed('geocode_upstream'):
+                zip_code = await self.upstream.geocode_zip(address)
+            await asyncio.to_thread(self.cache.remember, key, zip_code)
+            future.set_result(zip_code)
+            return zip_code
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; avoid "exception was never retrieved" warnings.
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def aclose(self):
+        await self.upstream.aclose()
+
+
+_geocoder = None
+_async_geocoder = None
+_rate_limiter = None
+_geocoder_lock = threading.Lock()
+_rate_limiter_lock = threading.Lock()
+
+
+def uses_public_service():
+    """True when lookups go to the rate-limited public geocoder (GEOCODER=nominatim, the default)."""
+    return os.environ.get('GEOCODER', 'nominatim') == 'nominatim'
+
+
+def _upstream_rate_limiter():
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(float(os.environ.get('GEOCODER_RATE_LIMIT', DEFAULT_RATE_LIMIT)))
+    return _rate_limiter
+
+
+def _upstream_from_env(stub_class, service_class):
+    if os.environ.get('GEOCODER', 'nominatim') == 'stub':
+        mapping = {}
+        stub_file = os.environ.get('GEOCODER_STUB_FILE')
+        if stub_file:
+            with open(stub_file) as f:
+                mapping = json.load(f)
+        return stub_class(mapping, delay=float(os.environ.get('GEOCODER_STUB_DELAY', 0)))
+    return service_class(rate_limiter=_upstream_rate_limiter())
+
+
+def build_geocoder_from_env():
+    """
+    GEOCODER=nominatim (default) or stub (answers from the JSON object in
+    GEOCODER_STUB_FILE); GEOCODER_RATE_LIMIT; GEOCODE_CACHE_PATH (SQLite file, empty to disable),
+    GEOCODE_TTL and GEOCODE_NEGATIVE_TTL in seconds.
+    """
+    upstream = _upstream_from_env(StubGeocoder, NominatimGeocoder)
+
+    store = None
+    store_path = os.environ.get('GEOCODE_CACHE_PATH', os.path.join(BASE_DIR, "geocode_cache.sqlite3"))
+    if store_path:
+        try:
+            store = SqliteGeocodeStore(store_path)
+        except sqlite3.Error as e:
+            logger.warning(f"Persistent geocode cache disabled: {e}")
+
+    return CachedGeocoder(
+        upstream,
+        store=store,
+        ttl=float(os.environ.get('GEOCODE_TTL', DEFAULT_TTL)),
+        negative_ttl=float(os.environ.get('GEOCODE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)),
+    )
+
+
+def get_geocoder():
+    """Returns the process-wide cached geocoder."""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = build_geocoder_from_env()
+    return _geocoder
+
+
+def get_async_geocoder():
+    """Returns the process-wide async geocoder; it shares get_geocoder()'s caches."""
+    global _async_geocoder
+    if _async_geocoder is None:
+        cache = get_geocoder()
+        with _geocoder_lock:
+            if _async_geocoder is None:
+                _async_geocoder = AsyncCachedGeocoder(
+                    _upstream_from_env(AsyncStubGeocoder, AsyncNominatimGeocoder), cache)
+    return _async_geocoder
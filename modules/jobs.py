@@ -0,0 +1,706 @@
+# modules/jobs.py
+# Background job queue on PostgreSQL, so heavy batch work (imports, exports,
+# simulations, bulk rent lookups, metric backfills) runs outside the web workers.
+# Requests enqueue a row in `jobs` and return at once; worker processes claim
+# queued rows with SELECT ... FOR UPDATE SKIP LOCKED, run the handler for the
+# job's kind and record its progress and result. Throughput scales by adding
+# worker processes, on one machine (--processes) or on any host that can reach
+# the database.
+#
+# CLI:  DATABASE_URL=... python -m modules.jobs worker [--processes 4] [--kinds export,solve]
+#       DATABASE_URL=... python -m modules.jobs enqueue backfill_metrics '{"recompute_all": true}'
+#       DATABASE_URL=... python -m modules.jobs purge [--days 7]
+#
+# Workers wake up on NOTIFY from enqueue_job (or every JOB_POLL_INTERVAL seconds).
+# A running job sends a heartbeat every JOB_HEARTBEAT_INTERVAL seconds; jobs whose
+# heartbeat is older than JOB_STALE_AFTER seconds (a killed worker) are requeued,
+# or failed once they have used max_attempts. SIGTERM/SIGINT let the current job
+# finish before the worker exits.
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import select
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extras
+
+from modules.brrrr_engine import parse_deal_inputs
+from modules.property_store import import_properties_csv, backfill_metrics, METRICS_VERSION
+
+logger = logging.getLogger(__name__)
+
+STATUSES = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+NOTIFY_CHANNEL = 'brrrr_jobs'
+POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+HEARTBEAT_INTERVAL = float(os.environ.get('JOB_HEARTBEAT_INTERVAL', 15))
+STALE_AFTER = float(os.environ.get('JOB_STALE_AFTER', 120))
+RETRY_DELAY = 30            # seconds before the first retry of a failed attempt; doubles per attempt
+PROGRESS_INTERVAL = 1.0     # minimum seconds between progress writes
+CHUNK_SIZE = 1 << 20        # large object read/write size
+SPOOL_SIZE = 8 << 20        # results above this are spooled to a temp file before storing
+CONTENT_TYPES = {'csv': 'text/csv', 'json': 'application/x-ndjson'}
+# Columns reported by the status endpoints (payload can be large and is left out).
+JOB_FIELDS = (
+    'id', 'kind', 'status', 'progress', 'progress_message', 'cancel_requested', 'attempts', 'max_attempts',
+    'result', 'result_oid', 'result_content_type', 'error', 'worker', 'created_at', 'started_at', 'finished_at',
+)
+_job_columns = ", ".join(JOB_FIELDS)
+
+# Job kind -> handler(JobContext); filled in by @handler below.
+HANDLERS = {}
+
+
+class JobCancelled(Exception):
+    """Raised from JobContext.progress once a cancel has been requested for the job."""
+
+
+# --- Queue API (used by the web app) ---
+def enqueue_job(db, kind, payload=None, input_oid=None, max_attempts=3):
+    """
+    Adds a job to the queue and wakes up an idle worker. Commits, together with
+    anything else pending on `db` (e.g. the large object behind input_oid).
+    Returns the new row's id, kind, status and created_at.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'.")
+    cursor = db.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO jobs (kind, payload, input_oid, max_attempts) VALUES (%s, %s, %s, %s) "
+            "RETURNING id, kind, status, created_at",
+            (kind, extras.Json(payload or {}), input_oid, max_attempts))
+        job = cursor.fetchone()
+        cursor.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, kind))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return job
+
+
+def get_job(db, job_id):
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"SELECT {_job_columns} FROM jobs WHERE id = %s", (job_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def list_jobs(db, status=None, kind=None, limit=50):
+    """Most recent jobs first, optionally filtered by status and kind."""
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT {_job_columns} FROM jobs
+             WHERE (%(status)s::text IS NULL OR status = %(status)s)
+               AND (%(kind)s::text IS NULL OR kind = %(kind)s)
+             ORDER BY created_at DESC, id DESC
+             LIMIT %(limit)s
+        """, {'status': status, 'kind': kind, 'limit': limit})
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def request_cancel(db, job_id):
+    """
+    Cancels a queued job outright; a running job is flagged and stops at its
+    next progress report. Returns the updated row, or None for an unknown id.
+    """
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"""
+            UPDATE jobs
+               SET cancel_requested = cancel_requested OR status IN ('queued', 'running'),
+                   status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+                   finished_at = CASE WHEN status = 'queued' THEN CURRENT_TIMESTAMP ELSE finished_at END
+             WHERE id = %s
+            RETURNING {_job_columns}
+        """, (job_id,))
+        job = cursor.fetchone()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return job
+
+
+def job_summary(job):
+    """JSON-friendly copy of a job row (timestamps as ISO 8601)."""
+    summary = dict(job)
+    for name in ('created_at', 'started_at', 'finished_at'):
+        if summary.get(name) is not None:
+            summary[name] = summary[name].isoformat()
+    return summary
+
+
+def purge_jobs(db, days=7):
+    """Deletes jobs finished more than `days` ago along with their large objects. Returns the count."""
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            DELETE FROM jobs
+             WHERE status IN %s AND finished_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            RETURNING input_oid, result_oid
+        """, (FINISHED_STATUSES, days * 86400))
+        rows = cursor.fetchall()
+        oids = [oid for row in rows for oid in (row['input_oid'], row['result_oid']) if oid is not None]
+        if oids:
+            cursor.execute("SELECT lo_unlink(oid) FROM pg_largeobject_metadata WHERE oid = ANY(%s::oid[])", (oids,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return len(rows)
+
+
+# --- Large objects ---
+def store_large_object(db, fileobj):
+    """Copies a binary file object into a new large object in CHUNK_SIZE pieces; returns its oid."""
+    lob = db.lobject(0, 'wb')
+    try:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            lob.write(chunk)
+        return lob.oid
+    finally:
+        lob.close()
+
+
+def iter_large_object(db, oid):
+    """Yields a large object's contents in CHUNK_SIZE pieces (inside db's current transaction)."""
+    lob = db.lobject(oid, 'rb')
+    try:
+        while True:
+            chunk = lob.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        lob.close()
+
+
+# --- Worker ---
+def _connect(dsn, autocommit=False):
+    conn = psycopg2.connect(dsn)
+    conn.cursor_factory = extras.RealDictCursor
+    conn.autocommit = autocommit
+    return conn
+
+
+class _QueueConnection:
+    """
+    Autocommit connection for claims, progress, heartbeats and LISTEN, kept apart
+    from the job's own connection so queue updates are visible at once whatever
+    the handler's transaction is doing. Shared with the heartbeat thread.
+    """
+
+    def __init__(self, dsn):
+        self.conn = _connect(dsn, autocommit=True)
+        self.lock = threading.Lock()
+
+    def fetchone(self, sql, params=None):
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchone() if cursor.description else None
+            finally:
+                cursor.close()
+
+    def close(self):
+        if not self.conn.closed:
+            self.conn.close()
+
+
+class _Heartbeat(threading.Thread):
+    def __init__(self, queue, job_id):
+        super().__init__(name=f"job-{job_id}-heartbeat", daemon=True)
+        self._queue = queue
+        self._job_id = job_id
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self._queue.fetchone("UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP "
+                                     "WHERE id = %s AND status = 'running'", (self._job_id,))
+            except psycopg2.Error as e:
+                logger.warning(f"Heartbeat for job {self._job_id} failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class JobContext:
+    """
+    What a handler works with: the claimed job row and its payload, a connection
+    of its own (`db`, commit or roll back as needed), progress reporting and
+    output of a downloadable result.
+    """
+
+    def __init__(self, job, db, queue):
+        self.job = job
+        self.id = job['id']
+        self.payload = job['payload'] or {}
+        self.db = db
+        self._queue = queue
+        self._last_progress = 0.0
+        self.result_file = None
+        self.result_content_type = None
+
+    def progress(self, done, total=None, message=None):
+        """
+        Records progress (at most once per PROGRESS_INTERVAL, and always on the
+        last item) and raises JobCancelled if a cancel was requested meanwhile.
+        """
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        if now - self._last_progress < PROGRESS_INTERVAL and not finished:
+            return
+        self._last_progress = now
+        fraction = min(done / total, 1.0) if total else None
+        if message is None:
+            message = f"{done} of {total}" if total is not None else f"{done} done"
+        row = self._queue.fetchone("""
+            UPDATE jobs SET progress = COALESCE(%s, progress), progress_message = %s, heartbeat_at = CURRENT_TIMESTAMP
+             WHERE id = %s
+            RETURNING cancel_requested
+        """, (fraction, message, self.id))
+        if row and row['cancel_requested']:
+            raise JobCancelled()
+
+    def open_input(self):
+        """
+        Text stream over the job's uploaded input. It is spooled out of the
+        database first, since the connection cannot read a large object while
+        it is busy with the handler's work (e.g. a COPY fed from this stream).
+        """
+        if self.job.get('input_oid') is None:
+            raise ValueError("This job has no input file.")
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        for chunk in iter_large_object(self.db, self.job['input_oid']):
+            spool.write(chunk)
+        spool.seek(0)
+        return io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+
+    def write_result(self, chunks, content_type):
+        """
+        Spools text chunks (e.g. a CSV or NDJSON generator) as the job's
+        downloadable result. It is stored as a large object when the job succeeds.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        for chunk in chunks:
+            spool.write(chunk.encode())
+        spool.seek(0)
+        self.result_file = spool
+        self.result_content_type = content_type
+
+
+CLAIM_SQL = """
+    WITH next AS (
+        SELECT id FROM jobs
+         WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+           AND (%(kinds)s::text[] IS NULL OR kind = ANY(%(kinds)s::text[]))
+         ORDER BY run_after, id
+         LIMIT 1
+           FOR UPDATE SKIP LOCKED
+    )
+    UPDATE jobs
+       SET status = 'running', attempts = jobs.attempts + 1, worker = %(worker)s,
+           started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP, error = NULL
+      FROM next
+     WHERE jobs.id = next.id
+    RETURNING jobs.*
+"""
+
+REQUEUE_STALE_SQL = """
+    UPDATE jobs
+       SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+           error = 'Worker ' || COALESCE(worker, '?') || ' stopped responding.',
+           finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END
+     WHERE status = 'running' AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    RETURNING id, status
+"""
+
+
+class Worker:
+    """Claims and runs jobs one at a time until `stopping` is set."""
+
+    def __init__(self, dsn, name=None, kinds=None):
+        self.dsn = dsn
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = list(kinds) if kinds else None
+        self.stopping = False
+        self.queue = None
+        self.db = None
+        self._last_stale_check = 0.0
+
+    def connect(self):
+        self.queue = _QueueConnection(self.dsn)
+        self.queue.fetchone(f"LISTEN {NOTIFY_CHANNEL}")
+        self.db = _connect(self.dsn)
+
+    def close(self):
+        for conn in (self.queue, self.db):
+            if conn is not None:
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+        self.queue = self.db = None
+
+    def requeue_stale(self):
+        now = time.monotonic()
+        if now - self._last_stale_check < HEARTBEAT_INTERVAL:
+            return
+        self._last_stale_check = now
+        with self.queue.lock:
+            cursor = self.queue.conn.cursor()
+            try:
+                cursor.execute(REQUEUE_STALE_SQL, (STALE_AFTER,))
+                for row in cursor.fetchall():
+                    logger.warning(f"Job {row['id']} lost its worker; now {row['status']}.")
+            finally:
+                cursor.close()
+
+    def claim(self):
+        return self.queue.fetchone(CLAIM_SQL, {'kinds': self.kinds, 'worker': self.name})
+
+    def wait(self):
+        """Sleeps until a NOTIFY arrives or POLL_INTERVAL passes."""
+        conn = self.queue.conn
+        select.select([conn], [], [], POLL_INTERVAL)
+        with self.queue.lock:
+            conn.poll()
+            conn.notifies.clear()
+
+    def run(self):
+        logger.info(f"Job worker {self.name} started (kinds: {', '.join(self.kinds or HANDLERS)}).")
+        while not self.stopping:
+            try:
+                if self.queue is None:
+                    self.connect()
+                self.requeue_stale()
+                job = self.claim()
+                if job:
+                    self.run_job(job)
+                else:
+                    self.wait()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logger.error(f"Job worker {self.name} lost its database connection: {e}")
+                self.close()
+                time.sleep(POLL_INTERVAL)
+        self.close()
+        logger.info(f"Job worker {self.name} stopped.")
+
+    def run_job(self, job):
+        logger.info(f"Job {job['id']} ({job['kind']}) started, attempt {job['attempts']} of {job['max_attempts']}.")
+        context = JobContext(job, self.db, self.queue)
+        heartbeat = _Heartbeat(self.queue, job['id'])
+        heartbeat.start()
+        started = time.perf_counter()
+        try:
+            handler = HANDLERS.get(job['kind'])
+            if handler is None:
+                raise ValueError(f"No handler for job kind '{job['kind']}'.")
+            result = handler(context)
+            self.finish(context, result)
+            logger.info(f"Job {job['id']} ({job['kind']}) finished in {time.perf_counter() - started:.1f}s.")
+        except JobCancelled:
+            self._rollback()
+            self.queue.fetchone("UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP "
+                                "WHERE id = %s AND status = 'running' AND worker = %s", (job['id'], self.name))
+            logger.info(f"Job {job['id']} ({job['kind']}) cancelled.")
+        except Exception as e:
+            self._rollback()
+            # Connection-level failures are worth another attempt; anything else
+            # (bad input, missing property, ...) would fail the same way again.
+            retry = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)) and \
+                job['attempts'] < job['max_attempts']
+            logger.exception(f"Job {job['id']} ({job['kind']}) failed{'; will retry' if retry else ''}.")
+            self.queue.fetchone("""
+                UPDATE jobs
+                   SET status = %(status)s, error = %(error)s,
+                       run_after = CURRENT_TIMESTAMP + make_interval(secs => %(delay)s),
+                       finished_at = CASE WHEN %(status)s = 'failed' THEN CURRENT_TIMESTAMP END
+                 WHERE id = %(id)s AND status = 'running' AND worker = %(worker)s
+            """, {'status': 'queued' if retry else 'failed', 'error': f"{type(e).__name__}: {e}",
+                  'delay': RETRY_DELAY * 2 ** (job['attempts'] - 1), 'id': job['id'], 'worker': self.name})
+        finally:
+            heartbeat.stop()
+            if context.result_file is not None:
+                context.result_file.close()
+
+    def _rollback(self):
+        if self.db.closed:
+            self.db = _connect(self.dsn)
+            return
+        try:
+            self.db.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.db.close()
+            self.db = _connect(self.dsn)
+
+    def finish(self, context, result):
+        """Stores the result and marks the job succeeded in one transaction on the job's connection."""
+        cursor = self.db.cursor()
+        try:
+            result_oid = None
+            if context.result_file is not None:
+                result_oid = store_large_object(self.db, context.result_file)
+            cursor.execute("""
+                UPDATE jobs
+                   SET status = 'succeeded', progress = 1, result = %s, result_oid = %s, result_content_type = %s,
+                       finished_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+                 WHERE id = %s AND status = 'running' AND worker = %s
+            """, (extras.Json(result) if result is not None else None, result_oid, context.result_content_type,
+                  context.id, self.name))
+            if cursor.rowcount:
+                self.db.commit()
+            else:
+                # Requeued after a missed heartbeat (or claimed elsewhere); drop this result.
+                self.db.rollback()
+                logger.warning(f"Job {context.id} is no longer held by {self.name}; result discarded.")
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def _run_worker(dsn, kinds):
+    """Runs one Worker in the current process; SIGTERM/SIGINT stop it after its current job."""
+    worker = Worker(dsn, kinds=kinds)
+
+    def stop(signum, frame):
+        worker.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run()
+
+
+def run_workers(dsn, processes=1, kinds=None):
+    """
+    Runs `processes` workers: in this process for one, otherwise as child
+    processes that are restarted if they die and stopped together on SIGTERM/SIGINT.
+    """
+    if processes <= 1:
+        _run_worker(dsn, kinds)
+        return
+
+    children = {}
+    stopping = False
+
+    def start(slot):
+        process = multiprocessing.Process(target=_run_worker, args=(dsn, kinds), name=f"jobs-worker-{slot}")
+        process.start()
+        children[slot] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in children.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    for slot in range(processes):
+        start(slot)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        multiprocessing.connection.wait([process.sentinel for process in children.values()], timeout=1)
+        for slot, process in list(children.items()):
+            if process.is_alive():
+                continue
+            del children[slot]
+            if not stopping:
+                logger.warning(f"{process.name} exited with code {process.exitcode}; restarting it.")
+                start(slot)
+
+
+# --- Handlers ---
+# Each takes a JobContext and returns a JSON-serializable result, or writes a
+# downloadable one with job.write_result. Blueprint modules are imported inside
+# the handlers since they import this module to enqueue jobs.
+def handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def _count_properties(db, property_ids):
+    cursor = db.cursor()
+    try:
+        if property_ids:
+            cursor.execute("SELECT count(*) AS n FROM properties WHERE id = ANY(%s)", (list(property_ids),))
+        else:
+            cursor.execute("SELECT count(*) AS n FROM properties")
+        return cursor.fetchone()['n']
+    finally:
+        cursor.close()
+
+
+def _counted(items, total, job):
+    """Passes items through, reporting progress against `total` as they are consumed."""
+    for done, item in enumerate(items, 1):
+        job.progress(done, total)
+        yield item
+
+
+@handler('import_properties')
+def run_import(job):
+    job.progress(0, message="Importing")
+    with job.open_input() as text_stream:
+        return import_properties_csv(job.db, text_stream)
+
+
+@handler('backfill_metrics')
+def run_backfill(job):
+    recompute_all = bool(job.payload.get('recompute_all'))
+    cursor = job.db.cursor()
+    try:
+        if recompute_all:
+            cursor.execute("SELECT count(*) AS n FROM properties")
+        else:
+            cursor.execute("SELECT count(*) AS n FROM properties WHERE metrics_version IS DISTINCT FROM %s",
+                           (METRICS_VERSION,))
+        total = cursor.fetchone()['n']
+    finally:
+        cursor.close()
+    job.db.rollback()
+    updated = backfill_metrics(job.db, recompute_all=recompute_all, progress=lambda done: job.progress(done, total))
+    return {'updated': updated}
+
+
+@handler('export')
+def run_export(job):
+    from modules.properties_module import iter_saved_properties, stream_rows
+    from modules.projections import iter_amortization_rows, iter_projection_rows, AMORTIZATION_FIELDS, \
+        PROJECTION_FIELDS
+
+    payload = job.payload
+    output_format = payload.get('format', 'csv')
+    property_ids = payload.get('ids') or []
+    properties = _counted(iter_saved_properties(job.db, property_ids), _count_properties(job.db, property_ids), job)
+    if payload['kind'] == 'amortization':
+        rows, fieldnames = iter_amortization_rows(properties), AMORTIZATION_FIELDS
+    else:
+        rows, fieldnames = iter_projection_rows(properties, payload['years'], payload.get('assumptions')), \
+            PROJECTION_FIELDS
+    job.write_result(stream_rows(rows, fieldnames, output_format), CONTENT_TYPES[output_format])
+
+
+@handler('solve')
+def run_solve(job):
+    from modules.properties_module import iter_saved_properties, stream_rows
+    from modules.deal_optimizer import iter_solution_rows, SOLVE_FIELDS
+
+    payload = job.payload
+    output_format = payload.get('format', 'json')
+    property_ids = payload.get('ids') or []
+    bounds = tuple(payload['bounds']) if payload.get('bounds') is not None else None
+    properties = _counted(iter_saved_properties(job.db, property_ids), _count_properties(job.db, property_ids), job)
+    rows = iter_solution_rows(properties, payload['solve_for'], payload['targets'], bounds)
+    job.write_result(stream_rows(rows, SOLVE_FIELDS, output_format), CONTENT_TYPES[output_format])
+
+
+@handler('simulation')
+def run_simulation_job(job):
+    from modules.brrrr_simulation import run_simulation
+
+    payload = job.payload
+    cursor = job.db.cursor()
+    try:
+        cursor.execute("SELECT * FROM properties WHERE id = %s", (payload['property_id'],))
+        prop_data = cursor.fetchone()
+    finally:
+        cursor.close()
+    job.db.rollback()
+    if prop_data is None:
+        raise ValueError(f"Property {payload['property_id']} not found.")
+
+    summary = None
+    for summary in run_simulation(parse_deal_inputs(prop_data), trials=payload.get('trials', 100_000),
+                                  seed=payload.get('seed'), assumptions=payload.get('assumptions'),
+                                  processes=payload.get('processes', 1)):
+        job.progress(summary['completed'], summary['trials'])
+    return dict(summary, property_id=payload['property_id'], seed=payload.get('seed'))
+
+
+@handler('bulk_rent')
+def run_bulk_rent(job):
+    from modules.fmr_index import get_fmr_index
+    from modules.geocoding import get_geocoder
+    from modules.properties_module import stream_rows
+    from modules.rent_module import bulk_rent_results, BULK_FIELDS
+
+    fmr_index = get_fmr_index()
+    if fmr_index is None:
+        raise ValueError("Rent data not loaded. Please ensure 'fairmarketrent.xlsx' is correctly placed.")
+    output_format = job.payload.get('format', 'json')
+    rows = [(str(address_or_zip), str(bedrooms)) for address_or_zip, bedrooms in job.payload['rows']]
+    results = _counted(bulk_rent_results(rows, fmr_index, get_geocoder()), len(rows), job)
+    job.write_result(stream_rows(results, BULK_FIELDS, output_format), CONTENT_TYPES[output_format])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background job worker and queue maintenance.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    worker = commands.add_parser('worker', help="claim and run queued jobs")
+    worker.add_argument('--processes', type=int, default=int(os.environ.get('JOB_WORKER_PROCESSES', 1)),
+                        help="worker processes (default 1, or JOB_WORKER_PROCESSES)")
+    worker.add_argument('--kinds', help=f"comma-separated job kinds to run (default: all of {', '.join(HANDLERS)})")
+    enqueue = commands.add_parser('enqueue', help="queue a job from the command line")
+    enqueue.add_argument('kind', choices=sorted(HANDLERS))
+    enqueue.add_argument('payload', nargs='?', default='{}', help="JSON payload")
+    purge = commands.add_parser('purge', help="delete finished jobs and their stored results")
+    purge.add_argument('--days', type=float, default=7, help="keep jobs finished within this many days")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    dsn = os.environ['DATABASE_URL']
+    if args.command == 'worker':
+        kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()] if args.kinds else None
+        unknown = set(kinds or ()) - set(HANDLERS)
+        if unknown:
+            parser.error(f"unknown job kinds: {', '.join(sorted(unknown))}")
+        run_workers(dsn, processes=args.processes, kinds=kinds)
+        return
+
+    conn = _connect(dsn)
+    try:
+        if args.command == 'enqueue':
+            job = enqueue_job(conn, args.kind, json.loads(args.payload))
+            print(json.dumps(job_summary(job)))
+        else:
+            print(f"Purged {purge_jobs(conn, args.days)} jobs.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
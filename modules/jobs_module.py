@@ -0,0 +1,87 @@
+# modules/jobs_module.py
+# Status, progress and results of background jobs (see modules/jobs.py). Heavy
+# endpoints queue a job instead of running inline when called as POST with
+# ?background=1 and answer 202 with the job's status URL.
+from flask import Blueprint, request, jsonify, url_for, Response, stream_with_context
+from modules.db import get_db
+from modules.jobs import get_job, list_jobs, request_cancel, job_summary, iter_large_object, STATUSES
+
+jobs_bp = Blueprint('jobs_bp', __name__)
+
+MAX_LIST_LIMIT = 200
+RESULT_EXTENSIONS = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}
+
+def background_requested():
+    """True for POST requests with ?background=1; a GET never enqueues anything."""
+    return request.method == 'POST' and request.args.get('background') == '1'
+
+def job_accepted(job):
+    """202 response for a newly queued job, pointing at its status URL."""
+    status_url = url_for('jobs_bp.job_status', job_id=job['id'])
+    response = jsonify({'job_id': job['id'], 'kind': job['kind'], 'status': job['status'], 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+def job_response(job):
+    summary = job_summary(job)
+    summary['status_url'] = url_for('jobs_bp.job_status', job_id=job['id'])
+    if job['status'] == 'succeeded':
+        summary['result_url'] = url_for('jobs_bp.job_result', job_id=job['id'])
+    return summary
+
+@jobs_bp.route("/jobs")
+def jobs_list():
+    """Recent jobs, newest first. Filters: ?status=, ?kind=, ?limit= (default 50)."""
+    status = request.args.get('status') or None
+    if status is not None and status not in STATUSES:
+        return jsonify({'error': f"Status must be one of {', '.join(STATUSES)}."}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_LIST_LIMIT)
+    except ValueError:
+        return jsonify({'error': "Limit must be a whole number."}), 400
+    jobs = list_jobs(get_db(), status=status, kind=request.args.get('kind') or None, limit=limit)
+    return jsonify({'jobs': [job_response(job) for job in jobs]})
+
+@jobs_bp.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    """Status, progress (0-1 plus a message), error and, once finished, the result or its download URL."""
+    job = get_job(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': "Job not found."}), 404
+    return jsonify(job_response(job))
+
+@jobs_bp.route("/jobs/<int:job_id>/result")
+def job_result(job_id):
+    """
+    The result of a succeeded job: the stored file (CSV/NDJSON), streamed from
+    the database in chunks, or the JSON result for jobs without one.
+    """
+    db = get_db()
+    job = get_job(db, job_id)
+    if job is None:
+        return jsonify({'error': "Job not found."}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'error': f"Job is {job['status']}; no result available.", 'status': job['status']}), 409
+    if job['result_oid'] is None:
+        return jsonify(job['result'])
+
+    def generate():
+        try:
+            yield from iter_large_object(db, job['result_oid'])
+        finally:
+            db.rollback() # Large objects are read inside a transaction
+
+    content_type = job['result_content_type'] or 'application/octet-stream'
+    response = Response(stream_with_context(generate()), mimetype=content_type)
+    extension = RESULT_EXTENSIONS.get(content_type, 'bin')
+    response.headers['Content-Disposition'] = f'attachment; filename="job-{job_id}-{job["kind"]}.{extension}"'
+    return response
+
+@jobs_bp.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """Cancels a queued job, or asks a running one to stop at its next progress report."""
+    job = request_cancel(get_db(), job_id)
+    if job is None:
+        return jsonify({'error': "Job not found."}), 404
+    return jsonify(job_response(job))
@@ -0,0 +1,234 @@
+# modules/metrics.py
+# In-process instrumentation exposed in the Prometheus text format at /metrics:
+#   - http_request_duration_seconds{endpoint,method,status}  per-route latency histogram
+#   - db_query_duration_seconds{statement}                    per-query timing via TimedCursor
+#   - span_duration_seconds{span}                             timed() blocks: db_checkout,
+#     geocode_upstream, fmr_lookup, template_render, ...
+# plus gauges collected at scrape time (connection pool, caches).
+#
+# Metrics are per process: with several gunicorn workers, each scrape sees the
+# worker that served it.
+#
+# Opt-in slow-request profiler: set SLOW_REQUEST_PROFILE_MS to profile every request
+# with cProfile and dump the stats of those slower than the threshold to
+# SLOW_REQUEST_PROFILE_DIR (view with `python -m pstats <file>` or snakeviz).
+import bisect
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2 import extras
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values, Prometheus style."""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # sorted label tuple -> [count per bucket..., count above the last bucket, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+        return value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:len(self.buckets) + 1]):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_count{_label_text(key)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []  # callables returning [(name, help, type, {labels: value})]
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, help_text, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def register_collector(self, collector):
+        """Adds a callable evaluated at every scrape, e.g. to publish pool or cache stats."""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+                continue
+            for name, help_text, metric_type, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples.items():
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def register_stats(prefix, help_text, get_stats, **labels):
+    """
+    Publishes a component's stats() dict as gauges named <prefix>_<key> at every
+    scrape. `get_stats` may return None when the component is not initialized yet.
+    """
+    label_items = tuple(sorted(labels.items()))
+
+    def collect():
+        stats = get_stats()
+        if stats is None:
+            return []
+        return [(f"{prefix}_{key}", f"{help_text} ({key})", 'gauge', {label_items: value})
+                for key, value in stats.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)]
+
+    registry.register_collector(collect)
+
+
+registry = Registry()
+request_duration = registry.histogram('http_request_duration_seconds', "Request latency by route.")
+query_duration = registry.histogram('db_query_duration_seconds', "Database statement latency by statement type.")
+span_duration = registry.histogram('span_duration_seconds', "Latency of instrumented hot-path spans.")
+
+
+@contextmanager
+def timed(span):
+    """Records the duration of the enclosed block under span_duration_seconds{span=...}."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span_duration.observe(time.perf_counter() - start, span=span)
+
+
+_statement_re = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(\w+)")
+
+
+def statement_type(sql):
+    """First SQL keyword (SELECT, INSERT, WITH, ...) so the label set stays small."""
+    if isinstance(sql, bytes):
+        sql = sql.decode(errors='replace')
+    match = _statement_re.match(str(sql))
+    return match.group(1).upper() if match else "UNKNOWN"
+
+
+class TimedCursor(extras.RealDictCursor):
+    """RealDictCursor that records every statement in db_query_duration_seconds."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            query_duration.observe(time.perf_counter() - start, statement=statement_type(query))
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            query_duration.observe(time.perf_counter() - start, statement=statement_type(query))
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            query_duration.observe(time.perf_counter() - start, statement="COPY")
+
+
+def init_app(app):
+    """Installs request timing, template timing and the optional slow-request profiler."""
+    from flask import g, request, before_render_template, template_rendered
+
+    slow_ms = os.environ.get('SLOW_REQUEST_PROFILE_MS')
+    slow_threshold = float(slow_ms) / 1000 if slow_ms else None
+    profile_dir = os.environ.get('SLOW_REQUEST_PROFILE_DIR', '/tmp/brrrr-profiles')
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_start = time.perf_counter()
+        if slow_threshold is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g._profiler = profiler
+            except ValueError:
+                # Another request on this interpreter is already being profiled.
+                g._profiler = None
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_request_start', None)
+        if start is None:
+            return response
+        duration = time.perf_counter() - start
+        request_duration.observe(duration, endpoint=request.endpoint or "unmatched",
+                                 method=request.method, status=response.status_code)
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if duration >= slow_threshold:
+                os.makedirs(profile_dir, exist_ok=True)
+                path = os.path.join(profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-"
+                                                 f"{request.endpoint or 'unmatched'}-{int(duration * 1000)}ms.prof")
+                profiler.dump_stats(path)
+                logger.warning(f"Slow request {request.method} {request.path} took {duration * 1000:.0f} ms; "
+                               f"profile written to {path}")
+        return response
+
+    @app.teardown_request
+    def _stop_profiler(exception):
+        # after_request is skipped for unhandled exceptions; never leave a profiler running.
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+    def _template_started(sender, template, context, **extra):
+        g._template_start = time.perf_counter()
+
+    def _template_finished(sender, template, context, **extra):
+        start = g.pop('_template_start', None)
+        if start is not None:
+            span_duration.observe(time.perf_counter() - start, span="template_render")
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
@@ -0,0 +1,150 @@
+# modules/projections.py
+# Amortization schedules and multi-year projections, vectorized across months and
+# properties. Each *_batch function handles a block of properties at once as
+# (properties x months) or (properties x years) arrays; the iter_* generators
+# walk any number of properties block by block, so exports never hold more than
+# one block in memory.
+import numpy as np
+
+from modules.brrrr_engine import (
+    calculate_monthly_payment_batch, perform_brrrr_calculations_batch, NUMERIC_INPUT_COLUMNS,
+)
+
+BLOCK_SIZE = 256
+AMORTIZATION_FIELDS = ('property_id', 'month', 'payment', 'interest', 'principal', 'balance')
+PROJECTION_FIELDS = (
+    'property_id', 'year', 'property_value', 'loan_balance', 'equity', 'principal_paydown',
+    'monthly_rent', 'annual_operating_expenses', 'annual_debt_service', 'annual_cash_flow',
+    'cumulative_cash_flow',
+)
+DEFAULT_ASSUMPTIONS = {
+    'rent_growth_pct': 3.0,         # yearly rent growth
+    'expense_inflation_pct': 3.0,   # yearly growth of property tax and insurance
+    'appreciation_pct': 3.0,        # yearly growth of the property value from ARV
+}
+
+
+def amortization_batch(principal, annual_interest_rate, loan_term_years, months=None):
+    """
+    Full amortization schedules for a block of loans. Returns a dict of
+    (loans x months) arrays: payment, interest, principal and the balance after
+    each month. Months past a loan's term are all zeros. Uses the closed-form
+    balance, so there is no per-month loop.
+    """
+    principal = np.asarray(principal, dtype=float).reshape(-1, 1)
+    annual_interest_rate = np.asarray(annual_interest_rate, dtype=float).reshape(-1, 1)
+    loan_term_years = np.trunc(np.asarray(loan_term_years, dtype=float)).reshape(-1, 1)
+    rate = (annual_interest_rate / 100) / 12
+    n = loan_term_years * 12
+    if months is None:
+        months = int(n.max()) if n.size else 0
+    k = np.arange(1, months + 1, dtype=float).reshape(1, -1)
+
+    payment = calculate_monthly_payment_batch(principal, annual_interest_rate, loan_term_years)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        growth = (1 + rate) ** k
+        amortizing = principal * growth - payment * (growth - 1) / rate
+    straight = principal - payment * k
+    balance = np.where(rate == 0, straight, amortizing)
+
+    active = (k <= n) & (principal > 0)
+    balance = np.where(active, np.maximum(balance, 0.0), 0.0)
+    balance = np.where(np.isclose(balance, 0.0, atol=1e-6), 0.0, balance)
+    previous = np.concatenate([principal, balance[:, :-1]], axis=1) if months else balance
+    interest = np.where(active, previous * rate, 0.0)
+    principal_paid = np.where(active, previous - balance, 0.0)
+    return {
+        'payment': np.where(active, payment, 0.0),
+        'interest': interest,
+        'principal': principal_paid,
+        'balance': balance,
+    }
+
+
+def projection_batch(deals, years, assumptions=None):
+    """
+    Year-by-year projection for a block of deals (columnar BRRRR inputs) from the
+    refinance onward. Rent grows by rent_growth_pct and the percentage-of-rent
+    expenses follow it; property tax and insurance grow by expense_inflation_pct;
+    the property value grows from ARV by appreciation_pct. Returns a dict of
+    (deals x years) arrays named as in PROJECTION_FIELDS.
+    """
+    a = dict(DEFAULT_ASSUMPTIONS, **(assumptions or {}))
+    columns = {name: np.asarray(deals[name], dtype=float).reshape(-1, 1) for name in NUMERIC_INPUT_COLUMNS}
+    base = perform_brrrr_calculations_batch({name: values[:, 0] for name, values in columns.items()})
+    loan = base['refinance_loan_amount']
+
+    y = np.arange(1, years + 1, dtype=float).reshape(1, -1)
+    schedule = amortization_batch(loan, columns['interest_rate_2'][:, 0], columns['loan_term_years'][:, 0],
+                                  months=years * 12)
+    # Balance at the end of each year, and debt service paid within it.
+    loan_balance = schedule['balance'][:, 11::12]
+    annual_debt_service = schedule['payment'].reshape(len(loan), years, 12).sum(axis=2)
+
+    monthly_rent = columns['rent_estimate'] * (1 + a['rent_growth_pct'] / 100) ** (y - 1)
+    rent_share = (columns['property_management_pct'] + columns['maintenance_pct'] + columns['vacancy_pct']) / 100
+    fixed_costs = (columns['property_tax'] + columns['insurance']) * (1 + a['expense_inflation_pct'] / 100) ** (y - 1)
+    annual_operating_expenses = monthly_rent * 12 * rent_share + fixed_costs
+    annual_cash_flow = monthly_rent * 12 - annual_operating_expenses - annual_debt_service
+
+    property_value = columns['arv'] * (1 + a['appreciation_pct'] / 100) ** y
+    return {
+        'property_value': property_value,
+        'loan_balance': loan_balance,
+        'equity': property_value - loan_balance,
+        'principal_paydown': loan.reshape(-1, 1) - loan_balance,
+        'monthly_rent': monthly_rent,
+        'annual_operating_expenses': annual_operating_expenses,
+        'annual_debt_service': annual_debt_service,
+        'annual_cash_flow': annual_cash_flow,
+        'cumulative_cash_flow': np.cumsum(annual_cash_flow, axis=1),
+    }
+
+
+def _blocks(properties, block_size):
+    block = []
+    for prop in properties:
+        block.append(prop)
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _rows(ids, arrays, fields, counter_field, periods=None):
+    """
+    Flattens (properties x periods) arrays into row dicts in property, period
+    order. `periods` optionally limits how many periods each property emits.
+    """
+    width = arrays[fields[2]].shape[1]
+    flat = {name: np.round(arrays[name], 2).ravel().tolist() for name in fields[2:]}
+    for p, property_id in enumerate(ids):
+        count = width if periods is None else min(width, int(periods[p]))
+        for t in range(count):
+            i = p * width + t
+            row = {'property_id': property_id, counter_field: t + 1}
+            row.update({name: flat[name][i] for name in fields[2:]})
+            yield row
+
+
+def iter_amortization_rows(properties, block_size=BLOCK_SIZE):
+    """
+    Yields one row per property per month of its refinance loan. `properties` is
+    any iterable of property rows (dicts with 'id' and the BRRRR inputs).
+    """
+    for block in _blocks(properties, block_size):
+        deals = {name: [float(prop[name]) for prop in block] for name in NUMERIC_INPUT_COLUMNS}
+        loan = perform_brrrr_calculations_batch(deals)['refinance_loan_amount']
+        schedule = amortization_batch(loan, deals['interest_rate_2'], deals['loan_term_years'])
+        # Loans shorter than the block's longest term stop at their own last month.
+        terms = np.where(loan > 0, np.trunc(np.asarray(deals['loan_term_years'])) * 12, 0)
+        yield from _rows([prop['id'] for prop in block], schedule, AMORTIZATION_FIELDS, 'month', periods=terms)
+
+
+def iter_projection_rows(properties, years, assumptions=None, block_size=BLOCK_SIZE):
+    """Yields one row per property per projected year."""
+    for block in _blocks(properties, block_size):
+        deals = {name: [float(prop[name]) for prop in block] for name in NUMERIC_INPUT_COLUMNS}
+        projection = projection_batch(deals, years, assumptions)
+        yield from _rows([prop['id'] for prop in block], projection, PROJECTION_FIELDS, 'year')
@@ -1,21 +1,312 @@
 # modules/properties_module.py
-from flask import Blueprint, render_template, request, url_for, redirect
-from app import get_db # Import get_db from main app
+from flask import (
+    Blueprint, render_template, request, url_for, redirect, jsonify, Response, stream_with_context, current_app,
+)
+import base64
+import binascii
+import csv
+import io
+import json
+import math
+from datetime import datetime
+from modules.db import get_db
+from modules.property_store import import_properties_csv, METRICS_VERSION, STORED_METRICS, PROPERTY_COLUMNS
+from modules.projections import (
+    iter_amortization_rows, iter_projection_rows, AMORTIZATION_FIELDS, PROJECTION_FIELDS, DEFAULT_ASSUMPTIONS,
+    BLOCK_SIZE,
+)
+from modules.deal_optimizer import iter_solution_rows, parse_targets, SOLVE_FOR, SOLVE_FIELDS
+from modules.jobs import enqueue_job, store_large_object
+from modules.jobs_module import background_requested, job_accepted
 
 properties_bp = Blueprint('properties_bp', __name__)
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# Query parameter -> (column, comparison) for the numeric range filters.
+RANGE_FILTERS = {
+    'min_price': ('purchase_price', '>='), 'max_price': ('purchase_price', '<='),
+    'min_rent': ('rent_estimate', '>='), 'max_rent': ('rent_estimate', '<='),
+    'min_arv': ('arv', '>='), 'max_arv': ('arv', '<='),
+}
+
+def encode_page_cursor(saved_at, property_id):
+    """Opaque keyset cursor for the row a page ended on."""
+    raw = f"{saved_at.isoformat()}|{property_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_page_cursor(token):
+    """Inverse of encode_page_cursor; raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        saved_at, property_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(saved_at), int(property_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+
+def escape_like(text):
+    """Escapes LIKE wildcards so user input only ever matches as a literal prefix."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 @properties_bp.route("/saved_properties")
 def list_properties():
-    """Displays a list of all saved properties with options to load/edit or delete."""
+    """
+    Displays saved properties, newest first, with options to load/edit or delete.
+    Uses keyset pagination on (saved_at, id) so every page costs the same as the
+    first, plus optional address-prefix (q) and price/rent/ARV range filters.
+    """
+    message = request.args.get('message')
+    error = request.args.get('error')
+
+    conditions = []
+    params = []
+    filters = {}
+
+    address_prefix = request.args.get('q', '').strip()
+    if address_prefix:
+        # Matches the lower(property_address) text_pattern_ops index in schema.sql.
+        conditions.append("lower(property_address) LIKE %s")
+        params.append(escape_like(address_prefix.lower()) + '%')
+        filters['q'] = address_prefix
+
+    for arg, (column, op) in RANGE_FILTERS.items():
+        value = request.args.get(arg, '').strip()
+        if not value:
+            continue
+        try:
+            params.append(float(value))
+        except ValueError:
+            error = f"Ignoring invalid filter value for {arg}: {value}"
+            continue
+        conditions.append(f"{column} {op} %s")
+        filters[arg] = value
+
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = PAGE_SIZE
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    after = request.args.get('after')
+    if after:
+        try:
+            after_saved_at, after_id = decode_page_cursor(after)
+            page_conditions.append("(saved_at, id) < (%s, %s)")
+            page_params.extend([after_saved_at, after_id])
+        except ValueError:
+            error = "Invalid page cursor; showing the first page."
+            after = None
+
+    where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
     db = get_db()
     cursor = db.cursor()
-    properties = cursor.execute("SELECT id, property_address FROM properties ORDER BY saved_at DESC").fetchall()
+    # Fetch one extra row to know whether there is a next page.
+    cursor.execute(f"""
+        SELECT id, property_address, purchase_price, rent_estimate, arv, saved_at
+          FROM properties
+          {where}
+         ORDER BY saved_at DESC, id DESC
+         LIMIT %s
+    """, page_params + [limit + 1])
+    properties = cursor.fetchall()
     cursor.close() # Close cursor explicitly
     # No need to close db here, it's managed by app.teardown_appcontext
 
-    message = request.args.get('message')
-    error = request.args.get('error')
-    return render_template('saved_properties.html', properties=properties, message=message, error=error)
+    next_cursor = None
+    if len(properties) > limit:
+        properties = properties[:limit]
+        last = properties[-1]
+        next_cursor = encode_page_cursor(last['saved_at'], last['id'])
+
+    return render_template(
+        'saved_properties.html',
+        properties=properties,
+        message=message,
+        error=error,
+        filters=filters,
+        limit=limit,
+        is_first_page=not after,
+        next_cursor=next_cursor,
+    )
+
+# Each has a matching (metric DESC NULLS LAST, id DESC) index in schema.sql.
+RANKING_COLUMNS = ('cash_on_cash_return', 'monthly_cash_flow')
+
+def json_number(value):
+    """Floats/Decimals for JSON; infinite or missing values become None."""
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+@properties_bp.route("/saved_properties/top")
+def top_properties():
+    """
+    Ranks saved deals by a stored metric in one indexed query, e.g.
+    /saved_properties/top?by=cash_on_cash_return&max_cash_left=5000&limit=50.
+    Infinite CoC deals (no cash left in the deal) rank first and are reported with
+    "infinite_coc": true. Rows whose metrics are stale are flagged until backfilled.
+    """
+    order_by = request.args.get('by', 'cash_on_cash_return')
+    if order_by not in RANKING_COLUMNS:
+        return jsonify({'error': f"'by' must be one of: {', '.join(RANKING_COLUMNS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        max_cash_left = request.args.get('max_cash_left')
+        max_cash_left = float(max_cash_left) if max_cash_left not in (None, "") else None
+        min_cash_flow = request.args.get('min_cash_flow')
+        min_cash_flow = float(min_cash_flow) if min_cash_flow not in (None, "") else None
+    except ValueError as e:
+        return jsonify({'error': f"Invalid ranking parameter: {e}"}), 400
+
+    conditions = [f"{order_by} IS NOT NULL"]
+    params = []
+    if max_cash_left is not None:
+        conditions.append("cash_left_in_deal < %s")
+        params.append(max_cash_left)
+    if min_cash_flow is not None:
+        conditions.append("monthly_cash_flow >= %s")
+        params.append(min_cash_flow)
+
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute(f"""
+        SELECT id, property_address, metrics_version, {", ".join(STORED_METRICS)}
+          FROM properties
+         WHERE {" AND ".join(conditions)}
+         ORDER BY {order_by} DESC NULLS LAST, id DESC
+         LIMIT %s
+    """, params + [limit])
+    rows = cursor.fetchall()
+    cursor.close()
+
+    results = []
+    for row in rows:
+        result = {'id': row['id'], 'property_address': row['property_address'],
+                  'stale_metrics': row['metrics_version'] != METRICS_VERSION}
+        result.update({name: json_number(row[name]) for name in STORED_METRICS})
+        result['infinite_coc'] = row['cash_on_cash_return'] is not None and math.isinf(row['cash_on_cash_return'])
+        results.append(result)
+    return jsonify({'by': order_by, 'properties': results})
+
+def iter_saved_properties(db, property_ids=None):
+    """
+    Streams property rows through a server-side cursor, BLOCK_SIZE rows per round
+    trip, so exports over the whole table never load it into memory.
+    """
+    cursor = db.cursor(name='properties_export')
+    cursor.itersize = BLOCK_SIZE
+    try:
+        if property_ids:
+            cursor.execute(f"SELECT id, {', '.join(PROPERTY_COLUMNS)} FROM properties WHERE id = ANY(%s) ORDER BY id",
+                           (list(property_ids),))
+        else:
+            cursor.execute(f"SELECT id, {', '.join(PROPERTY_COLUMNS)} FROM properties ORDER BY id")
+        yield from cursor
+    finally:
+        cursor.close()
+        db.rollback() # End the read-only transaction the named cursor needed
+
+def stream_rows(rows, fieldnames, output_format):
+    """Encodes row dicts as CSV (with header) or newline-delimited JSON, one chunk per row."""
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(row) + "\n"
+
+@properties_bp.route("/saved_properties/export/<kind>", methods=["GET", "POST"])
+def export_schedules(kind):
+    """
+    Streams amortization schedules (kind=amortization, one row per property per
+    month) or multi-year projections (kind=projections, one row per property per
+    year; ?years=5/10/30 plus rent_growth_pct, expense_inflation_pct and
+    appreciation_pct overrides) for all saved properties or ?ids=1,2,3.
+    Output is CSV by default, or NDJSON with ?format=json. POST with
+    ?background=1 builds the file in a background job instead.
+    """
+    if kind not in ('amortization', 'projections'):
+        return jsonify({'error': "Export kind must be 'amortization' or 'projections'."}), 404
+    output_format = 'json' if request.args.get('format') == 'json' else 'csv'
+    try:
+        property_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        years = int(request.args.get('years', 10))
+        if not 1 <= years <= 50:
+            raise ValueError("years must be between 1 and 50")
+        assumptions = {key: float(request.args[key]) for key in DEFAULT_ASSUMPTIONS if request.args.get(key)}
+    except ValueError as e:
+        return jsonify({'error': f"Invalid export parameter: {e}"}), 400
+
+    if background_requested():
+        job = enqueue_job(get_db(), 'export', {'kind': kind, 'ids': property_ids, 'years': years,
+                                               'assumptions': assumptions, 'format': output_format})
+        return job_accepted(job)
+
+    properties = iter_saved_properties(get_db(), property_ids)
+    if kind == 'amortization':
+        rows, fieldnames = iter_amortization_rows(properties), AMORTIZATION_FIELDS
+    else:
+        rows, fieldnames = iter_projection_rows(properties, years, assumptions), PROJECTION_FIELDS
+
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(stream_rows(rows, fieldnames, output_format)), mimetype=mimetype)
+    if output_format == 'csv':
+        response.headers['Content-Disposition'] = f'attachment; filename="{kind}.csv"'
+    return response
+
+@properties_bp.route("/saved_properties/solve", methods=["POST"])
+def solve_saved_properties():
+    """
+    Runs the deal solver (see brrrr_bp.brrrr_solve) over all saved properties or
+    the given "ids" in one batch, BLOCK_SIZE properties per engine pass. JSON body:
+    "solve_for", "targets" and optional "bounds" and "ids". Streams one row per
+    property as NDJSON, or CSV with ?format=csv; ?background=1 runs it as a job.
+    """
+    payload = request.get_json(silent=True) or {}
+    output_format = 'csv' if request.args.get('format') == 'csv' else 'json'
+    try:
+        solve_for = payload.get('solve_for', 'purchase_price')
+        if solve_for not in SOLVE_FOR:
+            raise ValueError(f"can only solve for {', '.join(SOLVE_FOR)}")
+        targets = parse_targets(payload.get('targets') or {})
+        bounds = payload.get('bounds')
+        if bounds is not None:
+            bounds = (float(bounds[0]), float(bounds[1]))
+            if bounds[0] > bounds[1]:
+                raise ValueError("the lower bound must not exceed the upper bound")
+        property_ids = [int(i) for i in payload.get('ids') or []]
+    except (ValueError, TypeError, IndexError) as e:
+        return jsonify({'error': f"Invalid solve request: {e}"}), 400
+
+    if background_requested():
+        job = enqueue_job(get_db(), 'solve', {'solve_for': solve_for, 'targets': targets, 'bounds': bounds,
+                                              'ids': property_ids, 'format': output_format})
+        return job_accepted(job)
+
+    rows = iter_solution_rows(iter_saved_properties(get_db(), property_ids), solve_for, targets, bounds)
+    mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(stream_rows(rows, SOLVE_FIELDS, output_format)), mimetype=mimetype)
+    if output_format == 'csv':
+        response.headers['Content-Disposition'] = f'attachment; filename="solve_{solve_for}.csv"'
+    return response
+
+@properties_bp.route("/saved_properties/backfill_metrics", methods=["POST"])
+def queue_metrics_backfill():
+    """
+    Queues a background recompute of the stored metrics for rows with stale
+    metrics_version (?all=1 recomputes every row). Returns 202 with the job URL.
+    """
+    job = enqueue_job(get_db(), 'backfill_metrics', {'recompute_all': request.args.get('all') == '1'})
+    return job_accepted(job)
 
 @properties_bp.route("/delete_property/<int:property_id>")
 def delete_property(property_id):
@@ -41,3 +332,55 @@ def delete_property(property_id):
         cursor.close() # Close cursor explicitly
 
     return redirect(url_for('properties_bp.list_properties', message=message, error=error))
+
+@properties_bp.route("/import_properties", methods=["POST"])
+def import_properties():
+    """
+    Bulk-imports properties from an uploaded CSV ('file' field) or a text/csv body.
+    Existing addresses are updated, new ones inserted. Returns the import report
+    as JSON for API clients, or redirects back to the list with a summary.
+    With ?background=1 the CSV is stored and imported by a background job; the
+    report becomes the job's result.
+    """
+    wants_json = request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+    upload = request.files.get('file')
+    if background_requested():
+        db = get_db()
+        try:
+            input_oid = store_large_object(db, upload.stream if upload else io.BytesIO(request.get_data()))
+            job = enqueue_job(db, 'import_properties', input_oid=input_oid)
+        except Exception as e:
+            db.rollback()
+            return jsonify({'error': f"Database error while queueing the import: {e}"}), 500
+        return job_accepted(job)
+    if upload:
+        text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    else:
+        text_stream = io.StringIO(request.get_data(as_text=True), newline='')
+
+    report = None
+    error = None
+    status = 200
+    try:
+        report = import_properties_csv(get_db(), text_stream)
+    except (ValueError, UnicodeDecodeError) as e:
+        error = f"Invalid CSV: {e}"
+        status = 400
+    except Exception as e:
+        current_app.logger.exception("Property import failed.")
+        error = f"Database error while importing: {e}"
+        status = 500
+
+    if wants_json:
+        if error:
+            return jsonify({'error': error}), status
+        return jsonify(report)
+
+    message = None
+    if report:
+        message = (f"Import finished: {report['inserted']} inserted, {report['updated']} updated, "
+                   f"{report['rejected']} rejected.")
+        if report['errors']:
+            first = report['errors'][0]
+            error = f"First rejected row (line {first['line']}): {first['error']}"
+    return redirect(url_for('properties_bp.list_properties', message=message, error=error))
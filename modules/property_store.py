@@ -0,0 +1,314 @@
+# modules/property_store.py
+# Writes to the `properties` table: single-row upsert for the calculator's save
+# button, a streaming bulk CSV import (COPY into a staging table + one merge) and
+# the backfill of the stored computed metrics.
+#
+# CLI:  DATABASE_URL=... python -m modules.property_store import deals.csv
+#       DATABASE_URL=... python -m modules.property_store backfill
+import csv
+import io
+import logging
+import os
+import math
+import sys
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from modules.brrrr_engine import INPUT_COLUMNS, parse_deal_inputs, perform_brrrr_calculations_batch
+
+logger = logging.getLogger(__name__)
+
+PROPERTY_COLUMNS = INPUT_COLUMNS
+# Outputs stored next to the inputs so deals can be ranked in SQL.
+STORED_METRICS = (
+    'total_out_of_pocket', 'cash_left_in_deal', 'equity_created', 'monthly_mortgage_refi',
+    'monthly_cash_flow', 'annual_cash_flow', 'cash_on_cash_return',
+)
+# Bump whenever the BRRRR formulas change so the backfill recomputes every row.
+METRICS_VERSION = 1
+WRITE_COLUMNS = PROPERTY_COLUMNS + STORED_METRICS + ('metrics_version',)
+MAX_REPORTED_ERRORS = 1000
+BATCH_SIZE = 1000
+
+# (precision, scale) of the NUMERIC input columns in schema.sql; the others are INTEGER.
+MONEY, PERCENT, RATE = (15, 2), (5, 2), (5, 3)
+NUMERIC_COLUMN_TYPES = {
+    'purchase_price': MONEY, 'rehab_cost': MONEY, 'closing_costs_1': MONEY, 'arv': MONEY,
+    'down_payment_1_pct': PERCENT, 'interest_rate_1': RATE, 'refinance_pct': PERCENT,
+    'interest_rate_2': RATE, 'closing_costs_2': MONEY, 'rent_estimate': MONEY, 'property_tax': MONEY,
+    'insurance': MONEY, 'property_management_pct': PERCENT, 'maintenance_pct': PERCENT, 'vacancy_pct': PERCENT,
+}
+INTEGER_LIMIT = 2 ** 31 - 1
+
+_column_list = ", ".join(WRITE_COLUMNS)
+_update_list = ",\n        ".join(f"{col} = EXCLUDED.{col}" for col in WRITE_COLUMNS if col != 'property_address')
+
+# Built once: `xmax = 0` is only true for a freshly inserted row, which tells
+# inserts and updates apart without a prior SELECT.
+UPSERT_SQL = f"""
+    INSERT INTO properties ({_column_list})
+    VALUES ({", ".join(["%s"] * len(WRITE_COLUMNS))})
+    ON CONFLICT (property_address) DO UPDATE SET
+        {_update_list},
+        saved_at = CURRENT_TIMESTAMP
+    RETURNING id, (xmax = 0) AS inserted
+"""
+
+STAGING_TABLE_SQL = f"""
+    CREATE TEMP TABLE properties_import ON COMMIT DROP AS
+        SELECT {_column_list} FROM properties WITH NO DATA;
+    ALTER TABLE properties_import ADD COLUMN line_no INTEGER NOT NULL;
+"""
+
+COPY_SQL = f"COPY properties_import ({_column_list}, line_no) FROM STDIN WITH (FORMAT csv)"
+
+# Later rows in the file win over earlier rows for the same address.
+MERGE_SQL = f"""
+    WITH merged AS (
+        INSERT INTO properties ({_column_list})
+        SELECT DISTINCT ON (property_address) {_column_list}
+          FROM properties_import
+         ORDER BY property_address, line_no DESC
+        ON CONFLICT (property_address) DO UPDATE SET
+            {_update_list},
+            saved_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted) AS inserted,
+           count(*) FILTER (WHERE NOT inserted) AS updated
+      FROM merged
+"""
+
+
+def _column_value(name, value):
+    """
+    Fits a parsed input to its column type: NUMERIC values are rounded to the
+    column's scale (as PostgreSQL would) so the stored metrics match the stored
+    inputs. Raises ValueError for values the column cannot hold.
+    """
+    if name not in NUMERIC_COLUMN_TYPES:
+        if abs(value) > INTEGER_LIMIT:
+            raise ValueError(f"'{name}' is out of range.")
+        return value
+    precision, scale = NUMERIC_COLUMN_TYPES[name]
+    if not math.isfinite(value):
+        raise ValueError(f"'{name}' must be a finite number.")
+    value = round(value, scale)
+    limit = 10 ** (precision - scale)
+    if abs(value) >= limit:
+        raise ValueError(f"'{name}' must be less than {limit:,} in absolute value.")
+    return value
+
+
+def property_values(mapping):
+    """
+    Validates one property (form, JSON or CSV row) and returns its values in
+    PROPERTY_COLUMNS order. Raises ValueError with a readable reason, including
+    for values that do not fit their column.
+    """
+    property_address = (mapping.get('property_address') or '').strip()
+    if not property_address:
+        raise ValueError("Address/Name is required.")
+    numeric = parse_deal_inputs(mapping)
+    return (property_address,) + tuple(_column_value(col, numeric[col]) for col in PROPERTY_COLUMNS[1:])
+
+
+def compute_stored_metrics(rows):
+    """
+    Runs the batch engine over property value tuples (PROPERTY_COLUMNS order) and
+    returns one tuple of STORED_METRICS per row.
+    """
+    columns = {col: np.array([row[i] for row in rows], dtype=float)
+               for i, col in enumerate(PROPERTY_COLUMNS) if i > 0}
+    outputs = perform_brrrr_calculations_batch(columns)
+    return list(zip(*(outputs[name].tolist() for name in STORED_METRICS)))
+
+
+def upsert_property(db, mapping):
+    """
+    Inserts or updates one property (and its stored metrics) by address in a
+    single round trip. Returns (id, inserted). The caller commits.
+    """
+    values = property_values(mapping)
+    metrics = compute_stored_metrics([values])[0]
+    cursor = db.cursor()
+    try:
+        cursor.execute(UPSERT_SQL, values + metrics + (METRICS_VERSION,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return row['id'], row['inserted']
+
+
+class _CsvStream:
+    """File-like object that COPY reads from, producing CSV lines on demand."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buffer = ""
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def _copy_value(value):
+    # COPY's csv format wants PostgreSQL's spelling of infinite floats.
+    if isinstance(value, float) and math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return value
+
+
+def _validated_lines(reader, report):
+    """
+    Yields COPY-ready CSV lines (inputs, stored metrics, line number) for valid
+    rows and records the invalid ones in `report`. Metrics are computed with the
+    batch engine BATCH_SIZE rows at a time.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    pending = []
+
+    def flush():
+        for (values, line_no), metrics in zip(pending, compute_stored_metrics([v for v, _ in pending])):
+            writer.writerow([_copy_value(v) for v in values + metrics + (METRICS_VERSION, line_no)])
+        pending.clear()
+        data = out.getvalue()
+        out.seek(0)
+        out.truncate(0)
+        return data
+
+    # Line 1 is the header.
+    for line_no, row in enumerate(reader, start=2):
+        try:
+            values = property_values(row)
+        except (ValueError, TypeError) as e:
+            report['rejected'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'line': line_no, 'property_address': row.get('property_address'),
+                                         'error': str(e)})
+            continue
+        report['accepted'] += 1
+        pending.append((values, line_no))
+        if len(pending) >= BATCH_SIZE:
+            yield flush()
+    if pending:
+        yield flush()
+
+
+def import_properties_csv(db, text_stream):
+    """
+    Streams a CSV of properties (header row with the `properties` columns) into
+    the table: rows are validated in Python, COPYed into a temp staging table and
+    merged with one INSERT ... ON CONFLICT (property_address) DO UPDATE.
+
+    Returns a report with inserted/updated/rejected counts, the number of rows
+    superseded by a later row for the same address, and row-level errors.
+    Commits on success and rolls back on database errors.
+    """
+    reader = csv.DictReader(text_stream)
+    missing = [col for col in PROPERTY_COLUMNS if col not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+
+    report = {'inserted': 0, 'updated': 0, 'rejected': 0, 'accepted': 0, 'duplicates': 0, 'errors': []}
+    cursor = db.cursor()
+    try:
+        cursor.execute(STAGING_TABLE_SQL)
+        cursor.copy_expert(COPY_SQL, _CsvStream(_validated_lines(reader, report)))
+        cursor.execute(MERGE_SQL)
+        counts = cursor.fetchone()
+        report['inserted'] = counts['inserted']
+        report['updated'] = counts['updated']
+        report['duplicates'] = report['accepted'] - report['inserted'] - report['updated']
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return report
+
+
+def backfill_metrics(db, batch_size=BATCH_SIZE, recompute_all=False, progress=None):
+    """
+    Recomputes stored metrics for rows whose metrics_version is missing or out of
+    date (or every row with recompute_all), walking the table by id in batches and
+    committing after each batch. `progress`, if given, is called with the running
+    count after each committed batch. Returns the number of rows updated.
+    """
+    stale_condition = "TRUE" if recompute_all else "metrics_version IS DISTINCT FROM %(version)s"
+    metric_assignments = ", ".join(f"{name} = v.{name}" for name in STORED_METRICS)
+    updated = 0
+    last_id = 0
+    while True:
+        cursor = db.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT id, {", ".join(PROPERTY_COLUMNS)}
+                  FROM properties
+                 WHERE id > %(last_id)s AND {stale_condition}
+                 ORDER BY id
+                 LIMIT %(limit)s
+            """, {'last_id': last_id, 'version': METRICS_VERSION, 'limit': batch_size})
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            values = [tuple(row[col] for col in PROPERTY_COLUMNS) for row in rows]
+            metrics = compute_stored_metrics(values)
+            execute_values(cursor, f"""
+                UPDATE properties AS p
+                   SET {metric_assignments}, metrics_version = {int(METRICS_VERSION)}
+                  FROM (VALUES %s) AS v (id, {", ".join(STORED_METRICS)})
+                 WHERE p.id = v.id
+            """, [(row['id'],) + m for row, m in zip(rows, metrics)],
+                template="(%s" + ", %s::double precision" * len(STORED_METRICS) + ")",
+                page_size=batch_size)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            cursor.close()
+        updated += len(rows)
+        last_id = rows[-1]['id']
+        logger.info(f"Backfilled metrics for {updated} properties (through id {last_id}).")
+        if progress:
+            progress(updated)
+    return updated
+
+
+if __name__ == "__main__":
+    usage = "usage: python -m modules.property_store import <file.csv> | backfill [--all]"
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'backfill'):
+        sys.exit(usage)
+    import json
+    import psycopg2
+    from psycopg2 import extras
+
+    logging.basicConfig(level=logging.INFO)
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.cursor_factory = extras.RealDictCursor
+    try:
+        if sys.argv[1] == 'import':
+            if len(sys.argv) != 3:
+                sys.exit(usage)
+            with open(sys.argv[2], newline='', encoding='utf-8-sig') as f:
+                print(json.dumps(import_properties_csv(conn, f), indent=2))
+        else:
+            print(f"Updated {backfill_metrics(conn, recompute_all='--all' in sys.argv)} properties.")
+    finally:
+        conn.close()
@@ -1,80 +1,140 @@
 # modules/rent_module.py
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, jsonify, Response
+import csv
+import io
+import json
 import os
-import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-from app import get_db # Import get_db from main app
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.fmr_index import get_fmr_index, BEDROOM_COLUMNS
+from modules.geocoding import get_geocoder, GeocodingError, normalize_address
+from modules import geocoding, metrics
+from modules.db import get_db
+from modules.jobs import enqueue_job
+from modules.jobs_module import background_requested, job_accepted
 
 rent_bp = Blueprint('rent_bp', __name__)
 
-# --- Load Rent Data (happens once when the app starts) ---
-# Ensure the Excel file is in the same directory as app.py (or accessible path)
-# On Render, files are in /opt/render/project/src/
-# The path here is relative to this file's location (modules/)
-# os.path.dirname(__file__) is 'your-github-repo/modules'
-# os.path.dirname(os.path.dirname(__file__)) goes up two levels to 'your-github-repo'
-file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "fairmarketrent.xlsx")
-try:
-    df = pd.read_excel(file_path, sheet_name="can you organize this in a tabl")
-    print(f"Rent module initialized. Excel columns loaded: {df.columns.tolist()}")
-except FileNotFoundError:
-    print(f"Error: fairmarketrent.xlsx not found at {file_path}. Rent lookup will not work.")
-    df = pd.DataFrame() # Create an empty DataFrame to prevent errors later
-except Exception as e:
-    print(f"Error loading fairmarketrent.xlsx: {e}")
-    df = pd.DataFrame() # Create an empty DataFrame
+# --- Rent Data ---
+# fairmarketrent.xlsx is compiled into a memory-mapped ZIP index (see modules/fmr_index.py)
+# that is rebuilt automatically whenever the xlsx is newer than the compiled file. It is
+# loaded on first use, or before fork by app.preload_shared_data().
+
+# Reported without forcing the geocoder (and its SQLite store) into existence.
+metrics.register_stats('geocoder', "Geocode cache",
+                       lambda: geocoding._geocoder.stats() if geocoding._geocoder else None)
+
+def geocode_error_message(e):
+    """User-facing message for a failed geocode, as shown on the lookup page."""
+    if isinstance(e, GeocodingError):
+        return f"Geocoding service error: {e}. Please try again or enter a ZIP code directly."
+    return f"An unexpected error occurred during geocoding: {e}"
+
+def resolve_rents(zip_code, year=None):
+    """
+    Looks up every bedroom size for an already-resolved ZIP code, for the latest
+    fiscal year or the most recent one at or before `year`, falling back to the
+    county FMR. Returns (record, error); see FmrIndex.lookup for the record.
+    """
+    fmr_index = get_fmr_index()
+    if fmr_index is None: # Check if the rent index was loaded successfully
+        return None, "Rent data not loaded. Please ensure 'fairmarketrent.xlsx' is correctly placed."
+    try:
+        with metrics.timed('fmr_lookup'):
+            record = fmr_index.lookup(zip_code, year)
+    except ValueError:
+        return None, "Invalid fiscal year. Please try again."
+    if record is None:
+        return None, f"No data found for ZIP code {zip_code}. Please try a different ZIP or address."
+    return record, None
+
+# asgi.py geocodes the rent form's address on the event loop and passes the
+# outcome to the Flask view under this ASGI scope key: {address: (zip, error)}.
+GEOCODED_SCOPE_KEY = 'brrrr.geocoded'
+
+def is_zip_code(input_string):
+    return input_string.isdigit() and len(input_string) == 5
+
+def geocode_address(address):
+    """
+    (zip_code, error) for an address, with the lookup page's messages. Uses the
+    answer asgi.py already resolved for this request if there is one, otherwise
+    the sync geocoder.
+    """
+    geocoded = request.environ.get('asgi.scope', {}).get(GEOCODED_SCOPE_KEY, {})
+    if address in geocoded:
+        return geocoded[address]
+    try:
+        zip_code = get_geocoder().geocode_zip(address)
+    except Exception as e:
+        return None, geocode_error_message(e)
+    if not zip_code:
+        return None, "Could not find a ZIP code for the provided address."
+    return zip_code, None
+
+def rent_for_bedrooms(record, bedrooms):
+    """Picks one bedroom size out of a resolve_rents record. Returns (rent, error)."""
+    if bedrooms not in BEDROOM_COLUMNS:
+        return None, "Invalid bedroom selection. Please try again."
+    rent = record['rents'][bedrooms]
+    if rent is None:
+        return None, f"No {bedrooms}-bedroom rent published for ZIP code {record['zip']}."
+    return rent, None
+
+def resolve_rent(zip_code, bedrooms, year=None):
+    """Looks up the rent for an already-resolved ZIP code. Returns (rent, error)."""
+    record, error = resolve_rents(zip_code, year)
+    if error:
+        return None, error
+    return rent_for_bedrooms(record, bedrooms)
+
+def rent_api_response(input_string, bedrooms, zip_code, error, year=None):
+    """
+    Status code and JSON body shared by the sync and async /api/rent_estimate
+    handlers. `rents` has every bedroom size and `rent` the requested one;
+    bedrooms may be omitted to get just `rents`.
+    """
+    record = None
+    rent = None
+    if zip_code and not error:
+        record, error = resolve_rents(zip_code, year)
+        if record is not None and bedrooms:
+            rent, error = rent_for_bedrooms(record, bedrooms)
+    elif not error:
+        error = "Please enter a valid 5-digit ZIP code or a complete address."
+    body = {
+        'address_or_zip': input_string, 'bedrooms': bedrooms, 'zip': zip_code, 'rent': rent,
+        'rents': record['rents'] if record else None,
+        'year': record['year'] if record else None,
+        'source': record['source'] if record else None,
+        'county': record['county'] if record else None,
+        'error': error,
+    }
+    return (200 if record is not None and not error else 422), body
 
 @rent_bp.route("/rent_estimate", methods=["GET", "POST"])
 def rent_estimate_page():
     rent = None
+    record = None
     error = None
+    fmr_index = get_fmr_index()
+    years = fmr_index.years if fmr_index is not None else []
     if request.method == "POST":
         input_string = request.form.get("address_or_zip", "").strip()
         bedrooms = request.form.get("bedrooms", "")
+        year = request.form.get("year") or None
 
         zip_code_for_lookup = None
 
         try:
-            if input_string.isdigit() and len(input_string) == 5:
+            if is_zip_code(input_string):
                 zip_code_for_lookup = input_string
             else:
-                geolocator = Nominatim(user_agent="fair_market_rent_app")
-                try:
-                    location = geolocator.geocode(input_string, country_codes=['US'], addressdetails=True, timeout=5)
-                    if location and location.raw and 'address' in location.raw and 'postcode' in location.raw['address']:
-                        zip_code_for_lookup = location.raw['address']['postcode']
-                        if '-' in zip_code_for_lookup:
-                            zip_code_for_lookup = zip_code_for_lookup.split('-')[0]
-                        if not (zip_code_for_lookup.isdigit() and len(zip_code_for_lookup) == 5):
-                            zip_code_for_lookup = None
-                    else:
-                        error = "Could not find a ZIP code for the provided address."
-                except (GeocoderTimedOut, GeocoderServiceError) as e:
-                    error = f"Geocoding service error: {e}. Please try again or enter a ZIP code directly."
-                except Exception as e:
-                    error = f"An unexpected error occurred during geocoding: {e}"
+                zip_code_for_lookup, error = geocode_address(input_string)
 
             if zip_code_for_lookup:
-                if not df.empty: # Check if DataFrame was loaded successfully
-                    zip_row = df[df['ZIP'] == int(zip_code_for_lookup)]
-                    if zip_row.empty:
-                        error = f"No data found for ZIP code {zip_code_for_lookup}. Please try a different ZIP or address."
-                    else:
-                        col_map = {
-                            '0': 'Efficiency',
-                            '1': 'One-Bedroom',
-                            '2': 'Two-Bedroom',
-                            '3': 'Three-Bedroom',
-                            '4': 'Four-Bedroom'
-                        }
-                        col_name = col_map.get(bedrooms)
-                        if col_name and col_name in zip_row.columns:
-                            rent = zip_row.iloc[0][col_name]
-                        else:
-                            error = "Invalid bedroom selection. Please try again."
-                else:
-                    error = "Rent data not loaded. Please ensure 'fairmarketrent.xlsx' is correctly placed."
+                record, error = resolve_rents(zip_code_for_lookup, year)
+                if record is not None:
+                    rent, error = rent_for_bedrooms(record, bedrooms)
             elif not error:
                 error = "Please enter a valid 5-digit ZIP code or a complete address."
         except ValueError:
@@ -82,4 +142,179 @@ def rent_estimate_page():
         except Exception as e:
             error = f"An unexpected server error occurred: {e}"
 
-    return render_template('rent_lookup.html', rent=rent, error=error, request=request)
+    return render_template('rent_lookup.html', rent=rent, record=record, years=years, error=error,
+                           request=request)
+
+@rent_bp.route("/api/rent_estimate", methods=["GET", "POST"])
+def rent_estimate_api():
+    """
+    JSON rent lookup for one address_or_zip, bedrooms and optional fiscal year
+    (query string or JSON body).
+    When served through asgi.py this path is handled by a native async handler
+    instead, so slow geocodes don't hold a worker thread.
+    """
+    params = dict(request.args)
+    params.update(request.get_json(silent=True) or {})
+    input_string = str(params.get("address_or_zip", "")).strip()
+    bedrooms = str(params.get("bedrooms", ""))
+    year = str(params.get("year") or "").strip() or None
+
+    zip_code = None
+    error = None
+    if is_zip_code(input_string):
+        zip_code = input_string
+    elif input_string:
+        zip_code, error = geocode_address(input_string)
+
+    status, body = rent_api_response(input_string, bedrooms, zip_code, error, year)
+    return jsonify(body), status
+
+# --- Bulk Lookup ---
+BULK_MAX_ROWS = 50_000
+# Distinct addresses geocoded concurrently per bulk request. The public Nominatim
+# service allows roughly one request per second (and geocoding.RateLimiter holds
+# calls to that), so it gets one worker unless BULK_GEOCODE_WORKERS says otherwise.
+BULK_GEOCODE_WORKERS = int(os.environ.get('BULK_GEOCODE_WORKERS', 1 if geocoding.uses_public_service() else 4))
+BULK_FIELDS = ['row', 'address_or_zip', 'bedrooms', 'zip', 'rent', 'error']
+BLANK_ROW_ERROR = "Please enter a valid 5-digit ZIP code or a complete address."
+
+def parse_bulk_rows(req):
+    """
+    Reads (address_or_zip, bedrooms) rows from a JSON body, a CSV body or an
+    uploaded CSV file of a Flask/werkzeug request.
+    """
+    if req.is_json:
+        payload = req.get_json()
+        rows = payload.get('rows') if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON list of rows or an object with a 'rows' list.")
+        parsed = []
+        for row in rows:
+            if isinstance(row, dict):
+                parsed.append((str(row.get('address_or_zip', '')), str(row.get('bedrooms', ''))))
+            else:
+                parsed.append((str(row[0]), str(row[1])))
+    else:
+        upload = req.files.get('file')
+        text = upload.read().decode('utf-8-sig') if upload else req.get_data(as_text=True)
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or 'address_or_zip' not in reader.fieldnames:
+            raise ValueError("CSV input needs an 'address_or_zip' column (and 'bedrooms').")
+        parsed = [(row.get('address_or_zip') or '', row.get('bedrooms') or '') for row in reader]
+    if len(parsed) > BULK_MAX_ROWS:
+        raise ValueError(f"At most {BULK_MAX_ROWS} rows per request.")
+    return [(address.strip(), bedrooms.strip()) for address, bedrooms in parsed]
+
+def lookup_rents_for_zip(fmr_index, row_numbers, rows, zip_codes):
+    """Resolves rows whose ZIP is known with one vectorized join; yields result dicts."""
+    with metrics.timed('fmr_lookup_many'):
+        rents, zip_found, bedrooms_valid = fmr_index.lookup_many(zip_codes, [rows[i][1] for i in row_numbers])
+    for k, i in enumerate(row_numbers):
+        result = {'row': i, 'address_or_zip': rows[i][0], 'bedrooms': rows[i][1],
+                  'zip': zip_codes[k], 'rent': None, 'error': None}
+        if not bedrooms_valid[k]:
+            result['error'] = "Invalid bedroom selection. Please try again."
+        elif not zip_found[k]:
+            result['error'] = f"No data found for ZIP code {zip_codes[k]}. Please try a different ZIP or address."
+        elif rents[k] != rents[k]: # NaN: HUD published no rent for this size
+            result['error'] = f"No {rows[i][1]}-bedroom rent published for ZIP code {zip_codes[k]}."
+        else:
+            result['rent'] = float(rents[k])
+        yield result
+
+def bulk_error_results(rows, row_numbers, error):
+    for i in row_numbers:
+        yield {'row': i, 'address_or_zip': rows[i][0], 'bedrooms': rows[i][1], 'zip': None, 'rent': None,
+               'error': error}
+
+def group_bulk_rows(rows):
+    """
+    Splits bulk rows into (blank row numbers, ZIP row numbers, {normalized
+    address: row numbers}), so each distinct address is geocoded once.
+    """
+    blank_rows = []
+    zip_rows = []
+    rows_by_address = {}
+    for i, (address_or_zip, bedrooms) in enumerate(rows):
+        if is_zip_code(address_or_zip):
+            zip_rows.append(i)
+        elif address_or_zip:
+            rows_by_address.setdefault(normalize_address(address_or_zip), []).append(i)
+        else:
+            blank_rows.append(i)
+    return blank_rows, zip_rows, rows_by_address
+
+def bulk_rent_results(rows, fmr_index, geocoder, max_workers=BULK_GEOCODE_WORKERS):
+    """
+    Generator of per-row results in completion order. Rows that are already ZIP
+    codes are answered first in one vectorized join; each distinct address is
+    geocoded once on a bounded thread pool and its rows are emitted as soon as
+    that geocode finishes. Per-row problems are reported in the 'error' field.
+    """
+    blank_rows, zip_rows, rows_by_address = group_bulk_rows(rows)
+    yield from bulk_error_results(rows, blank_rows, BLANK_ROW_ERROR)
+    if zip_rows:
+        yield from lookup_rents_for_zip(fmr_index, zip_rows, rows, [rows[i][0] for i in zip_rows])
+
+    if not rows_by_address:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        futures = {executor.submit(geocoder.geocode_zip, rows[row_numbers[0]][0]): row_numbers
+                   for row_numbers in rows_by_address.values()}
+        for future in as_completed(futures):
+            row_numbers = futures[future]
+            error = None
+            try:
+                zip_code = future.result()
+                if not zip_code:
+                    error = "Could not find a ZIP code for the provided address."
+            except Exception as e:
+                error = geocode_error_message(e)
+            if error:
+                yield from bulk_error_results(rows, row_numbers, error)
+            else:
+                yield from lookup_rents_for_zip(fmr_index, row_numbers, rows, [zip_code] * len(row_numbers))
+    finally:
+        # Stop queued geocodes if the client goes away mid-stream.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@rent_bp.route("/rent_estimate/bulk", methods=["POST"])
+def bulk_rent_estimate():
+    """
+    Bulk rent lookup for many (address_or_zip, bedrooms) rows, sent as JSON
+    ({"rows": [...]}) or CSV. Results stream back as they complete, as
+    newline-delimited JSON, or as CSV with ?format=csv. Each result carries its
+    input 'row' number since rows are not returned in input order. With
+    ?background=1 the lookup runs as a job and the results are downloaded from
+    the job once it finishes.
+    """
+    try:
+        rows = parse_bulk_rows(request)
+    except (ValueError, TypeError, IndexError, KeyError, UnicodeDecodeError) as e:
+        return jsonify({'error': f"Invalid bulk request: {e}"}), 400
+
+    if background_requested():
+        output_format = 'csv' if request.args.get('format') == 'csv' else 'json'
+        job = enqueue_job(get_db(), 'bulk_rent', {'rows': rows, 'format': output_format})
+        return job_accepted(job)
+
+    fmr_index = get_fmr_index()
+    if fmr_index is None:
+        return jsonify({'error': "Rent data not loaded. Please ensure 'fairmarketrent.xlsx' is correctly placed."}), 503
+    results = bulk_rent_results(rows, fmr_index, get_geocoder())
+
+    if request.args.get('format') == 'csv':
+        def generate_csv():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=BULK_FIELDS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(result)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            yield buffer.getvalue()
+        return Response(generate_csv(), mimetype='text/csv')
+
+    return Response((json.dumps(result) + "\n" for result in results), mimetype='application/x-ndjson')
@@ -21,5 +21,83 @@ CREATE TABLE IF NOT EXISTS properties (
     property_management_pct NUMERIC(5, 2) NOT NULL,
     maintenance_pct NUMERIC(5, 2) NOT NULL,
     vacancy_pct NUMERIC(5, 2) NOT NULL,
-    saved_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    saved_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Keyset pagination on (saved_at, id) needs saved_at to always be set. Tables
+-- created before it was NOT NULL are migrated once; afterwards this is a catalog
+-- lookup, not a table scan and an ACCESS EXCLUSIVE lock on every init_db.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'properties'
+                  AND column_name = 'saved_at' AND is_nullable = 'YES') THEN
+        UPDATE properties SET saved_at = CURRENT_TIMESTAMP WHERE saved_at IS NULL;
+        ALTER TABLE properties ALTER COLUMN saved_at SET NOT NULL;
+    END IF;
+END
+$$;
+
+-- Saved properties listing: newest-first keyset pagination.
+CREATE INDEX IF NOT EXISTS properties_saved_at_id_idx ON properties (saved_at DESC, id DESC);
+-- Case-insensitive address prefix search (lower(property_address) LIKE 'prefix%').
+CREATE INDEX IF NOT EXISTS properties_address_prefix_idx ON properties (lower(property_address) text_pattern_ops);
+-- Numeric range filters.
+CREATE INDEX IF NOT EXISTS properties_purchase_price_idx ON properties (purchase_price);
+CREATE INDEX IF NOT EXISTS properties_rent_estimate_idx ON properties (rent_estimate);
+CREATE INDEX IF NOT EXISTS properties_arv_idx ON properties (arv);
+
+-- Computed BRRRR outputs, maintained on every save/import (see modules/property_store.py)
+-- so deals can be ranked with one indexed query. metrics_version records the formula
+-- version they were computed with; stale rows are recomputed by
+-- `python -m modules.property_store backfill`.
+ALTER TABLE properties
+    ADD COLUMN IF NOT EXISTS total_out_of_pocket DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS cash_left_in_deal DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS equity_created DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS monthly_mortgage_refi DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS monthly_cash_flow DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS annual_cash_flow DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS cash_on_cash_return DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS metrics_version INTEGER;
+
+CREATE INDEX IF NOT EXISTS properties_coc_idx ON properties (cash_on_cash_return DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS properties_cash_flow_idx ON properties (monthly_cash_flow DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS properties_cash_left_idx ON properties (cash_left_in_deal);
+CREATE INDEX IF NOT EXISTS properties_metrics_version_idx ON properties (metrics_version);
+
+-- Background jobs (see modules/jobs.py). Workers claim the oldest runnable queued
+-- row with SELECT ... FOR UPDATE SKIP LOCKED. Uploaded inputs and downloadable
+-- results (CSV/NDJSON) are large objects referenced by input_oid / result_oid;
+-- small results are stored in `result`. Finished jobs are removed, with their
+-- large objects, by `python -m modules.jobs purge`.
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+    progress DOUBLE PRECISION NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    input_oid OID,
+    result JSONB,
+    result_oid OID,
+    result_content_type TEXT,
+    error TEXT,
+    worker TEXT,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- The claim query: oldest runnable queued job first.
+CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (run_after, id) WHERE status = 'queued';
+-- Recovery of jobs whose worker stopped sending heartbeats.
+CREATE INDEX IF NOT EXISTS jobs_running_heartbeat_idx ON jobs (heartbeat_at) WHERE status = 'running';
+-- Job listing, newest first.
+CREATE INDEX IF NOT EXISTS jobs_created_at_idx ON jobs (created_at DESC, id DESC);
@@ -0,0 +1,14 @@
+# tests/conftest.py
+# Run with `python -m pytest` from the project root. Tests that need PostgreSQL
+# use the database in DATABASE_URL and are skipped when it is not set.
+import os
+
+import pytest
+
+
+@pytest.fixture
+def database_url():
+    url = os.environ.get('DATABASE_URL')
+    if not url:
+        pytest.skip("DATABASE_URL is not set")
+    return url
@@ -0,0 +1,96 @@
+# tests/test_asgi.py
+# The async routes in asgi.py geocode without blocking and answer exactly like
+# the Flask views they replace.
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from modules import geocoding
+from modules.geocoding import (
+    CachedGeocoder, AsyncCachedGeocoder, StubGeocoder, AsyncStubGeocoder, GeocodingError,
+)
+
+ADDRESS = "233 S Wacker Dr, Chicago, IL"
+MAPPING = {ADDRESS: "60606", "1 Main St, Nowhere": "00000"}
+
+
+@pytest.fixture
+def geocoders(monkeypatch):
+    sync_geocoder = CachedGeocoder(StubGeocoder(MAPPING))
+    async_geocoder = AsyncCachedGeocoder(AsyncStubGeocoder(MAPPING), sync_geocoder)
+    monkeypatch.setattr(geocoding, '_geocoder', sync_geocoder)
+    monkeypatch.setattr(geocoding, '_async_geocoder', async_geocoder)
+    return sync_geocoder.upstream, async_geocoder.upstream
+
+
+def request(method, path, **kwargs):
+    import asgi
+
+    async def send():
+        transport = httpx.ASGITransport(app=asgi.application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            return await client.request(method, path, **kwargs)
+
+    return asyncio.run(send())
+
+
+def test_rent_form_geocodes_on_the_event_loop(geocoders):
+    sync_upstream, async_upstream = geocoders
+    response = request("POST", "/rent_estimate", data={'address_or_zip': ADDRESS, 'bedrooms': '2'})
+    assert response.status_code == 200
+    assert "2640" in response.text.replace(",", "")
+    assert async_upstream.calls == 1
+    assert sync_upstream.calls == 0
+
+
+def test_rent_form_reuses_the_async_geocode_failure(geocoders):
+    def fail(address):
+        raise GeocodingError("service unavailable")
+
+    sync_upstream, async_upstream = geocoders
+    async_upstream.on_call = fail
+    response = request("POST", "/rent_estimate", data={'address_or_zip': ADDRESS, 'bedrooms': '2'})
+    assert response.status_code == 200
+    assert "Geocoding service error: service unavailable" in response.text
+    # Failures are never cached, so only the handoff keeps Flask from geocoding again.
+    assert sync_upstream.calls == 0
+
+
+def test_bulk_lookup_matches_the_flask_view(geocoders):
+    from app import app
+
+    rows = [
+        {'address_or_zip': ADDRESS, 'bedrooms': '2'},
+        {'address_or_zip': ADDRESS.upper(), 'bedrooms': '1'},
+        {'address_or_zip': "60606", 'bedrooms': '3'},
+        {'address_or_zip': "Nowhere at all", 'bedrooms': '2'},
+        {'address_or_zip': "1 Main St, Nowhere", 'bedrooms': '2'},
+        {'address_or_zip': "", 'bedrooms': '2'},
+        {'address_or_zip': "60606", 'bedrooms': '9'},
+    ]
+    response = request("POST", "/rent_estimate/bulk", json={'rows': rows})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    results = sorted((json.loads(line) for line in response.text.splitlines()), key=lambda r: r['row'])
+
+    expected = app.test_client().post("/rent_estimate/bulk", json={'rows': rows})
+    assert results == sorted((json.loads(line) for line in expected.get_data(as_text=True).splitlines()),
+                             key=lambda r: r['row'])
+    assert results[0]['rent'] == 2640.0
+    assert geocoders[1].calls == 3  # one per distinct address
+
+
+def test_bulk_lookup_as_csv(geocoders):
+    body = "address_or_zip,bedrooms\n60606,2\n"
+    response = request("POST", "/rent_estimate/bulk?format=csv", content=body,
+                       headers={'Content-Type': 'text/csv'})
+    assert response.status_code == 200
+    assert response.text.splitlines() == ["row,address_or_zip,bedrooms,zip,rent,error", "0,60606,2,60606,2640.0,"]
+
+
+def test_bulk_lookup_rejects_bad_input(geocoders):
+    response = request("POST", "/rent_estimate/bulk", json={'rows': 'nope'})
+    assert response.status_code == 400
+    assert response.json()['error'].startswith("Invalid bulk request")
@@ -0,0 +1,140 @@
+# tests/test_brrrr_engine.py
+# Parity between the vectorized engine (perform_brrrr_calculations_batch) and the
+# scalar calculator (brrrr_module.perform_brrrr_calculations): every output field,
+# for random deals and for the edge cases the scalar path special-cases.
+import math
+
+import numpy as np
+import pytest
+
+from modules.brrrr_engine import (
+    perform_brrrr_calculations_batch, NUMERIC_INPUT_COLUMNS, INTEGER_INPUT_COLUMNS, OUTPUT_COLUMNS,
+)
+from modules.brrrr_module import perform_brrrr_calculations
+
+RTOL = 1e-9
+ATOL = 1e-6
+
+BASE_DEAL = {
+    'purchase_price': 150000.0, 'rehab_cost': 30000.0, 'closing_costs_1': 4000.0, 'arv': 230000.0,
+    'down_payment_1_pct': 10.0, 'interest_rate_1': 11.0, 'rehab_period_months': 5,
+    'refinance_pct': 75.0, 'interest_rate_2': 7.0, 'loan_term_years': 30, 'closing_costs_2': 5000.0,
+    'rent_estimate': 1850.0, 'property_tax': 250.0, 'insurance': 90.0,
+    'property_management_pct': 8.0, 'maintenance_pct': 5.0, 'vacancy_pct': 5.0,
+}
+
+
+def random_deals(count, seed=0):
+    rng = np.random.default_rng(seed)
+    deals = {
+        'purchase_price': rng.uniform(20_000, 800_000, count),
+        'rehab_cost': rng.uniform(0, 150_000, count),
+        'closing_costs_1': rng.uniform(0, 15_000, count),
+        'arv': rng.uniform(30_000, 1_200_000, count),
+        'down_payment_1_pct': rng.uniform(0, 100, count),
+        'interest_rate_1': rng.uniform(0, 18, count),
+        'rehab_period_months': rng.integers(0, 24, count).astype(float),
+        'refinance_pct': rng.uniform(0, 100, count),
+        'interest_rate_2': rng.uniform(0, 12, count),
+        'loan_term_years': rng.integers(0, 41, count).astype(float),
+        'closing_costs_2': rng.uniform(0, 15_000, count),
+        'rent_estimate': rng.uniform(0, 8_000, count),
+        'property_tax': rng.uniform(0, 12_000, count),
+        'insurance': rng.uniform(0, 4_000, count),
+        'property_management_pct': rng.uniform(0, 15, count),
+        'maintenance_pct': rng.uniform(0, 15, count),
+        'vacancy_pct': rng.uniform(0, 15, count),
+    }
+    # Make the scalar path's special cases common rather than vanishingly rare.
+    deals['interest_rate_2'][rng.random(count) < 0.1] = 0.0
+    deals['loan_term_years'][rng.random(count) < 0.1] = 0.0
+    deals['rent_estimate'][rng.random(count) < 0.05] = 0.0
+    return deals
+
+
+def edge_case_deals():
+    cases = {
+        'zero refinance rate': {'interest_rate_2': 0.0},
+        'zero loan term': {'loan_term_years': 0},
+        'zero rent': {'rent_estimate': 0.0},
+        'zero refinance': {'refinance_pct': 0.0},
+        'negative cash left': {'arv': 400000.0, 'refinance_pct': 80.0},
+        # Nothing invested and nothing borrowed: cash left is exactly 0.
+        'cash left exactly zero, cash flowing': dict({name: 0.0 for name in NUMERIC_INPUT_COLUMNS},
+                                                     rent_estimate=1500.0, loan_term_years=30),
+        'cash left exactly zero, no cash flow': dict({name: 0.0 for name in NUMERIC_INPUT_COLUMNS},
+                                                     loan_term_years=30),
+        # BASE_DEAL leaves $24,204.17 in; a higher ARV at 75% refinance pulls nearly all of it out.
+        'cash left within a cent of zero': {'arv': 230000.0 + (24204.166666666668 - 0.004) / 0.75},
+    }
+    return {name: dict(BASE_DEAL, **overrides) for name, overrides in cases.items()}
+
+
+def scalar_outputs(deal):
+    form = {'property_address': "Parity Test"}
+    for name in NUMERIC_INPUT_COLUMNS:
+        value = deal[name]
+        form[name] = str(int(value)) if name in INTEGER_INPUT_COLUMNS else repr(float(value))
+    outputs, error = perform_brrrr_calculations(form)
+    assert error is None, error
+    return outputs
+
+
+def assert_parity(deals):
+    count = len(next(iter(deals.values())))
+    batch = perform_brrrr_calculations_batch(deals)
+    for i in range(count):
+        expected = scalar_outputs({name: values[i] for name, values in deals.items()})
+        assert bool(batch['results_calculated'][i]) == expected['results_calculated']
+        for name in OUTPUT_COLUMNS:
+            np.testing.assert_allclose(batch[name][i], expected[name], rtol=RTOL, atol=ATOL,
+                                       err_msg=f"row {i}: {name}")
+
+
+def test_random_deals_match_scalar_path():
+    assert_parity(random_deals(2000))
+
+
+@pytest.mark.parametrize('case', sorted(edge_case_deals()))
+def test_edge_cases_match_scalar_path(case):
+    deal = edge_case_deals()[case]
+    assert_parity({name: np.array([value], dtype=float) for name, value in deal.items()})
+
+
+def test_cash_on_cash_rules():
+    cases = edge_case_deals()
+    deals = {name: np.array([cases[case][name] for case in sorted(cases)], dtype=float)
+             for name in NUMERIC_INPUT_COLUMNS}
+    batch = perform_brrrr_calculations_batch(deals)
+    coc = dict(zip(sorted(cases), batch['cash_on_cash_return']))
+    assert math.isinf(coc['cash left exactly zero, cash flowing'])
+    assert math.isinf(coc['cash left within a cent of zero'])
+    assert coc['cash left exactly zero, no cash flow'] == 0.0
+    # Clearly negative cash left is a plain (finite) ratio, not the infinite case.
+    assert math.isfinite(coc['negative cash left'])
+
+
+def test_scalar_and_broadcast_inputs():
+    scalar = perform_brrrr_calculations_batch(BASE_DEAL)
+    column = perform_brrrr_calculations_batch(dict(BASE_DEAL, rent_estimate=np.array([1850.0, 2000.0])))
+    assert scalar['monthly_cash_flow'].shape == ()
+    assert column['monthly_cash_flow'].shape == (2,)
+    np.testing.assert_allclose(column['monthly_cash_flow'][0], scalar['monthly_cash_flow'])
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')
+@pytest.mark.parametrize('value', [math.nan, math.inf, -math.inf])
+@pytest.mark.parametrize('column', ['purchase_price', 'arv', 'rent_estimate', 'interest_rate_2'])
+def test_non_finite_inputs(column, value):
+    deals = {name: np.array([BASE_DEAL[name]] * 2, dtype=float) for name in NUMERIC_INPUT_COLUMNS}
+    deals[column][1] = value
+    batch = perform_brrrr_calculations_batch(deals)
+
+    # The bad row is flagged without affecting its neighbour...
+    assert batch['results_calculated'].tolist() == [True, False]
+    assert_parity({name: values[:1] for name, values in deals.items()})
+    # ...and its outputs follow the same IEEE arithmetic as the scalar path.
+    expected = scalar_outputs({name: values[1] for name, values in deals.items()})
+    for name in OUTPUT_COLUMNS:
+        np.testing.assert_allclose(batch[name][1], expected[name], rtol=RTOL, atol=ATOL, equal_nan=True,
+                                   err_msg=name)
@@ -0,0 +1,153 @@
+# tests/test_brrrr_module.py
+# The calculator's JSON endpoints, through the Flask test client, and the
+# sensitivity-grid axes behind /brrrr_calculator/grid.
+import itertools
+
+import numpy as np
+import pytest
+
+from modules import brrrr_module
+from modules.brrrr_engine import build_grid_axes, GRID_MAX_CELLS, GRID_OUTPUTS
+from tests.test_brrrr_engine import BASE_DEAL, scalar_outputs
+
+DEAL = dict(BASE_DEAL, property_address="1 Api Test Way")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+
+    monkeypatch.setattr(brrrr_module, 'api_cache', brrrr_module.TTLCache(maxsize=16, ttl=600))
+    return app.app.test_client()
+
+
+# --- /api/brrrr ---
+def test_repeated_deals_are_served_from_the_cache(client):
+    first = client.post("/api/brrrr", json=DEAL)
+    assert (first.status_code, first.headers['X-Cache']) == (200, 'MISS')
+    # The same numbers typed differently, under another address, via the query string.
+    retyped = {name: f"{value:.2f}" if name == 'purchase_price' else str(value) for name, value in DEAL.items()}
+    second = client.get("/api/brrrr", query_string=dict(retyped, property_address="2 Elsewhere St"))
+    assert (second.status_code, second.headers['X-Cache']) == (200, 'HIT')
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert brrrr_module.api_cache.stats()['hits'] == 1
+
+
+def test_unchanged_deals_get_304_for_their_etag(client):
+    etag = client.post("/api/brrrr", json=DEAL).headers['ETag']
+    for cached in ('MISS', 'HIT'):
+        if cached == 'MISS':
+            brrrr_module.api_cache.clear()
+        response = client.get("/api/brrrr", query_string=DEAL, headers={'If-None-Match': etag})
+        assert (response.status_code, response.data, response.headers['X-Cache']) == (304, b"", cached)
+        assert response.headers['ETag'] == etag
+
+    stale = client.get("/api/brrrr", query_string=DEAL, headers={'If-None-Match': '"0123456789abcdef"'})
+    assert stale.status_code == 200
+    assert stale.get_json()['monthly_cash_flow'] is not None
+    # Conditional POSTs are answered in full; only GET and HEAD get a 304.
+    assert client.post("/api/brrrr", json=DEAL, headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('name', sorted(BASE_DEAL))
+def test_etag_changes_with_every_input(client, name):
+    etag = client.post("/api/brrrr", json=DEAL).headers['ETag']
+    changed = client.post("/api/brrrr", json=dict(DEAL, **{name: DEAL[name] + 1}))
+    assert changed.headers['X-Cache'] == 'MISS'
+    assert changed.headers['ETag'] != etag
+    assert client.get("/api/brrrr", query_string=DEAL, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_changes_with_the_metrics_version(client, monkeypatch):
+    etag = client.post("/api/brrrr", json=DEAL).headers['ETag']
+    # A new formula version ships with a restart, so the cache starts empty.
+    monkeypatch.setattr(brrrr_module, 'METRICS_VERSION', brrrr_module.METRICS_VERSION + 1)
+    brrrr_module.api_cache.clear()
+    response = client.get("/api/brrrr", query_string=DEAL, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_invalid_deals_are_rejected_and_not_cached(client):
+    response = client.post("/api/brrrr", json=dict(DEAL, arv="lots"))
+    assert response.status_code == 400
+    assert client.post("/api/brrrr", json=dict(DEAL, property_address=" ")).status_code == 400
+    assert len(brrrr_module.api_cache) == 0
+
+
+# --- /brrrr_calculator/grid ---
+def test_grid_axis_limit():
+    with pytest.raises(ValueError, match="between 1 and 3 axes"):
+        build_grid_axes([])
+    names = ['interest_rate_2', 'refinance_pct', 'rent_estimate', 'arv']
+    with pytest.raises(ValueError, match="between 1 and 3 axes"):
+        build_grid_axes([{'name': name, 'values': [1]} for name in names])
+    assert [name for name, _ in build_grid_axes([{'name': name, 'values': [1]} for name in names[:3]])] == names[:3]
+
+
+def test_grid_cell_cap():
+    axes = build_grid_axes([{'name': 'interest_rate_2', 'start': 5, 'stop': 8, 'num': 100},
+                            {'name': 'refinance_pct', 'values': list(range(100))},
+                            {'name': 'rent_estimate', 'start': 1000, 'stop': 3000, 'num': 100}])
+    assert np.prod([values.size for _, values in axes]) == GRID_MAX_CELLS
+    with pytest.raises(ValueError, match=f"1010000 cells; the limit is {GRID_MAX_CELLS}"):
+        build_grid_axes([{'name': 'interest_rate_2', 'start': 5, 'stop': 8, 'num': 101},
+                         {'name': 'refinance_pct', 'values': list(range(100))},
+                         {'name': 'rent_estimate', 'values': list(range(100))}])
+    # Rejected before anything that size is allocated.
+    with pytest.raises(ValueError, match="the limit is"):
+        build_grid_axes([{'name': 'arv', 'values': [1, 2]},
+                         {'name': 'interest_rate_2', 'start': 5, 'stop': 8, 'num': 10 ** 15}])
+
+
+@pytest.mark.parametrize('axes, error', [
+    ([{'name': 'arv', 'values': [1]}, {'name': 'arv', 'start': 1, 'stop': 2}], "'arv' appears on more than one axis"),
+    ([{'name': 'property_address', 'values': [1]}], "not a numeric BRRRR input"),
+    ([{'name': 'arv', 'start': 1, 'stop': 2, 'num': 0}], "at least one point"),
+    ([{'name': 'arv', 'values': []}], "at least one finite value"),
+    ([{'name': 'arv', 'values': [1, 'inf']}], "at least one finite value"),
+])
+def test_invalid_grid_axes(axes, error):
+    with pytest.raises(ValueError, match=error):
+        build_grid_axes(axes)
+
+
+def test_integer_grid_axes_are_truncated():
+    axes = dict(build_grid_axes([{'name': 'loan_term_years', 'start': 10, 'stop': 12, 'num': 5},
+                                 {'name': 'rehab_period_months', 'values': [2.9, -1.5, 0.5]},
+                                 {'name': 'interest_rate_2', 'values': [6.5]}]))
+    assert axes['loan_term_years'].tolist() == [10, 10, 11, 11, 12]
+    assert axes['rehab_period_months'].tolist() == [2, -1, 0]
+    assert axes['interest_rate_2'].tolist() == [6.5]
+
+
+def test_grid_cells_match_the_calculator(client):
+    axes = [{'name': 'interest_rate_2', 'start': 5, 'stop': 8, 'num': 7},
+            {'name': 'loan_term_years', 'values': [0, 15.5, 30]},
+            {'name': 'refinance_pct', 'values': [0, 60, 75, 100]}]
+    response = client.post("/brrrr_calculator/grid", json={'base': DEAL, 'axes': axes})
+    assert response.status_code == 200
+    grid = response.get_json()
+    assert [axis['name'] for axis in grid['axes']] == [axis['name'] for axis in axes]
+    assert grid['axes'][1]['values'] == [0, 15, 30]
+    assert np.asarray(grid['monthly_cash_flow']).shape == (7, 3, 4)
+
+    for i, j, k in itertools.product(range(7), range(3), range(4)):
+        cell = dict(DEAL, **{axis['name']: axis['values'][index] for axis, index in zip(grid['axes'], (i, j, k))})
+        expected = scalar_outputs(cell)
+        for name in GRID_OUTPUTS:
+            value = grid[name][i][j][k]
+            if value is None:  # infinite CoC
+                assert expected[name] == float('inf'), (cell, name)
+            else:
+                assert value == pytest.approx(expected[name], rel=1e-9, abs=1e-6), (cell, name)
+
+
+def test_invalid_grid_requests_are_rejected(client):
+    response = client.post("/brrrr_calculator/grid", json={'base': DEAL, 'axes': [{'name': 'arv', 'num': 5}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith("Invalid grid request:")
+    response = client.post("/brrrr_calculator/grid",
+                           json={'base': dict(DEAL, arv="lots"), 'axes': [{'name': 'rent_estimate', 'values': [1]}]})
+    assert response.status_code == 400
@@ -0,0 +1,79 @@
+# tests/test_brrrr_simulation.py
+import numpy as np
+import pytest
+
+from modules import brrrr_simulation
+from modules.brrrr_simulation import (
+    sample_deals, run_simulation, DEFAULT_ASSUMPTIONS, SIMULATION_OUTPUTS, PERCENTILES, MAX_TRIALS,
+)
+from tests.test_brrrr_engine import BASE_DEAL
+
+
+def test_fixed_rehab_cost_is_not_sampled():
+    assumptions = dict(DEFAULT_ASSUMPTIONS, rehab_cost_low_pct=100.0, rehab_cost_high_pct=100.0)
+    inputs = sample_deals(BASE_DEAL, assumptions, 1000, np.random.default_rng(0))
+    assert (inputs['rehab_cost'] == BASE_DEAL['rehab_cost']).all()
+
+
+def test_rehab_cost_stays_within_its_range():
+    inputs = sample_deals(BASE_DEAL, DEFAULT_ASSUMPTIONS, 10_000, np.random.default_rng(0))
+    assert inputs['rehab_cost'].min() >= 0.9 * BASE_DEAL['rehab_cost']
+    assert inputs['rehab_cost'].max() <= 1.4 * BASE_DEAL['rehab_cost']
+
+
+def final_summary(summaries):
+    return list(summaries)[-1]
+
+
+def test_results_depend_only_on_the_seed(monkeypatch):
+    monkeypatch.setattr(brrrr_simulation, 'MAX_PROCESSES', 2)
+    inline = final_summary(run_simulation(BASE_DEAL, trials=20_000, seed=7, chunk_size=2_000))
+    parallel = final_summary(run_simulation(BASE_DEAL, trials=20_000, seed=7, chunk_size=2_000, processes=2))
+    assert parallel == inline
+    other_seed = final_summary(run_simulation(BASE_DEAL, trials=20_000, seed=8, chunk_size=2_000))
+    assert other_seed['percentiles'] != inline['percentiles']
+
+
+@pytest.mark.parametrize('trials, chunk_size, updates', [
+    (10, 25_000, 1),        # one partial chunk
+    (5_000, 1_000, 5),      # fewer chunks than PROGRESS_UPDATES: one summary each
+    (100_500, 1_000, 20),   # 101 chunks: bounded number of summaries
+])
+def test_progress_stream(trials, chunk_size, updates):
+    summaries = list(run_simulation(BASE_DEAL, trials=trials, seed=1, chunk_size=chunk_size))
+    assert len(summaries) == updates
+    completed = [summary['completed'] for summary in summaries]
+    assert completed == sorted(set(completed))
+    assert [summary['done'] for summary in summaries] == [False] * (updates - 1) + [True]
+    last = summaries[-1]
+    assert last['completed'] == last['trials'] == trials
+    assert set(last['percentiles']) == set(SIMULATION_OUTPUTS)
+    assert list(last['percentiles']['monthly_cash_flow']) == [f"p{p}" for p in PERCENTILES]
+    assert 0.0 <= last['prob_negative_cash_flow'] <= 1.0
+
+
+def test_stopping_early_releases_the_process_pool(monkeypatch):
+    monkeypatch.setattr(brrrr_simulation, 'MAX_PROCESSES', 2)
+    summaries = run_simulation(BASE_DEAL, trials=200_000, seed=1, chunk_size=1_000, processes=2)
+    first = next(summaries)
+    assert not first['done']
+    summaries.close()
+    # The slot is free again for the next parallel run.
+    assert brrrr_simulation._parallel_slots.acquire(blocking=False)
+    brrrr_simulation._parallel_slots.release()
+
+
+def test_trial_count_limits():
+    with pytest.raises(ValueError):
+        next(run_simulation(BASE_DEAL, trials=0))
+    with pytest.raises(ValueError):
+        next(run_simulation(BASE_DEAL, trials=MAX_TRIALS + 1))
+
+
+def test_large_streamed_simulations_must_run_in_the_background():
+    from app import app
+    from modules.brrrr_module import MAX_INLINE_TRIALS
+
+    response = app.test_client().get(f"/brrrr_calculator/simulate/1?trials={MAX_INLINE_TRIALS + 1}")
+    assert response.status_code == 400
+    assert "background=1" in response.get_json()['error']
@@ -0,0 +1,166 @@
+# tests/test_db_pool.py
+import time
+
+import types
+
+import psycopg2
+from psycopg2 import extensions
+
+from modules.db_pool import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection whose backend can be killed."""
+
+    def __init__(self):
+        self.closed = 0
+        self.dead = False
+        self.info = types.SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def close(self):
+        self.closed = 1
+
+
+def fake_pool(**options):
+    pool = ConnectionPool('fake', **options)
+    pool._connect = FakeConnection
+    return pool
+
+
+def test_returned_connections_are_rolled_back_outside_the_pool_lock():
+    pool = fake_pool(maxconn=1)
+    conn = pool.getconn()
+    rollbacks = []
+
+    def rollback():
+        # Another thread can still use the pool meanwhile, and the slot stays taken.
+        rollbacks.append((pool._lock.locked(), pool.stats()['in_use']))
+        conn.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    conn.rollback = rollback
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert rollbacks == [(False, 1)]
+    assert pool.stats()['in_use'] == 0
+    assert pool.getconn() is conn
+
+
+def test_connection_that_fails_its_rollback_is_discarded():
+    pool = fake_pool()
+    conn = pool.getconn()
+    conn.dead = True
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    pool.putconn(conn)  # returned twice: ignored
+
+    assert conn.closed
+    stats = pool.stats()
+    assert (stats['idle'], stats['in_use'], stats['connections_discarded']) == (0, 0, 1)
+
+
+def test_idle_connection_is_probed_and_replaced_when_dead():
+    pool = fake_pool(check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.dead = True
+
+    replacement = pool.getconn()
+
+    assert replacement is not conn
+    assert conn.closed
+    stats = pool.stats()
+    assert stats['liveness_failures'] == 1
+    assert stats['connections_created'] == 2
+    assert stats['in_use'] == 1
+
+
+def test_recently_used_connection_is_not_probed():
+    pool = fake_pool(check_after=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert pool.stats()['liveness_checks'] == 0
+
+
+def test_idle_connections_expire_without_pool_traffic():
+    pool = fake_pool(minconn=0, idle_timeout=0.05)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    deadline = time.monotonic() + 2
+    while pool.stats()['idle'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert pool.stats()['idle'] == 0
+    assert conn.closed
+
+
+def _terminate(database_url, backend_pid):
+    admin = psycopg2.connect(database_url)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", (backend_pid,))
+    finally:
+        admin.close()
+
+
+def test_pooled_backend_killed_server_side_is_replaced(database_url):
+    pool = ConnectionPool(database_url, minconn=1, maxconn=2, check_after=0)
+    try:
+        conn = pool.getconn()
+        backend_pid = conn.get_backend_pid()
+        pool.putconn(conn)
+        _terminate(database_url, backend_pid)
+
+        conn = pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 AS one")
+            assert cursor.fetchone()['one'] == 1
+        assert conn.get_backend_pid() != backend_pid
+        pool.putconn(conn)
+        assert pool.stats()['liveness_failures'] == 1
+    finally:
+        pool.closeall()
+
+
+def test_request_after_backend_killed_succeeds(database_url, monkeypatch):
+    monkeypatch.setenv('DB_POOL_CHECK_AFTER', '0')
+    from modules import db
+    import app
+
+    monkeypatch.setattr(db, 'DATABASE_URL', database_url)
+    monkeypatch.setattr(db, '_db_pool', None)
+    app.init_db()
+    pool = db.get_db_pool()
+    try:
+        conn = pool.getconn()
+        backend_pid = conn.get_backend_pid()
+        pool.putconn(conn)
+        _terminate(database_url, backend_pid)
+
+        response = app.app.test_client().get('/saved_properties')
+        assert response.status_code == 200
+    finally:
+        pool.closeall()
@@ -0,0 +1,84 @@
+# tests/test_deal_optimizer.py
+import math
+
+import numpy as np
+import pytest
+
+from modules.brrrr_engine import perform_brrrr_calculations_batch
+from modules.deal_optimizer import solve_deals, parse_targets, SOLVE_FOR
+from tests.test_brrrr_engine import BASE_DEAL, random_deals
+
+# BASE_DEAL leaves $24,204.17 in the deal; this ARV pulls $5,200 more than that out.
+CASH_OUT_DEAL = dict(BASE_DEAL, arv=230000.0 + (24204.166666666668 + 5200) / 0.75)
+
+
+def outputs_at(deals, solve_for, values):
+    return perform_brrrr_calculations_batch(dict(deals, **{solve_for: values}))
+
+
+def test_coc_target_is_not_met_by_a_money_losing_deal():
+    # Rent does not change the cash left, so no rent gives a positive CoC return.
+    solution = solve_deals(CASH_OUT_DEAL, 'rent_estimate', parse_targets({'min_cash_on_cash_return': 12}))
+    assert solution['status'][0] == 'infeasible'
+    assert math.isnan(solution['value'][0])
+
+
+def test_coc_target_with_no_cash_left_needs_cash_flow():
+    deal = dict(BASE_DEAL, arv=230000.0 + 24204.166666666668 / 0.75)  # cash left rounds to zero
+    solution = solve_deals(deal, 'rent_estimate', parse_targets({'min_cash_on_cash_return': 12}))
+    assert solution['status'][0] == 'solved'
+    assert math.isinf(solution['cash_on_cash_return'][0])
+    assert solution['monthly_cash_flow'][0] > 0
+    below = outputs_at(deal, 'rent_estimate', solution['value'][0] - 0.01)
+    assert below['monthly_cash_flow'] <= 0
+
+
+@pytest.mark.parametrize('solve_for, target, expected', [
+    # Feasible ranges far narrower than the default bracket / 64.
+    ('refinance_pct', 100, 84.51),
+    ('refinance_pct', 200, 85.04),
+    ('purchase_price', 150, 129374.78),
+    ('purchase_price', 300, 128064.74),
+])
+def test_high_coc_targets_with_narrow_feasible_ranges(solve_for, target, expected):
+    solution = solve_deals(BASE_DEAL, solve_for, parse_targets({'min_cash_on_cash_return': target}))
+    assert solution['status'][0] == 'solved'
+    assert solution['value'][0] == pytest.approx(expected, abs=1e-9)
+    assert solution['cash_on_cash_return'][0] >= target
+    step = 0.01 if SOLVE_FOR[solve_for] == 'max' else -0.01
+    assert outputs_at(BASE_DEAL, solve_for, expected + step)['cash_on_cash_return'] < target
+
+
+@pytest.mark.parametrize('solve_for', sorted(SOLVE_FOR))
+@pytest.mark.parametrize('spec', [
+    {'min_cash_on_cash_return': 250},
+    {'min_cash_on_cash_return': 12, 'max_cash_left_in_deal': 40_000},
+    {'min_monthly_cash_flow': 200},
+    {'max_cash_left_in_deal': 10_000, 'min_monthly_cash_flow': 0},
+])
+def test_solutions_meet_every_target_and_are_tight_to_the_cent(solve_for, spec):
+    deals = random_deals(500, seed=1)
+    targets = parse_targets(spec)
+    solution = solve_deals(deals, solve_for, targets)
+    found = np.isin(solution['status'], ['solved', 'at_bound'])
+    solved = solution['status'] == 'solved'
+    assert found.any()
+
+    def meets(outputs):
+        ok = np.ones(solved.shape, dtype=bool)
+        if 'min_cash_on_cash_return' in targets:
+            coc = targets['min_cash_on_cash_return']
+            ok &= (outputs['monthly_cash_flow'] > 0) & (outputs['cash_on_cash_return'] >= coc)
+        if 'max_cash_left_in_deal' in targets:
+            ok &= outputs['cash_left_in_deal'] <= targets['max_cash_left_in_deal']
+        if 'min_monthly_cash_flow' in targets:
+            ok &= outputs['monthly_cash_flow'] >= targets['min_monthly_cash_flow']
+        return ok
+
+    value = np.where(found, solution['value'], 0.0)
+    assert meets(outputs_at(deals, solve_for, value))[found].all()
+    assert (solution['value'] == np.round(solution['value'], 2))[found].all()
+    # One cent further in the wanted direction breaks a target.
+    step = 0.01 if SOLVE_FOR[solve_for] == 'max' else -0.01
+    beyond = outputs_at(deals, solve_for, value + step)
+    assert not meets(beyond)[solved].any()
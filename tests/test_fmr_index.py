@@ -0,0 +1,183 @@
+# tests/test_fmr_index.py
+# Compiling HUD files into the rent store and looking rents up in it, from the
+# small HUD-shaped files in tests/fixtures/fmr.
+import os
+
+import numpy as np
+import pytest
+
+from modules import fmr_index
+from modules.fmr_index import build_store, read_safmr_file, read_county_file, read_crosswalk_file, FmrIndex
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "fmr")
+SAFMR_FILES = {2024: os.path.join(FIXTURES, "fy2024_safmrs.csv"), 2025: os.path.join(FIXTURES, "fy2025_safmrs.csv")}
+COUNTY_FILES = {2023: os.path.join(FIXTURES, "FY23_FMRs.csv"), 2025: os.path.join(FIXTURES, "FY25_FMRs.csv")}
+CROSSWALK = os.path.join(FIXTURES, "ZIP_COUNTY_122024.csv")
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(fmr_index, '_index', None)
+    monkeypatch.setattr(fmr_index, '_checked_at', 0.0)
+    monkeypatch.setattr(fmr_index, '_failure', None)
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    path = str(tmp_path / "rents.fmrstore")
+    build_store(SAFMR_FILES, COUNTY_FILES, CROSSWALK, index_path=path)
+    return path
+
+
+@pytest.fixture
+def index(store_path):
+    return FmrIndex(store_path)
+
+
+# --- Parsing HUD files ---
+def test_safmr_headers_and_dollar_amounts_are_parsed():
+    keys, rents = read_safmr_file(SAFMR_FILES[2025], 2025)
+    assert keys.tolist() == [60606 * 10_000 + 2025, 60614 * 10_000 + 2025]
+    # "SAFMR\n0BR" columns, not the "... 90% Payment Standard" ones next to them.
+    assert rents[0].tolist() == [2190.0, 2340.0, 2640.0, 3390.0, 3980.0]
+    # Blank cells stay missing.
+    assert np.isnan(rents[1, 4])
+
+
+def test_county_files_with_either_header_style_are_keyed_by_county_fips():
+    keys, rents = read_county_file(COUNTY_FILES[2025], 2025)
+    # 10-digit state + county + town codes are reduced to the 5-digit county.
+    assert (keys // 10_000).tolist() == [17031, 25001]
+    assert rents[0].tolist() == [1412.0, 1525.0, 1752.0, 2188.0, 2495.0]
+
+    keys, rents = read_county_file(COUNTY_FILES[2023], 2023)  # fips2010 / fmr0 headers
+    assert keys.tolist() == [17031 * 10_000 + 2023]
+    assert rents[0, 2] == 1483.0
+
+
+def test_crosswalk_maps_each_zip_to_its_largest_county():
+    zips, counties = read_crosswalk_file(CROSSWALK)
+    mapping = dict(zip(zips.tolist(), counties.tolist()))
+    assert mapping[60601] == 17031  # 80% of residences, over 17043's 20%
+    assert mapping[60606] == 17031
+    assert mapping[2601] == 25001
+
+
+def test_missing_columns_are_reported(tmp_path):
+    path = tmp_path / "bad.csv"
+    path.write_text("zip,rent\n60606,100\n")
+    with pytest.raises(ValueError, match="0-bedroom rent"):
+        read_safmr_file(str(path), 2025)
+
+
+# --- Lookups ---
+def test_store_metadata(index):
+    assert index.years == [2023, 2024, 2025]
+    assert index.meta['counts'] == {'zip_rows': 3, 'county_rows': 3, 'crosswalk_zips': 4}
+    assert len(index) == 2
+
+
+def test_latest_year_is_the_default(index):
+    record = index.lookup("60606")
+    assert record == {'zip': "60606", 'year': 2025, 'source': 'zip', 'county': None,
+                      'rents': {'0': 2190.0, '1': 2340.0, '2': 2640.0, '3': 3390.0, '4': 3980.0}}
+
+
+def test_lookups_use_the_latest_year_at_or_before_the_requested_one(index):
+    assert index.lookup("60606", 2024)['rents']['2'] == 2470.0
+    assert index.lookup("60606", "2024")['year'] == 2024
+    assert index.lookup("60606", 2030)['year'] == 2025
+    # No SAFMR row that old: fall back to the county's FY2023 FMR.
+    old = index.lookup("60606", 2023)
+    assert (old['source'], old['county'], old['year'], old['rents']['2']) == ('county', "17031", 2023, 1483.0)
+    assert index.lookup("60606", 2022) is None
+    with pytest.raises(ValueError):
+        index.lookup("60606", 10_000)
+
+
+def test_zips_without_small_area_rents_fall_back_to_their_county(index):
+    record = index.lookup("60601")
+    assert (record['source'], record['county'], record['year']) == ('county', "17031", 2025)
+    assert record['rents']['2'] == 1752.0
+    assert index.lookup("02601")['rents']['0'] == 1704.0
+    assert index.lookup("10001") is None
+
+
+def test_unpublished_sizes_are_none(index):
+    assert index.lookup("60614")['rents']['4'] is None
+    assert index.lookup_rent("60614", "3") == 2720.0
+
+
+def test_vectorized_lookups_match_single_lookups(index):
+    zips = ["60606", "60606", "60601", "60614", "10001", "02601"]
+    years = [2025, 2024, 2023, 2025, 2025, 2024]
+    result = index.lookup_all_many(zips, years)
+    for k, (zip_code, year) in enumerate(zip(zips, years)):
+        record = index.lookup(zip_code, year)
+        if record is None:
+            assert result['source'][k] == 0
+            continue
+        assert fmr_index.SOURCES[result['source'][k]] == record['source']
+        assert result['year'][k] == record['year']
+        expected = [np.nan if rent is None else rent for rent in record['rents'].values()]
+        np.testing.assert_array_equal(result['rents'][k], expected)
+
+    rents, zip_found, bedrooms_valid = index.lookup_many(["60606", "10001", "60606"], ["2", "2", "7"])
+    assert rents[0] == 2640.0
+    assert zip_found.tolist() == [True, False, True]
+    assert bedrooms_valid.tolist() == [True, True, False]
+
+
+# --- Loading ---
+@pytest.fixture
+def counted(monkeypatch):
+    """Counts calls to fmr_index functions by name."""
+    calls = {}
+
+    def count(name):
+        original = getattr(fmr_index, name)
+
+        def wrapper(*args, **kwargs):
+            calls[name] = calls.get(name, 0) + 1
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(fmr_index, name, wrapper)
+
+    count.calls = calls
+    return count
+
+
+def test_files_are_checked_at_most_once_per_interval(tmp_path, store_path, monkeypatch, counted):
+    xlsx_path = str(tmp_path / "missing.xlsx")
+    counted('_needs_reload')
+
+    index = fmr_index.get_fmr_index(xlsx_path, store_path)
+    assert index is not None
+    for _ in range(100):
+        assert fmr_index.get_fmr_index(xlsx_path, store_path) is index
+    assert counted.calls.get('_needs_reload', 0) == 0
+
+    monkeypatch.setattr(fmr_index, 'RELOAD_CHECK_INTERVAL', 0.0)
+    assert fmr_index.get_fmr_index(xlsx_path, store_path) is index
+    assert counted.calls['_needs_reload'] == 1
+
+    # A rebuilt store is picked up at the next check.
+    build_store({2025: SAFMR_FILES[2025]}, index_path=store_path)
+    os.utime(store_path, (index.mtime + 1, index.mtime + 1))
+    assert fmr_index.get_fmr_index(xlsx_path, store_path).years == [2025]
+
+
+def test_missing_data_is_retried_with_backoff(tmp_path, monkeypatch, counted):
+    paths = (str(tmp_path / "missing.xlsx"), str(tmp_path / "missing.fmrstore"))
+    counted('build_index')
+
+    for _ in range(100):
+        assert fmr_index.get_fmr_index(*paths) is None
+    assert counted.calls['build_index'] == 1
+    assert fmr_index._failure[2] == fmr_index.RETRY_INTERVAL
+
+    # Once the backoff expires the load is retried, and the next wait is longer.
+    monkeypatch.setattr(fmr_index, '_failure', (paths, 0.0, fmr_index.RETRY_INTERVAL))
+    assert fmr_index.get_fmr_index(*paths) is None
+    assert counted.calls['build_index'] == 2
+    assert fmr_index._failure[2] == 2 * fmr_index.RETRY_INTERVAL
@@ -0,0 +1,183 @@
+# tests/test_geocoding.py
+# The caching layer in front of the upstream geocoder: TTL expiry, negative
+# caching, the persistent SQLite tier and request coalescing, driven by a
+# StubGeocoder and a fake clock.
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from modules import geocoding
+from modules.geocoding import (
+    CachedGeocoder, AsyncCachedGeocoder, StubGeocoder, AsyncStubGeocoder, SqliteGeocodeStore, RateLimiter,
+)
+
+ADDRESS = "233 S Wacker Dr, Chicago, IL"
+UNKNOWN = "1 Nowhere Lane, Atlantis"
+MAPPING = {ADDRESS: "60606"}
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_geocoder(tmp_path=None, clock=None, ttl=100, negative_ttl=10, **stub_options):
+    clock = clock or FakeClock()
+    calls = []
+    upstream = StubGeocoder(MAPPING, on_call=calls.append, **stub_options)
+    store = SqliteGeocodeStore(str(tmp_path / "geocode.sqlite3"), clock=clock) if tmp_path else None
+    geocoder = CachedGeocoder(upstream, store=store, ttl=ttl, negative_ttl=negative_ttl, clock=clock)
+    return geocoder, calls, clock
+
+
+def test_cached_answer_is_refetched_after_its_ttl():
+    geocoder, calls, clock = make_geocoder()
+    assert geocoder.geocode_zip(ADDRESS) == "60606"
+    clock.advance(99)
+    # Differently formatted, same normalized key.
+    assert geocoder.geocode_zip("233 s. wacker dr,  chicago IL") == "60606"
+    assert len(calls) == 1
+
+    clock.advance(2)
+    assert geocoder.geocode_zip(ADDRESS) == "60606"
+    assert len(calls) == 2
+
+
+def test_missing_postcodes_are_cached_with_the_shorter_ttl():
+    geocoder, calls, clock = make_geocoder()
+    assert geocoder.geocode_zip(UNKNOWN) is None
+    clock.advance(9)
+    assert geocoder.geocode_zip(UNKNOWN) is None
+    assert len(calls) == 1
+
+    clock.advance(2)
+    assert geocoder.geocode_zip(UNKNOWN) is None
+    assert len(calls) == 2
+
+
+def test_upstream_errors_are_not_cached():
+    failures = [RuntimeError("upstream down")]
+
+    def fail_once(address):
+        if failures:
+            raise failures.pop()
+
+    geocoder = CachedGeocoder(StubGeocoder(MAPPING, on_call=fail_once), clock=FakeClock())
+    with pytest.raises(RuntimeError):
+        geocoder.geocode_zip(ADDRESS)
+    assert geocoder.geocode_zip(ADDRESS) == "60606"
+    assert geocoder.upstream.calls == 2
+
+
+def test_sqlite_store_persists_across_instances(tmp_path):
+    clock = FakeClock()
+    first, first_calls, _ = make_geocoder(tmp_path, clock)
+    assert first.geocode_zip(ADDRESS) == "60606"
+    assert first.geocode_zip(UNKNOWN) is None
+    assert len(first_calls) == 2
+
+    # A new process: empty LRU, same SQLite file.
+    second, second_calls, _ = make_geocoder(tmp_path, clock)
+    assert second.geocode_zip(ADDRESS) == "60606"
+    assert second.geocode_zip(UNKNOWN) is None
+    assert second_calls == []
+
+    # Expiry is enforced by the store too, negative answers first.
+    clock.advance(11)
+    third, third_calls, _ = make_geocoder(tmp_path, clock)
+    assert third.geocode_zip(ADDRESS) == "60606"
+    assert third.geocode_zip(UNKNOWN) is None
+    assert third_calls == [UNKNOWN]
+    assert third.store.purge_expired() == 0
+    clock.advance(100)
+    assert third.store.purge_expired() == 2
+
+
+def test_concurrent_identical_lookups_make_one_upstream_call():
+    release = threading.Event()
+    geocoder, calls, _ = make_geocoder()
+    geocoder.upstream.on_call = lambda address: (calls.append(address), release.wait(5))
+    workers = 8
+
+    with ThreadPoolExecutor(workers) as pool:
+        results = [pool.submit(geocoder.geocode_zip, ADDRESS) for _ in range(workers)]
+        # Hold the leader upstream until every other lookup is waiting on it.
+        deadline = time.monotonic() + 5
+        while geocoder.coalesced < workers - 1 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        release.set()
+        assert [result.result(5) for result in results] == ["60606"] * workers
+
+    assert len(calls) == 1
+    assert geocoder.upstream_calls == 1
+    assert geocoder.coalesced == workers - 1
+
+
+def test_async_lookups_coalesce_and_share_the_sync_cache():
+    geocoder, _, _ = make_geocoder()
+    calls = []
+    upstream = AsyncStubGeocoder(MAPPING, delay=0.05, on_call=calls.append)
+    async_geocoder = AsyncCachedGeocoder(upstream, geocoder)
+
+    async def lookups():
+        return await asyncio.gather(*(async_geocoder.geocode_zip(ADDRESS) for _ in range(5)))
+
+    assert asyncio.run(lookups()) == ["60606"] * 5
+    assert len(calls) == 1
+    # The answer landed in the shared tiers, so the sync path doesn't go upstream.
+    assert geocoder.geocode_zip(ADDRESS) == "60606"
+    assert geocoder.upstream.calls == 0
+
+
+# --- Rate limiting ---
+def test_rate_limiter_spaces_calls():
+    clock = FakeClock()
+    limiter = RateLimiter(2.0, clock=clock)
+    assert [limiter.reserve() for _ in range(3)] == [0.0, 0.5, 1.0]
+    clock.advance(5)
+    assert limiter.reserve() == 0.0
+    assert RateLimiter(0).reserve() == 0.0
+
+
+def test_rate_limiter_spaces_async_calls():
+    limiter = RateLimiter(50.0)
+
+    async def calls():
+        started = []
+
+        async def call():
+            await limiter.wait_async()
+            started.append(time.monotonic())
+
+        await asyncio.gather(*(call() for _ in range(4)))
+        return started
+
+    started = sorted(asyncio.run(calls()))
+    assert all(later - earlier >= 0.019 for earlier, later in zip(started, started[1:]))
+
+
+def test_public_geocoder_clients_share_one_rate_limiter(monkeypatch):
+    class Service:
+        def __init__(self, rate_limiter=None):
+            self.rate_limiter = rate_limiter
+
+    monkeypatch.delenv('GEOCODER', raising=False)
+    monkeypatch.delenv('GEOCODER_RATE_LIMIT', raising=False)
+    monkeypatch.setattr(geocoding, '_rate_limiter', None)
+    sync_client = geocoding._upstream_from_env(StubGeocoder, Service)
+    async_client = geocoding._upstream_from_env(AsyncStubGeocoder, Service)
+    assert sync_client.rate_limiter is async_client.rate_limiter
+    assert sync_client.rate_limiter.interval == 1.0
+    assert geocoding.uses_public_service()
+
+    monkeypatch.setenv('GEOCODER', 'stub')
+    assert not geocoding.uses_public_service()
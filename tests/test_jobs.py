@@ -0,0 +1,410 @@
+# tests/test_jobs.py
+# The job queue: handler dispatch, summaries and result spooling without a
+# database, then claiming, heartbeats, retries, cancellation and large-object
+# results against the PostgreSQL in DATABASE_URL, with handlers registered
+# under test-only kinds.
+import datetime
+import io
+import json
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from modules import jobs
+from modules.jobs import (
+    enqueue_job, get_job, request_cancel, job_summary, purge_jobs, store_large_object, iter_large_object,
+    JobContext, JobCancelled, Worker, HANDLERS,
+)
+
+KINDS = ['test_ok', 'test_other']
+
+
+# --- Without a database ---
+class FakeQueue:
+    """Stands in for the worker's queue connection, recording the SQL it is sent."""
+
+    def __init__(self, row=None):
+        self.row = row
+        self.calls = []
+
+    def fetchone(self, sql, params=None):
+        self.calls.append((" ".join(sql.split()), params))
+        return self.row
+
+
+class FakeDb:
+    closed = False
+
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def make_job(kind='test_ok', attempts=1, max_attempts=3, **fields):
+    return dict({'id': 7, 'kind': kind, 'payload': {}, 'attempts': attempts, 'max_attempts': max_attempts,
+                 'input_oid': None}, **fields)
+
+
+class IdleHeartbeat:
+    def __init__(self, queue, job_id):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def run_offline(job, monkeypatch):
+    """Runs a job on a Worker whose connections are fakes; returns the SQL sent to its queue connection."""
+    monkeypatch.setattr(jobs, '_Heartbeat', IdleHeartbeat)
+    worker = Worker('postgresql://unused', name='test-worker')
+    worker.queue, worker.db = FakeQueue(), FakeDb()
+    worker.run_job(job)
+    return worker.queue.calls
+
+
+def test_every_job_kind_the_app_queues_has_a_handler():
+    assert {'import_properties', 'backfill_metrics', 'export', 'solve', 'simulation', 'bulk_rent'} <= set(HANDLERS)
+    with pytest.raises(ValueError, match="Unknown job kind 'nope'"):
+        enqueue_job(None, 'nope')
+
+
+def test_jobs_run_the_handler_for_their_kind(monkeypatch):
+    seen = []
+    monkeypatch.setitem(HANDLERS, 'test_ok', lambda job: seen.append(('ok', job.id, job.payload)))
+    monkeypatch.setitem(HANDLERS, 'test_other', lambda job: seen.append(('other', job.id, job.payload)))
+    monkeypatch.setattr(Worker, 'finish', lambda self, context, result: None)
+    assert run_offline(make_job('test_other', payload={'n': 1}), monkeypatch) == []
+    assert seen == [('other', 7, {'n': 1})]
+
+
+def test_unknown_kinds_fail_without_a_retry(monkeypatch):
+    sql, params = run_offline(make_job('no_such_kind'), monkeypatch)[-1]
+    assert sql.startswith("UPDATE jobs SET status = %(status)s")
+    assert params['status'] == 'failed'
+    assert params['error'] == "ValueError: No handler for job kind 'no_such_kind'."
+
+
+@pytest.mark.parametrize('error, attempts, status', [
+    (psycopg2.OperationalError("server closed the connection"), 1, 'queued'),
+    (psycopg2.InterfaceError("connection already closed"), 2, 'queued'),
+    (psycopg2.OperationalError("server closed the connection"), 3, 'failed'),   # out of attempts
+    (ValueError("Property 12 not found."), 1, 'failed'),
+    (psycopg2.errors.NumericValueOutOfRange("numeric field overflow"), 1, 'failed'),
+])
+def test_only_connection_errors_are_retried(monkeypatch, error, attempts, status):
+    def fail(job):
+        raise error
+
+    monkeypatch.setitem(HANDLERS, 'test_ok', fail)
+    _, params = run_offline(make_job(attempts=attempts), monkeypatch)[-1]
+    assert params['status'] == status
+    assert params['error'] == f"{type(error).__name__}: {error}"
+    # Retries back off: 30s, then 60s, ...
+    assert params['delay'] == jobs.RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def test_progress_is_throttled_and_raises_once_cancelled(monkeypatch):
+    queue = FakeQueue({'cancel_requested': False})
+    context = JobContext(make_job(), FakeDb(), queue)
+    for done in range(1, 100):
+        context.progress(done, 100)
+    assert len(queue.calls) == 1
+    context.progress(100, 100)  # the last item is always recorded
+    assert queue.calls[-1][1] == (1.0, "100 of 100", 7)
+
+    queue.row = {'cancel_requested': True}
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL', 0.0)
+    with pytest.raises(JobCancelled):
+        context.progress(5, message="Importing")
+    assert queue.calls[-1][1] == (None, "Importing", 7)
+
+
+def test_job_summary_is_json_serializable():
+    created = datetime.datetime(2025, 3, 1, 12, 30, tzinfo=datetime.timezone.utc)
+    job = {'id': 3, 'kind': 'export', 'status': 'queued', 'progress': 0.0, 'result': {'updated': 2},
+           'created_at': created, 'started_at': None, 'finished_at': None}
+    summary = job_summary(job)
+    assert summary['created_at'] == "2025-03-01T12:30:00+00:00"
+    assert summary['started_at'] is None
+    assert json.loads(json.dumps(summary)) == summary
+    # The row itself is left alone.
+    assert job['created_at'] is created
+
+
+def test_results_are_spooled_as_utf8(monkeypatch):
+    monkeypatch.setattr(jobs, 'SPOOL_SIZE', 16)  # spill to a temp file
+    context = JobContext(make_job(), FakeDb(), FakeQueue())
+    context.write_result(iter(["zip,rent\n", "60606,2640\n", "Évry,1\n"]), jobs.CONTENT_TYPES['csv'])
+    assert context.result_content_type == 'text/csv'
+    assert context.result_file.read().decode() == "zip,rent\n60606,2640\nÉvry,1\n"
+    context.result_file.close()
+
+    with pytest.raises(ValueError, match="no input file"):
+        context.open_input()
+
+
+# --- Against PostgreSQL ---
+@pytest.fixture
+def conn(database_url, monkeypatch):
+    from modules import db
+    import app
+
+    monkeypatch.setattr(db, 'DATABASE_URL', database_url)
+    monkeypatch.setattr(db, '_db_pool', None)
+    app.init_db()
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    yield conn
+    db.get_db_pool().closeall()
+    conn.rollback()
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT lo_unlink(m.oid) FROM jobs j JOIN pg_largeobject_metadata m ON m.oid IN (j.input_oid, j.result_oid)
+             WHERE j.kind = ANY(%s)
+        """, (KINDS,))
+        cursor.execute("DELETE FROM jobs WHERE kind = ANY(%s)", (KINDS,))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def worker(database_url, conn):
+    worker = Worker(database_url, name='test-worker', kinds=KINDS)
+    worker.connect()
+    yield worker
+    worker.close()
+
+
+def register(monkeypatch, function, kind='test_ok'):
+    monkeypatch.setitem(HANDLERS, kind, function)
+
+
+def query(conn, sql, params=None):
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone() if cursor.description else None
+    conn.commit()
+    return row
+
+
+def test_claims_skip_rows_locked_by_another_worker(database_url, conn, worker, monkeypatch):
+    register(monkeypatch, lambda job: None)
+    first = enqueue_job(conn, 'test_ok')
+    second = enqueue_job(conn, 'test_ok')
+
+    other = psycopg2.connect(database_url)
+    try:
+        with other.cursor() as cursor:
+            cursor.execute("SELECT id FROM jobs WHERE id = %s FOR UPDATE", (first['id'],))
+        # The locked row is skipped rather than waited for.
+        claimed = worker.claim()
+        assert claimed['id'] == second['id']
+        assert (claimed['status'], claimed['attempts'], claimed['worker']) == ('running', 1, 'test-worker')
+        assert worker.claim() is None
+    finally:
+        other.close()
+    assert worker.claim()['id'] == first['id']
+
+
+def test_claims_respect_kinds_and_run_after(database_url, conn, worker, monkeypatch):
+    register(monkeypatch, lambda job: None)
+    register(monkeypatch, lambda job: None, kind='test_other')
+    later = enqueue_job(conn, 'test_ok')
+    query(conn, "UPDATE jobs SET run_after = CURRENT_TIMESTAMP + interval '1 hour' WHERE id = %s", (later['id'],))
+    other = enqueue_job(conn, 'test_other')
+
+    only_ok = Worker(database_url, kinds=['test_ok'])
+    only_ok.connect()
+    try:
+        assert only_ok.claim() is None
+    finally:
+        only_ok.close()
+    assert worker.claim()['id'] == other['id']
+
+
+def test_heartbeats_keep_a_job_and_stale_jobs_are_requeued(conn, worker, monkeypatch):
+    register(monkeypatch, lambda job: None)
+    monkeypatch.setattr(jobs, 'HEARTBEAT_INTERVAL', 0.05)
+    job = enqueue_job(conn, 'test_ok', max_attempts=2)
+    worker.claim()
+    query(conn, "UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP - interval '1 hour' WHERE id = %s", (job['id'],))
+
+    heartbeat = jobs._Heartbeat(worker.queue, job['id'])
+    heartbeat.start()
+    try:
+        deadline = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=5)
+        while query(conn, "SELECT heartbeat_at < CURRENT_TIMESTAMP - interval '1 minute' AS old FROM jobs "
+                          "WHERE id = %s", (job['id'],))['old']:
+            assert datetime.datetime.now(datetime.timezone.utc) < deadline
+    finally:
+        heartbeat.stop()
+    worker.requeue_stale()
+    assert get_job(conn, job['id'])['status'] == 'running'
+    conn.rollback()
+
+    # Without heartbeats the job is requeued, and failed once out of attempts.
+    monkeypatch.setattr(jobs, 'STALE_AFTER', 60)
+    for attempt, status in ((1, 'queued'), (2, 'failed')):
+        if attempt == 2:
+            assert worker.claim()['attempts'] == 2
+        query(conn, "UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP - interval '1 hour' WHERE id = %s",
+              (job['id'],))
+        worker._last_stale_check = 0.0
+        worker.requeue_stale()
+        row = get_job(conn, job['id'])
+        conn.rollback()
+        assert row['status'] == status
+        assert row['error'] == "Worker test-worker stopped responding."
+    assert row['finished_at'] is not None
+
+
+def test_connection_errors_are_retried_later_and_others_fail(conn, worker, monkeypatch):
+    def lose_connection(job):
+        raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    register(monkeypatch, lose_connection)
+    job = enqueue_job(conn, 'test_ok')
+    worker.run_job(worker.claim())
+    row = query(conn, "SELECT status, error, attempts, finished_at, "
+                      "run_after > CURRENT_TIMESTAMP + interval '20 seconds' AS delayed FROM jobs WHERE id = %s",
+                (job['id'],))
+    assert (row['status'], row['attempts'], row['finished_at'], row['delayed']) == ('queued', 1, None, True)
+    assert row['error'].startswith("OperationalError: server closed")
+    assert worker.claim() is None  # not before run_after
+
+    def bad_input(job):
+        raise ValueError("Property 12 not found.")
+
+    register(monkeypatch, bad_input)
+    query(conn, "UPDATE jobs SET run_after = CURRENT_TIMESTAMP WHERE id = %s", (job['id'],))
+    worker.run_job(worker.claim())
+    row = get_job(conn, job['id'])
+    conn.rollback()
+    assert (row['status'], row['attempts'], row['error']) == ('failed', 2, "ValueError: Property 12 not found.")
+    assert row['finished_at'] is not None
+
+
+def test_cancelling_queued_and_running_jobs(conn, worker, monkeypatch):
+    register(monkeypatch, lambda job: None)
+    queued = enqueue_job(conn, 'test_ok')
+    cancelled = request_cancel(conn, queued['id'])
+    assert (cancelled['status'], cancelled['cancel_requested']) == ('cancelled', True)
+    assert cancelled['finished_at'] is not None
+    assert worker.claim() is None
+    assert request_cancel(conn, 10 ** 12) is None
+
+    def cancel_midway(job):
+        job.db.cursor().execute("INSERT INTO jobs (kind) VALUES ('test_other')")  # rolled back on cancel
+        assert request_cancel(conn, job.id)['status'] == 'running'
+        job.progress(1, 1)
+        pytest.fail("progress should have raised JobCancelled")
+
+    register(monkeypatch, cancel_midway)
+    running = enqueue_job(conn, 'test_ok')
+    worker.run_job(worker.claim())
+    row = get_job(conn, running['id'])
+    assert (row['status'], row['cancel_requested']) == ('cancelled', True)
+    assert query(conn, "SELECT count(*) AS n FROM jobs WHERE kind = 'test_other'")['n'] == 0
+
+    # A finished job stays as it was.
+    assert request_cancel(conn, running['id'])['status'] == 'cancelled'
+
+
+def test_inputs_and_results_are_stored_as_large_objects(conn, worker, monkeypatch):
+    monkeypatch.setattr(jobs, 'CHUNK_SIZE', 1000)
+    text = "".join(f"{i},Évry\n" for i in range(2000))
+
+    def copy_input(job):
+        with job.open_input() as stream:
+            lines = stream.read().splitlines(keepends=True)
+        job.write_result(iter(lines), jobs.CONTENT_TYPES['csv'])
+        return {'lines': len(lines)}
+
+    register(monkeypatch, copy_input)
+    # The upload is committed together with the job.
+    input_oid = store_large_object(conn, io.BytesIO(("﻿" + text).encode()))
+    job = enqueue_job(conn, 'test_ok', input_oid=input_oid)
+    worker.run_job(worker.claim())
+
+    row = get_job(conn, job['id'])
+    assert (row['status'], row['progress'], row['result']) == ('succeeded', 1, {'lines': 2000})
+    assert row['result_content_type'] == 'text/csv'
+    chunks = list(iter_large_object(conn, row['result_oid']))
+    conn.rollback()
+    assert max(len(chunk) for chunk in chunks) == 1000
+    assert b"".join(chunks).decode() == text
+
+    # Purging removes old finished jobs along with their large objects.
+    query(conn, "UPDATE jobs SET finished_at = CURRENT_TIMESTAMP - interval '8 days' WHERE id = %s", (job['id'],))
+    assert purge_jobs(conn, days=7) >= 1
+    assert get_job(conn, job['id']) is None
+    assert query(conn, "SELECT count(*) AS n FROM pg_largeobject_metadata WHERE oid IN (%s, %s)",
+                 (input_oid, row['result_oid']))['n'] == 0
+
+
+def test_results_of_jobs_requeued_meanwhile_are_discarded(conn, worker, monkeypatch):
+    def lose_the_job(job):
+        query(conn, "UPDATE jobs SET status = 'queued', worker = NULL WHERE id = %s", (job.id,))
+        job.write_result(iter(["late\n"]), jobs.CONTENT_TYPES['csv'])
+        return {'late': True}
+
+    register(monkeypatch, lose_the_job)
+    job = enqueue_job(conn, 'test_ok')
+    lobs = query(conn, "SELECT count(*) AS n FROM pg_largeobject_metadata")['n']
+    worker.run_job(worker.claim())
+    row = get_job(conn, job['id'])
+    conn.rollback()
+    assert (row['status'], row['result'], row['result_oid']) == ('queued', None, None)
+    assert query(conn, "SELECT count(*) AS n FROM pg_largeobject_metadata")['n'] == lobs
+
+
+# --- Routes ---
+@pytest.mark.parametrize('query_string, error', [
+    ('status=done', "Status must be one of"),
+    ('limit=ten', "Limit must be a whole number."),
+])
+def test_job_list_filters_are_validated(query_string, error):
+    import app
+
+    response = app.app.test_client().get(f"/jobs?{query_string}")
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith(error)
+
+
+def test_job_routes(conn, worker, monkeypatch):
+    import app
+
+    register(monkeypatch, lambda job: job.write_result(iter(["a,b\n", "1,2\n"]), jobs.CONTENT_TYPES['csv']))
+    register(monkeypatch, lambda job: {'updated': 3}, kind='test_other')
+    csv_job = enqueue_job(conn, 'test_ok')
+    json_job = enqueue_job(conn, 'test_other')
+    client = app.app.test_client()
+
+    status = client.get(f"/jobs/{csv_job['id']}").get_json()
+    assert (status['status'], status['status_url']) == ('queued', f"/jobs/{csv_job['id']}")
+    assert 'result_url' not in status
+    response = client.get(f"/jobs/{csv_job['id']}/result")
+    assert (response.status_code, response.get_json()['status']) == (409, 'queued')
+
+    worker.run_job(worker.claim())
+    worker.run_job(worker.claim())
+    status = client.get(f"/jobs/{csv_job['id']}").get_json()
+    assert status['result_url'] == f"/jobs/{csv_job['id']}/result"
+    response = client.get(status['result_url'])
+    assert response.data == b"a,b\n1,2\n"
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == f'attachment; filename="job-{csv_job["id"]}-test_ok.csv"'
+    assert client.get(f"/jobs/{json_job['id']}/result").get_json() == {'updated': 3}
+
+    listed = client.get("/jobs?kind=test_other&status=succeeded").get_json()['jobs']
+    assert [job['id'] for job in listed] == [json_job['id']]
+    assert client.post(f"/jobs/{csv_job['id']}/cancel").get_json()['status'] == 'succeeded'
+    for path in ("/jobs/999999999999", "/jobs/999999999999/result"):
+        assert client.get(path).status_code == 404
+    assert client.post("/jobs/999999999999/cancel").status_code == 404
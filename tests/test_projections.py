@@ -0,0 +1,114 @@
+# tests/test_projections.py
+# The closed-form amortization and projections against plain month-by-month loops.
+import numpy as np
+import pytest
+
+from modules.brrrr_module import calculate_monthly_payment
+from modules.projections import amortization_batch, projection_batch, iter_amortization_rows, DEFAULT_ASSUMPTIONS
+from tests.test_brrrr_engine import BASE_DEAL, scalar_outputs
+
+RTOL = 1e-9
+ATOL = 1e-6
+
+
+def loop_schedule(principal, annual_interest_rate, loan_term_years, months):
+    """Month-by-month schedule: (payment, interest, principal, balance) lists of length `months`."""
+    term = int(loan_term_years) * 12
+    payment = calculate_monthly_payment(principal, annual_interest_rate, int(loan_term_years))
+    rate = annual_interest_rate / 100 / 12
+    balance = principal
+    schedule = {'payment': [], 'interest': [], 'principal': [], 'balance': []}
+    for month in range(1, months + 1):
+        if month > term or principal <= 0:
+            row = (0.0, 0.0, 0.0, 0.0)
+        else:
+            interest = balance * rate
+            # The last payment clears whatever rounding has left.
+            paid = balance if month == term else payment - interest
+            balance -= paid
+            row = (payment, interest, paid, balance)
+        for name, value in zip(('payment', 'interest', 'principal', 'balance'), row):
+            schedule[name].append(value)
+    return schedule
+
+
+LOANS = [
+    # principal, rate %, term years
+    (172_500.0, 7.0, 30),
+    (90_000.0, 0.0, 15),      # zero rate: straight-line
+    (120_000.0, 5.5, 0),      # zero-length term: no schedule
+    (0.0, 6.0, 30),           # nothing borrowed
+    (50_000.0, 12.5, 1),
+    (80_000.0, 6.25, 15.7),   # terms are truncated to whole years, like the calculator
+]
+
+
+@pytest.mark.parametrize('months', [None, 12, 480])
+def test_amortization_matches_a_monthly_loop(months):
+    principal, rates, terms = (np.array(column, dtype=float) for column in zip(*LOANS))
+    schedule = amortization_batch(principal, rates, terms, months=months)
+    width = schedule['balance'].shape[1]
+    assert width == (360 if months is None else months)
+    for i, loan in enumerate(LOANS):
+        expected = loop_schedule(*loan, width)
+        for name in ('payment', 'interest', 'principal', 'balance'):
+            np.testing.assert_allclose(schedule[name][i], expected[name], rtol=RTOL, atol=ATOL,
+                                       err_msg=f"{loan}: {name}")
+
+
+def test_schedules_end_at_zero_and_stay_there():
+    schedule = amortization_batch([172_500.0, 90_000.0], [7.0, 0.0], [30, 15], months=480)
+    assert (schedule['balance'][0, 359:] == 0).all()
+    assert (schedule['balance'][1, 179:] == 0).all()
+    assert (schedule['payment'][1, 180:] == 0).all()
+    # Principal repaid adds up to the loan.
+    np.testing.assert_allclose(schedule['principal'].sum(axis=1), [172_500.0, 90_000.0])
+
+
+def test_amortization_rows_stop_at_each_loans_term():
+    properties = [dict(BASE_DEAL, id=1, loan_term_years=1), dict(BASE_DEAL, id=2, loan_term_years=2),
+                  dict(BASE_DEAL, id=3, loan_term_years=0)]
+    rows = list(iter_amortization_rows(properties))
+    assert [sum(row['property_id'] == i for row in rows) for i in (1, 2, 3)] == [12, 24, 0]
+    assert rows[11]['balance'] == 0.0
+
+
+def loop_projection(deal, years, assumptions):
+    outputs = scalar_outputs(deal)
+    loan = outputs['refinance_loan_amount']
+    schedule = loop_schedule(loan, deal['interest_rate_2'], deal['loan_term_years'], years * 12)
+    rows = []
+    cumulative = 0.0
+    for year in range(1, years + 1):
+        rent = deal['rent_estimate'] * (1 + assumptions['rent_growth_pct'] / 100) ** (year - 1)
+        fixed = (deal['property_tax'] + deal['insurance']) * (1 + assumptions['expense_inflation_pct'] / 100) ** (year - 1)
+        share = (deal['property_management_pct'] + deal['maintenance_pct'] + deal['vacancy_pct']) / 100
+        expenses = rent * 12 * share + fixed
+        debt_service = sum(schedule['payment'][(year - 1) * 12:year * 12])
+        cash_flow = rent * 12 - expenses - debt_service
+        cumulative += cash_flow
+        value = deal['arv'] * (1 + assumptions['appreciation_pct'] / 100) ** year
+        balance = schedule['balance'][year * 12 - 1]
+        rows.append({
+            'property_value': value, 'loan_balance': balance, 'equity': value - balance,
+            'principal_paydown': loan - balance, 'monthly_rent': rent, 'annual_operating_expenses': expenses,
+            'annual_debt_service': debt_service, 'annual_cash_flow': cash_flow, 'cumulative_cash_flow': cumulative,
+        })
+    return rows
+
+
+@pytest.mark.parametrize('overrides, assumptions', [
+    ({}, {}),
+    ({'interest_rate_2': 0.0}, {'rent_growth_pct': 5.0}),
+    ({'loan_term_years': 5}, {'appreciation_pct': -2.0}),   # paid off mid-projection
+    ({'loan_term_years': 0}, {}),
+    ({'refinance_pct': 0.0}, {'expense_inflation_pct': 0.0}),
+])
+def test_projection_matches_a_yearly_loop(overrides, assumptions):
+    deal = dict(BASE_DEAL, **overrides)
+    years = 10
+    projection = projection_batch({name: [value] for name, value in deal.items()}, years, assumptions)
+    expected = loop_projection(deal, years, dict(DEFAULT_ASSUMPTIONS, **assumptions))
+    for name in expected[0]:
+        np.testing.assert_allclose(projection[name][0], [row[name] for row in expected], rtol=RTOL, atol=ATOL,
+                                   err_msg=name)
@@ -0,0 +1,71 @@
+# tests/test_property_store.py
+import csv
+import io
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from modules.property_store import property_values, import_properties_csv, PROPERTY_COLUMNS
+from tests.test_brrrr_engine import BASE_DEAL
+
+ADDRESS = "1 Import Test Way"
+
+
+def test_values_are_rounded_to_the_column_scale():
+    values = dict(zip(PROPERTY_COLUMNS, property_values(dict(BASE_DEAL, property_address=ADDRESS,
+                                                             arv=230000.004, interest_rate_2=6.8756))))
+    assert values['arv'] == 230000.0
+    assert values['interest_rate_2'] == 6.876
+
+
+@pytest.mark.parametrize('column, value', [
+    ('purchase_price', 1e13),           # NUMERIC(15, 2)
+    ('rent_estimate', -1e13),
+    ('vacancy_pct', 1000),              # NUMERIC(5, 2)
+    ('down_payment_1_pct', 999.996),    # rounds up to 1000.00
+    ('interest_rate_1', 100),           # NUMERIC(5, 3)
+    ('loan_term_years', 2 ** 31),       # INTEGER
+    ('arv', float('inf')),
+    ('arv', float('nan')),
+])
+def test_values_that_do_not_fit_their_column_are_rejected(column, value):
+    with pytest.raises(ValueError, match=column):
+        property_values(dict(BASE_DEAL, property_address=ADDRESS, **{column: value}))
+
+
+def test_largest_values_that_fit_are_accepted():
+    deal = dict(BASE_DEAL, property_address=ADDRESS, purchase_price=9999999999999.99, vacancy_pct=999.99,
+                interest_rate_1=99.999, loan_term_years=2 ** 31 - 1)
+    assert property_values(deal)
+
+
+def test_out_of_range_row_is_rejected_without_failing_the_import(database_url, monkeypatch):
+    from modules import db
+    import app
+
+    monkeypatch.setattr(db, 'DATABASE_URL', database_url)
+    monkeypatch.setattr(db, '_db_pool', None)
+    app.init_db()
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=PROPERTY_COLUMNS)
+    writer.writeheader()
+    writer.writerow(dict(BASE_DEAL, property_address=ADDRESS))
+    writer.writerow(dict(BASE_DEAL, property_address=ADDRESS + " (bad)", arv=1e14))
+    out.seek(0)
+
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        report = import_properties_csv(conn, out)
+        assert report['inserted'] + report['updated'] == 1
+        assert report['rejected'] == 1
+        assert report['errors'][0]['line'] == 3
+        assert "'arv'" in report['errors'][0]['error']
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT arv FROM properties WHERE property_address = %s", (ADDRESS,))
+            assert float(cursor.fetchone()['arv']) == BASE_DEAL['arv']
+            cursor.execute("DELETE FROM properties WHERE property_address LIKE %s", (ADDRESS + '%',))
+        conn.commit()
+    finally:
+        conn.close()
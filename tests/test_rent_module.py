@@ -0,0 +1,41 @@
+# tests/test_rent_module.py
+import json
+
+import pytest
+
+from modules import rent_module
+from modules.fmr_index import build_store, FmrIndex
+from modules.rent_module import lookup_rents_for_zip
+
+SAFMR_CSV = """ZIP Code,SAFMR 0BR,SAFMR 1BR,SAFMR 2BR,SAFMR 3BR,SAFMR 4BR
+60606,"$2,190","$2,340","$2,640","$3,390",
+"""
+
+
+@pytest.fixture
+def fmr_index(tmp_path):
+    safmr_path = tmp_path / "safmr.csv"
+    safmr_path.write_text(SAFMR_CSV)
+    index_path = str(tmp_path / "rents.fmrstore")
+    build_store({2025: str(safmr_path)}, index_path=index_path)
+    return FmrIndex(index_path)
+
+
+def test_unpublished_bedroom_size_is_an_error_not_nan(fmr_index):
+    rows = [("60606", "2"), ("60606", "4")]
+    published, missing = lookup_rents_for_zip(fmr_index, [0, 1], rows, ["60606", "60606"])
+    assert published['rent'] == 2640.0 and published['error'] is None
+    assert missing['rent'] is None
+    assert missing['error'] == "No 4-bedroom rent published for ZIP code 60606."
+    # Same message as the single lookup.
+    assert rent_module.rent_for_bedrooms(fmr_index.lookup("60606"), "4") == (None, missing['error'])
+
+
+def test_bulk_response_is_valid_json(fmr_index, monkeypatch):
+    from app import app
+
+    monkeypatch.setattr(rent_module, 'get_fmr_index', lambda: fmr_index)
+    response = app.test_client().post("/rent_estimate/bulk", json={'rows': [["60606", "4"]]})
+    result = json.loads(response.get_data(as_text=True), parse_constant=pytest.fail)
+    assert result['rent'] is None
+    assert result['error'].startswith("No 4-bedroom rent")
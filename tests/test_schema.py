@@ -0,0 +1,60 @@
+# tests/test_schema.py
+# schema.sql runs on every init_db, so its migrations have to be no-ops once applied.
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from tests.test_brrrr_engine import BASE_DEAL
+
+ADDRESS = "1 Schema Test Way"
+
+
+def _init_db(database_url, monkeypatch):
+    from modules import db
+    import app
+
+    monkeypatch.setattr(db, 'DATABASE_URL', database_url)
+    monkeypatch.setattr(db, '_db_pool', None)
+    app.init_db()
+    db.get_db_pool().closeall()
+
+
+def _saved_at_nullable(cursor):
+    cursor.execute("""
+        SELECT is_nullable FROM information_schema.columns
+         WHERE table_schema = current_schema() AND table_name = 'properties' AND column_name = 'saved_at'
+    """)
+    return cursor.fetchone()['is_nullable'] == 'YES'
+
+
+def test_saved_at_is_migrated_to_not_null_once(database_url, monkeypatch):
+    _init_db(database_url, monkeypatch)
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    try:
+        with conn.cursor() as cursor:
+            # A table from before saved_at was NOT NULL, with a row that never got one.
+            cursor.execute("ALTER TABLE properties ALTER COLUMN saved_at DROP NOT NULL")
+            columns = ", ".join(BASE_DEAL)
+            cursor.execute(f"INSERT INTO properties (property_address, {columns}, saved_at) "
+                           f"VALUES (%s, {', '.join(['%s'] * len(BASE_DEAL))}, NULL)",
+                           (ADDRESS, *BASE_DEAL.values()))
+        conn.commit()
+
+        _init_db(database_url, monkeypatch)
+        with conn.cursor() as cursor:
+            assert not _saved_at_nullable(cursor)
+            cursor.execute("SELECT saved_at FROM properties WHERE property_address = %s", (ADDRESS,))
+            saved_at = cursor.fetchone()['saved_at']
+            assert saved_at is not None
+        conn.commit()
+
+        # Already migrated: running the schema again changes nothing.
+        _init_db(database_url, monkeypatch)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT saved_at FROM properties WHERE property_address = %s", (ADDRESS,))
+            assert cursor.fetchone()['saved_at'] == saved_at
+    finally:
+        conn.rollback()
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM properties WHERE property_address = %s", (ADDRESS,))
+        conn.commit()
+        conn.close()